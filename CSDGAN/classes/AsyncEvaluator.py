@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import copy
+import torch
+
+
+class AsyncEvaluator:
+    """
+    Evaluates snapshots of netG in a background thread so that training can continue while evaluations run.
+    Snapshots are evaluated one at a time, in the order they were submitted, on a private copy of netG. Results are handed back in epoch order.
+    """
+    def __init__(self, netG):
+        """
+        :param netG: Generator being trained. It is copied once, and each snapshot is loaded into the copy before being evaluated.
+        """
+        self.netG = copy.deepcopy(netG)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = OrderedDict()  # Epoch -> Future of evaluation result
+
+    def submit(self, epoch, state_dict, fn, **kwargs):
+        """
+        Queue up an evaluation of a snapshot of netG
+        :param epoch: Epoch the snapshot was taken at
+        :param state_dict: State dict of netG to evaluate. Copied before returning, so training may continue to update netG.
+        :param fn: Evaluation function. Called as fn(netG=netG, **kwargs) in the background thread.
+        """
+        assert epoch not in self.pending, "Epoch already has a pending evaluation"
+        with torch.no_grad():
+            snapshot = OrderedDict((k, v.detach().clone()) for k, v in state_dict.items())
+        self.pending[epoch] = self.executor.submit(self.run, snapshot, fn, kwargs)
+
+    def run(self, snapshot, fn, kwargs):
+        self.netG.load_state_dict(snapshot)
+        return fn(netG=self.netG, **kwargs)
+
+    def collect(self, wait=False):
+        """
+        Gather finished evaluations. Exceptions raised during an evaluation are re-raised here.
+        :param wait: Whether to wait for all pending evaluations to finish
+        :return: List of tuples of epoch and evaluation result, in epoch order. Stops at the first unfinished evaluation unless waiting.
+        """
+        results = []
+        while self.pending:
+            epoch, future = next(iter(self.pending.items()))
+            if not wait and not future.done():
+                break
+            results.append((epoch, future.result()))
+            del self.pending[epoch]
+        return results
+
+    def shutdown(self):
+        """Stop the background thread, dropping any evaluations that have not started yet"""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.executor.shutdown(wait=True)
@@ -1,7 +1,9 @@
 import CSDGAN.utils.constants as cs
+from CSDGAN.classes.AsyncEvaluator import AsyncEvaluator
+from CSDGAN.classes.EvaluationScheduler import EvaluationScheduler
+from CSDGAN.classes.CheckpointRegistry import CheckpointRegistry
 
 import shutil
-import re
 from torchviz import make_dot
 import torch
 import os
@@ -14,7 +16,81 @@ class CGANUtils:
     """Contains util methods to be inherited by both CGANs in this project"""
 
     def __init__(self):
-        pass
+        self.compile_nets = False
+        self.compiled_nets = None  # Built lazily through forward_nets
+        self.async_eval = False
+        self.async_evaluator = None  # Built lazily through submit_evaluation
+        self.eval_metric = 'evaluator'
+        self.eval_context = None  # Built lazily through get_eval_context
+        self.adaptive_eval = False
+        self.eval_budget = None
+        self.checkpoint_top_k = None
+        self.checkpoints = None  # Built lazily through get_checkpoints
+
+    def __getstate__(self):
+        """
+        Compiled modules can not be pickled. They are dropped here and recompiled lazily on the first training step after unpickling.
+        The async evaluator is dropped as well, so collect pending evaluations (e.g. through find_best_epoch) before pickling.
+        The evaluation context is persisted separately (see EvaluationContext.save) and reattached on load by get_CGAN.
+        """
+        state = self.__dict__.copy()
+        state['compiled_nets'] = None
+        state['async_evaluator'] = None
+        state['eval_context'] = None
+        return state
+
+    def __setstate__(self, state):
+        """
+        CGANs pickled before an attribute was added get the value __init__ now gives it (see state_defaults), so that they load, train and generate as before.
+        Defaults are built after the pickled state is restored, so they may depend on it.
+        """
+        self.__dict__.update(state)
+        for key, value in self.state_defaults().items():
+            if key not in state:
+                setattr(self, key, value)
+
+    def state_defaults(self):
+        """
+        :return: Dictionary of the attributes added to CGANs since their first release, mapped to the value __init__ gives them by default
+        """
+        return {'compile_nets': False, 'compiled_nets': None, 'async_eval': False, 'async_evaluator': None, 'eval_metric': 'evaluator',
+                'eval_context': None, 'adaptive_eval': False, 'eval_budget': None, 'checkpoint_top_k': None, 'checkpoints': None,
+                'fast_step': False, 'mixed_precision': False}
+
+    def get_eval_context(self):
+        """
+        :return: EvaluationContext of the real test data, built through init_eval_context the first time it is needed
+        """
+        if self.eval_context is None:
+            self.eval_context = self.init_eval_context()
+        return self.eval_context
+
+    def get_checkpoints(self):
+        """
+        :return: CheckpointRegistry of the generators saved at each evaluation, built the first time it is needed
+        """
+        if self.checkpoints is None:
+            folder = os.path.join(self.path, "stored_generators")
+            self.checkpoints = CheckpointRegistry.load(folder) or \
+                CheckpointRegistry.from_folder(folder=folder, scores=self.checkpoint_scores(), keep_top_k=self.checkpoint_top_k,
+                                               higher_is_better=self.eval_metric not in {'feature_stats', 'fidelity'})  # Distances are lower is better
+        return self.checkpoints
+
+    def checkpoint_netG(self):
+        """Save netG to the checkpoint registry, to be scored through record_checkpoint once evaluated"""
+        self.get_checkpoints().save(state_dict=self.netG.state_dict(), epoch=self.epoch)
+
+    def record_checkpoint(self, epoch):
+        """Score the checkpoint of epoch with the latest stored evaluation, letting the registry delete checkpoints outside the top k"""
+        self.get_checkpoints().record(epoch=epoch, score=self.checkpoint_score())
+
+    def checkpoint_score(self):
+        """Score of the latest stored evaluation, as compared across checkpoints"""
+        return self.checkpoint_scores()[-1]
+
+    def checkpoint_scores(self):
+        """Scores of every stored evaluation, in order. Best accuracy across evaluators by default."""
+        return [np.max(acc) for acc in self.stored_acc]
 
     def init_paths(self):
         os.makedirs(self.path, exist_ok=True)
@@ -23,8 +99,24 @@ class CGANUtils:
             shutil.rmtree(stored_gen_path)
         os.makedirs(stored_gen_path, exist_ok=True)
 
+    def forward_nets(self):
+        """
+        Modules to run the training forward passes through. Optimizer steps and history tracking always go through netG and netD themselves.
+        :return: Tuple of netG and netD (or their wrappers)
+        """
+        if not self.compile_nets:
+            return self.netG, self.netD
+
+        if self.compiled_nets is None:
+            self.compiled_nets = uu.compile_module(self.netG), uu.compile_module(self.netD)
+        return self.compiled_nets
+
     def train_one_step(self, x_train, y_train):
         """One full step of the CGAN training process"""
+        if self.fast_step:
+            return self.train_one_step_fast(x_train, y_train)
+
+        netG, netD = self.forward_nets()
         bs = x_train.shape[0]
         self.netG.train()
         self.netD.train()
@@ -32,25 +124,131 @@ class CGANUtils:
 
         # Update Discriminator, all real batch
         labels = (torch.rand(size=(bs,)) >= self.label_noise).type(torch.float32).to(self.device)
-        real_forward_pass = self.netD(x_train, y_train).view(-1)
+        with uu.autocast(device=self.device, enabled=self.mixed_precision):
+            real_forward_pass = netD(x_train, y_train, logits=self.mixed_precision).view(-1)
         self.netD.train_one_step_real(real_forward_pass, labels)
 
         # Update Discriminator, all fake batch
         noise = torch.randn(bs, self.nz, device=self.device)
-        x_train_fake = self.netG(noise, y_train)
         labels = (torch.rand(size=(bs,)) <= self.label_noise).type(torch.float32).to(self.device)
-        fake_forward_pass = self.netD(x_train_fake.detach(), y_train).view(-1)
+        with uu.autocast(device=self.device, enabled=self.mixed_precision):
+            x_train_fake = netG(noise, y_train)
+            fake_forward_pass = netD(x_train_fake.detach(), y_train, logits=self.mixed_precision).view(-1)
         self.netD.train_one_step_fake(fake_forward_pass, labels)
         self.netD.combine_and_update_opt()
 
         for i in range(self.sched_netG):
             # Update Generator
             noise = torch.randn(bs, self.nz, device=self.device)
-            x_train_fake = self.netG(noise, y_train)
             labels.fill_(self.real_label)  # Reverse labels, fakes are real for generator cost
-            gen_fake_forward_pass = self.netD(x_train_fake, y_train).view(-1)
+            with uu.autocast(device=self.device, enabled=self.mixed_precision):
+                x_train_fake = netG(noise, y_train)
+                gen_fake_forward_pass = netD(x_train_fake, y_train, logits=self.mixed_precision).view(-1)
             self.netG.train_one_step(gen_fake_forward_pass, labels)
 
+    def train_one_step_fast(self, x_train, y_train):
+        """
+        One full step of the CGAN training process without any host syncs. Per step metrics are kept in the on-device accumulators of the sub-nets,
+        noisy labels are built directly on the device, and the fake batch from the discriminator update is reused for the first generator update.
+        """
+        netG, netD = self.forward_nets()
+        bs = x_train.shape[0]
+        self.netG.train()
+        self.netD.train()
+        y_train = y_train.float()  # Convert to float so that it can interact with float weights correctly
+
+        # Update Discriminator, all real batch
+        labels = (torch.rand(bs, device=self.device) >= self.label_noise).float()
+        with uu.autocast(device=self.device, enabled=self.mixed_precision):
+            real_forward_pass = netD(x_train, y_train, logits=self.mixed_precision).view(-1)
+        self.netD.train_one_step_real(real_forward_pass, labels)
+
+        # Update Discriminator, all fake batch
+        noise = torch.randn(bs, self.nz, device=self.device)
+        labels = (torch.rand(bs, device=self.device) <= self.label_noise).float()
+        with uu.autocast(device=self.device, enabled=self.mixed_precision):
+            x_train_fake = netG(noise, y_train)
+            fake_forward_pass = netD(x_train_fake.detach(), y_train, logits=self.mixed_precision).view(-1)
+        self.netD.train_one_step_fake(fake_forward_pass, labels)
+        self.netD.combine_and_update_opt()
+
+        labels.fill_(self.real_label)  # Reverse labels, fakes are real for generator cost
+        for i in range(self.sched_netG):
+            # Update Generator. Graph of the first fake batch is still intact since netD only saw a detached copy.
+            with uu.autocast(device=self.device, enabled=self.mixed_precision):
+                if i > 0:
+                    noise = torch.randn(bs, self.nz, device=self.device)
+                    x_train_fake = netG(noise, y_train)
+                gen_fake_forward_pass = netD(x_train_fake, y_train, logits=self.mixed_precision).view(-1)
+            self.netG.train_one_step(gen_fake_forward_pass, labels)
+
+    def init_eval_scheduler(self, eval_freq, num_epochs):
+        """
+        :param eval_freq: Evaluation frequency passed to train_gan
+        :param num_epochs: Number of epochs passed to train_gan
+        :return: EvaluationScheduler if evaluating adaptively, otherwise None (evaluate every eval_freq epochs)
+        """
+        if eval_freq is None or not self.adaptive_eval:
+            return None
+        return EvaluationScheduler(eval_freq=eval_freq, num_epochs=num_epochs, budget=self.eval_budget, window=cs.EVAL_SCHEDULER_WINDOW,
+                                   settled_ratio=cs.EVAL_SCHEDULER_SETTLED_RATIO)
+
+    def eval_due(self, eval_freq, num_epochs, scheduler=None, run_id=None, logger=None):
+        """
+        Whether to evaluate at the end of the current epoch
+        :param scheduler: EvaluationScheduler from init_eval_scheduler. If None, evaluate every eval_freq epochs and at the final epoch.
+        """
+        if eval_freq is None:
+            return False
+        if scheduler is None:
+            return self.epoch % eval_freq == 0 or (self.epoch == num_epochs)
+        return scheduler.step(proxies=self.convergence_proxies(window=scheduler.window), run_id=run_id, logger=logger)
+
+    def convergence_proxies(self, window):
+        """
+        Cheap signals of convergence from the training history of the last window epochs. Empty until window epochs have been trained.
+        G loss cv: Coefficient of variation of the generator loss
+        D gap std: Standard deviation of the gap between D(x) and D(G(z))
+        G gnorm cv: Coefficient of variation of the generator gradient norm
+        """
+        if len(self.netG.losses) < window:
+            return {}
+
+        def cv(x):
+            return float(np.std(x) / (np.mean(np.abs(x)) + 1e-8))
+
+        return {'G loss cv': cv(self.netG.losses[-window:]),
+                'D gap std': float(np.std(np.subtract(self.netD.Avg_D_reals[-window:], self.netD.Avg_D_fakes[-window:]))),
+                'G gnorm cv': cv(self.netG.gnorm_total_history[-window:])}
+
+    def submit_evaluation(self, **kwargs):
+        """
+        Checkpoint netG and queue up an evaluation of it in the background through score_netG. Training may continue immediately.
+        :param kwargs: Additional arguments to pass to score_netG
+        """
+        self.checkpoint_netG()
+        self.get_eval_context()  # Built here rather than lazily in the background thread
+        if self.async_evaluator is None:
+            self.async_evaluator = AsyncEvaluator(netG=self.netG)
+        self.async_evaluator.submit(epoch=self.epoch, state_dict=self.netG.state_dict(), fn=self.score_netG, **kwargs)
+
+    def collect_evaluations(self, wait=False, run_id=None, logger=None):
+        """
+        Store the results of finished background evaluations (in epoch order) through store_evaluation
+        :param wait: Whether to wait for all pending evaluations to finish
+        """
+        if self.async_evaluator is None:
+            return
+
+        for epoch, result in self.async_evaluator.collect(wait=wait):
+            self.store_evaluation(result)
+            self.record_checkpoint(epoch=epoch)
+            uu.train_log_print(run_id=run_id, logger=logger, statement=self.eval_statement(epoch=epoch))
+
+    def eval_statement(self, epoch):
+        """Statement logging the latest evaluation"""
+        return "Epoch: %d\tEvaluator Score: %.4f" % (epoch, np.max(self.stored_acc[-1]))
+
     def print_progress(self, total_epochs, run_id=None, logger=None):
         """Print metrics of interest"""
         statement = '[%d/%d]\tLoss_D: %.4f\tLoss_G: %.4f\tD(x): %.4f\tD(G(z)): %.4f / %.4f' % (self.epoch, total_epochs, self.netD.losses[-1], self.netG.losses[-1],
@@ -112,25 +310,19 @@ class CGANUtils:
             f.savefig(os.path.join(save, cs.FILENAME_TRAINING_PLOT))
 
     def find_best_epoch(self):
-        def parse_epoch(x):
-            pattern = re.compile(r"[0-9]+")
-            return int(re.findall(pattern=pattern, string=x)[0])
-
-        gens = os.listdir(os.path.join(self.path, "stored_generators"))
-        gens = sorted(gens, key=parse_epoch)
-        try:  # Test ranges attribute exists if tabular CGAN
-            return parse_epoch(gens[np.argmax(self.stored_acc) // len(self.test_ranges)])
-        except AttributeError:  # Image CGAN
-            return parse_epoch(gens[np.argmax(self.stored_acc)])
+        """Epoch of the best scored checkpoint, once pending evaluations are in"""
+        self.collect_evaluations(wait=True)
+        return self.get_checkpoints().best()['epoch']
 
     def load_netG(self, best=True, epoch=None):
         """Load a previously stored netG"""
         assert best or epoch is not None, "Either best arg must be True or epoch arg must not be None"
+        self.collect_evaluations(wait=True)
 
         if best:
             epoch = self.find_best_epoch()
 
-        self.netG.load_state_dict(torch.load(self.path + "/stored_generators/Epoch_" + str(epoch) + "_Generator.pt"))
+        self.netG.load_state_dict(torch.load(self.get_checkpoints().path(epoch)))
 
     def draw_architecture(self, net, show, save):
         """
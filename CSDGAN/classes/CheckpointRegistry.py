@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import torch
+
+
+class CheckpointRegistry:
+    """
+    Keeps track of the generators saved at each evaluation (epoch, score, path and size on disk), in memory and in a JSON file next to the generators.
+    Checkpoints are saved before they are scored, so that background evaluations can score them later. Once scored, only the keep_top_k best scored
+    checkpoints are kept, the others being deleted from disk. Checkpoints still waiting for a score are always kept. The best checkpoint is tracked
+    as scores come in, so looking it up does not touch the disk.
+    """
+    filename = 'registry.json'
+
+    def __init__(self, folder, keep_top_k=None, higher_is_better=True):
+        """
+        :param folder: Directory to save generators and the registry to
+        :param keep_top_k: Number of best scored checkpoints to keep. If None, every checkpoint is kept.
+        :param higher_is_better: Whether higher scores are better (e.g. accuracy) or worse (e.g. a distance)
+        """
+        assert keep_top_k is None or keep_top_k >= 1, "Must keep at least one checkpoint"
+
+        self.folder = folder
+        self.keep_top_k = keep_top_k
+        self.higher_is_better = higher_is_better
+        self.entries = {}  # Epoch -> dictionary of epoch, score (None until scored), path and size in bytes
+        self.best_epoch = None
+
+    def save(self, state_dict, epoch):
+        """
+        Save a generator, to be scored later through record
+        :param state_dict: State dict of netG
+        :param epoch: Epoch the generator was trained to
+        """
+        path = os.path.join(self.folder, "Epoch_" + str(epoch) + "_Generator.pt")
+        torch.save(state_dict, path)
+        self.entries[epoch] = {'epoch': epoch, 'score': None, 'path': path, 'size': os.path.getsize(path)}
+        self.write()
+
+    def record(self, epoch, score):
+        """
+        Score a saved generator, then delete any scored generators that fall outside the keep_top_k best
+        :param epoch: Epoch of a generator previously saved through save
+        :param score: Score of the generator
+        """
+        assert epoch in self.entries, "No checkpoint saved for epoch %d" % epoch
+        self.entries[epoch]['score'] = float(score)
+        if self.best_epoch is None or self.better(score, self.entries[self.best_epoch]['score']):
+            self.best_epoch = epoch
+        self.prune()
+        self.write()
+
+    def better(self, a, b):
+        """Whether score a is strictly better than score b. Ties go to the earlier checkpoint, as with np.argmax."""
+        return a > b if self.higher_is_better else a < b
+
+    def prune(self):
+        """Delete the scored checkpoints that are not among the keep_top_k best"""
+        if self.keep_top_k is None:
+            return
+        scored = sorted((x for x in self.entries.values() if x['score'] is not None),
+                        key=lambda x: (-x['score'] if self.higher_is_better else x['score'], x['epoch']))
+        for entry in scored[self.keep_top_k:]:
+            if os.path.exists(entry['path']):
+                os.remove(entry['path'])
+            del self.entries[entry['epoch']]
+
+    def best(self):
+        """
+        :return: Registry entry of the best scored checkpoint
+        """
+        assert self.best_epoch is not None, "No checkpoint has been scored yet"
+        return self.entries[self.best_epoch]
+
+    def path(self, epoch):
+        """
+        :param epoch: Epoch of a kept checkpoint
+        :return: Path of the generator saved at epoch
+        """
+        assert epoch in self.entries, "No checkpoint kept for epoch %d. Kept epochs: %s" % (epoch, sorted(self.entries))
+        return self.entries[epoch]['path']
+
+    def total_size(self):
+        """Size on disk of every kept checkpoint, in bytes"""
+        return sum(x['size'] for x in self.entries.values())
+
+    def write(self):
+        """Write the registry to its JSON file"""
+        state = {'keep_top_k': self.keep_top_k, 'higher_is_better': self.higher_is_better, 'best_epoch': self.best_epoch,
+                 'entries': [self.entries[epoch] for epoch in sorted(self.entries)]}
+        tmp_path = os.path.join(self.folder, self.filename + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.folder, self.filename))
+
+    @classmethod
+    def from_folder(cls, folder, scores, keep_top_k=None, higher_is_better=True):
+        """
+        Rebuild the registry of a run saved before registries were written to disk, from the generators saved in folder.
+        A generator was saved at each evaluation, so in epoch order the i-th generator is scored with the i-th score. Any generators left over stay unscored.
+        :param folder: Directory the generators were saved to
+        :param scores: Score of each evaluation, in order
+        :return: CheckpointRegistry of the generators in folder, empty if there are none
+        """
+        registry = cls(folder=folder, keep_top_k=keep_top_k, higher_is_better=higher_is_better)
+        names = os.listdir(folder) if os.path.isdir(folder) else []
+        epochs = sorted(int(match.group(1)) for match in (re.fullmatch(r'Epoch_(\d+)_Generator\.pt', name) for name in names) if match)
+        if not epochs:
+            return registry
+
+        for epoch in epochs:
+            path = os.path.join(folder, "Epoch_" + str(epoch) + "_Generator.pt")
+            registry.entries[epoch] = {'epoch': epoch, 'score': None, 'path': path, 'size': os.path.getsize(path)}
+        for epoch, score in zip(epochs, scores):
+            registry.record(epoch=epoch, score=score)
+        registry.write()
+        return registry
+
+    @classmethod
+    def load(cls, folder):
+        """
+        :param folder: Directory previously used by a CheckpointRegistry
+        :return: CheckpointRegistry read from the JSON file in folder, or None if there is none
+        """
+        path = os.path.join(folder, cls.filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            state = json.load(f)
+        registry = cls(folder=folder, keep_top_k=state['keep_top_k'], higher_is_better=state['higher_is_better'])
+        registry.entries = {x['epoch']: dict(x, path=os.path.join(folder, os.path.basename(x['path']))) for x in state['entries']}  # In case the run moved
+        registry.best_epoch = state['best_epoch']
+        return registry
@@ -0,0 +1,84 @@
+import CSDGAN.utils.constants as cs
+
+import os
+import pickle as pkl
+import numpy as np
+
+
+class EvaluationContext:
+    """
+    Real test data in the final form consumed by evaluators, built once per run instead of on every evaluation.
+    Holds the test features (for image data sets, a loader of the test images), the test labels as class indices and as the original label values,
+    and the proportion of each class in the test set. Persisted next to the run artifacts so that retraining reuses it.
+    """
+    filename = 'eval_context.pkl'
+
+    def __init__(self, x_test, y_idx, labels_list, image_gen=None):
+        """
+        :param x_test: NumPy array of test features. None for image data sets, whose images are read through image_gen.
+        :param y_idx: NumPy array of the class index of each test example
+        :param labels_list: List of label values, in class index order
+        :param image_gen: Loader of the test images of image data sets, see from_image_gen
+        """
+        assert x_test is not None or image_gen is not None, "Either x_test or image_gen must be passed"
+        assert x_test is None or x_test.shape[0] == y_idx.shape[0], "x_test and y_idx must have the same number of rows"
+
+        self.x_test = None if x_test is None else np.ascontiguousarray(x_test, dtype=np.float32)
+        self.image_gen = image_gen
+        self.y_idx = np.asarray(y_idx, dtype=np.int64)
+        self.labels_list = list(labels_list)
+        self.y_test = np.asarray(self.labels_list)[self.y_idx]  # Original label values, as returned by the fitted evaluators
+        self.class_weights = np.bincount(self.y_idx, minlength=len(self.labels_list)) / len(self.y_idx)
+
+    @classmethod
+    def from_tabular_dataset(cls, dataset):
+        """
+        :param dataset: TabularDataset
+        :return: EvaluationContext of the test split of dataset
+        """
+        return cls(x_test=dataset.x_test.cpu().detach().numpy(), y_idx=dataset.y_test.cpu().detach().numpy().argmax(axis=1),
+                   labels_list=dataset.labels_list)
+
+    @classmethod
+    def from_image_gen(cls, test_gen, labels_list, memory_budget=cs.IMAGE_MEMORY_BUDGET):
+        """
+        A packed test split is read in place through its memory map. Otherwise the test images are decoded once into host memory as uint8 images
+        if they fit memory_budget (see ImageMemoryPlanner), and streamed from test_gen if they do not.
+        Either way only a reference to the packed split or to test_gen is pickled with the context, never the images.
+        :param test_gen: Loader of the real test set, yielding batches of images and class indices
+        :param labels_list: List of label values, in class index order
+        :param memory_budget: Largest footprint of decoded test images held in host memory, in bytes
+        :return: EvaluationContext of the test set
+        """
+        # Imported here so that tabular runs do not load the image classes
+        from CSDGAN.classes.image.ImageDataset import PackedImageLoader, ResidentImageLoader
+        from CSDGAN.classes.image.ImageMemoryPlanner import ImageMemoryPlanner
+
+        source = test_gen.source if isinstance(test_gen, ResidentImageLoader) else test_gen
+        if isinstance(source, PackedImageLoader):
+            image_gen = PackedImageLoader(source.dataset, batch_size=source.batch_size, shuffle=False)
+            y_idx = source.dataset.labels.numpy()
+        elif ImageMemoryPlanner.footprint(source)[2] <= memory_budget:
+            image_gen = ResidentImageLoader(source=source, device='cpu', shuffle=False)
+            y_idx = image_gen.y.numpy()
+        else:
+            image_gen = source
+            y_idx = np.concatenate([(labels.argmax(dim=-1) if len(labels.shape) > 1 else labels).cpu().numpy() for _, labels in source])
+        return cls(x_test=None, y_idx=y_idx, labels_list=labels_list, image_gen=image_gen)
+
+    def save(self, run_dir):
+        """Pickle to run_dir"""
+        with open(os.path.join(run_dir, self.filename), 'wb') as f:
+            pkl.dump(self, f)
+
+    @classmethod
+    def load(cls, run_dir):
+        """
+        :param run_dir: Directory of the run
+        :return: EvaluationContext previously saved to run_dir, or None if there is none
+        """
+        path = os.path.join(run_dir, cls.filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return pkl.load(f)
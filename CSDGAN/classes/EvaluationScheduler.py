@@ -0,0 +1,82 @@
+import utils.utils as uu
+
+import numpy as np
+
+
+class EvaluationScheduler:
+    """
+    Decides at the end of each epoch whether to evaluate, in place of a fixed eval_freq. Evaluations start sparse (every eval_freq epochs) and
+    densify (down to every min_freq epochs) as cheap convergence proxies settle, within a total budget of evaluations for the call to train_gan.
+    The final epoch is always evaluated, with one evaluation of the budget reserved for it. The interval never drops below an even spread of
+    the remaining budget over the remaining epochs, so evaluations saved while sparse early on are what pays for denser evaluations later.
+    Proxies are computed by CGANUtils.convergence_proxies over the last window epochs. Since their scale depends on the data and architecture,
+    each proxy is judged relative to the largest value it has taken so far in the run (typically early on, while training moves quickly):
+    it scores 0 at that peak and 1 once it has fallen to settled_ratio of it. The interval between evaluations shrinks linearly with the mean score.
+    """
+    def __init__(self, eval_freq, num_epochs, budget=None, min_freq=None, window=10, settled_ratio=0.25):
+        """
+        :param eval_freq: Sparsest interval between evaluations, in epochs
+        :param num_epochs: Number of epochs in this call to train_gan
+        :param budget: Total number of evaluations allowed. If None, twice the number of evaluations at a fixed eval_freq.
+        :param min_freq: Densest interval between evaluations, in epochs. If None, a fifth of eval_freq.
+        :param window: Number of recent epochs the proxies are computed over
+        :param settled_ratio: Fraction of its peak value below which a proxy counts as settled
+        """
+        assert eval_freq >= 1, "Evaluation frequency must be at least 1"
+
+        self.max_freq = eval_freq
+        self.min_freq = max(1, eval_freq // 5 if min_freq is None else min(min_freq, eval_freq))
+        self.num_epochs = num_epochs
+        self.budget = 2 * int(np.ceil(num_epochs / eval_freq)) if budget is None else budget
+        assert self.budget >= 1, "Evaluation budget must allow at least the final evaluation"
+        self.window = window
+        assert 0 <= settled_ratio < 1, "Settled ratio must be between 0 and 1"
+        self.settled_ratio = settled_ratio
+        self.peaks = {}  # Largest value of each proxy so far
+
+        self.epoch = 0  # Epochs since the start of this call to train_gan
+        self.last_eval = 0
+        self.num_evals = 0
+        self.interval = self.max_freq
+        self.history = []  # Tuple of epoch, interval and proxies for every evaluation
+
+    def convergence(self, proxies):
+        """
+        :param proxies: Dictionary of proxy values
+        :return: Mean score of the proxies, from 0 (not converged) to 1 (converged)
+        """
+        scores = []
+        for name, value in proxies.items():
+            self.peaks[name] = max(self.peaks.get(name, 0.0), value)
+            ratio = value / self.peaks[name] if self.peaks[name] > 0 else 0.0
+            scores.append(np.clip((1 - ratio) / (1 - self.settled_ratio), 0, 1))
+        return float(np.mean(scores)) if scores else 0.0
+
+    def step(self, proxies, run_id=None, logger=None):
+        """
+        Advance by one epoch
+        :param proxies: Dictionary of proxy values at the end of the epoch
+        :return: Whether to evaluate at the end of this epoch
+        """
+        self.epoch += 1
+
+        remaining_budget = self.budget - 1 - self.num_evals  # Keep one evaluation for the final epoch
+        pace = int(np.ceil((self.num_epochs - self.last_eval) / (remaining_budget + 1))) if remaining_budget > 0 else self.num_epochs
+        self.interval = max(pace, int(round(self.max_freq - self.convergence(proxies) * (self.max_freq - self.min_freq))))
+
+        final = self.epoch == self.num_epochs
+        due = self.epoch - self.last_eval >= self.interval and remaining_budget > 0
+        if not (final or due):
+            return False
+
+        self.last_eval = self.epoch
+        self.num_evals += 1
+        self.history.append((self.epoch, self.interval, proxies))
+        uu.train_log_print(run_id=run_id, logger=logger,
+                           statement="Scheduled evaluation %d/%d at epoch %d of %d, interval %d epochs (%s)" %
+                                     (self.num_evals, self.budget, self.epoch, self.num_epochs, self.interval, self.format_proxies(proxies)))
+        return True
+
+    @staticmethod
+    def format_proxies(proxies):
+        return ', '.join('%s: %.4f' % (name, value) for name, value in proxies.items()) if proxies else 'no proxies yet'
@@ -0,0 +1,59 @@
+import numpy as np
+import torch
+
+
+class LabelSampler:
+    """
+    Generates stratified labels for producing fake data.
+    Counts per class are exact (largest-remainder rounding), and one hot encoded labels are built directly as a tensor on the desired device.
+    """
+    def __init__(self, nc, device='cpu', shuffle=False, columns=None):
+        """
+        :param nc: Number of classes
+        :param device: Device to create label tensors on
+        :param shuffle: Whether to shuffle the order of the labels. If False, labels are grouped by class in class index order.
+        :param columns: Column of the one hot encoding to set for each class index. If None, class index i is encoded in column i.
+        """
+        assert nc > 0, "Number of classes must be positive"
+        assert columns is None or sorted(columns) == list(range(nc)), "Columns must be a permutation of the class indices"
+
+        self.nc = nc
+        self.device = device
+        self.shuffle = shuffle
+        self.columns = torch.arange(nc) if columns is None else torch.tensor(columns, dtype=torch.int64)
+
+    def counts(self, num, stratify=None):
+        """
+        Number of labels of each class to generate
+        :param num: Total number of labels
+        :param stratify: How to proportion out the labels. If None, a straight average is used.
+        :return: Array of counts per class index, summing to num
+        """
+        if stratify is None:
+            stratify = np.full(self.nc, 1 / self.nc)
+        stratify = np.asarray(stratify, dtype=np.float64)
+        assert stratify.shape == (self.nc,), "Stratify must contain one proportion per class"
+        assert np.all(stratify >= 0) and stratify.sum() > 0, "Stratify proportions must be non-negative and not all zero"
+
+        exact = stratify / stratify.sum() * num
+        counts = np.floor(exact).astype(np.int64)
+        remainder = num - counts.sum()
+        counts[np.argsort(counts - exact, kind='stable')[:remainder]] += 1  # Largest fractional parts first, ties go to the lower class index
+        return counts
+
+    def sample(self, num, stratify=None):
+        """
+        Generate labels
+        :param num: Number of desired labels
+        :param stratify: How to proportion out the labels. If None, a straight average is used.
+        :return: Tuple of one hot encoded labels (float tensor) and the class index of each label (int64 tensor)
+        """
+        counts = torch.from_numpy(self.counts(num=num, stratify=stratify))
+        idx = torch.repeat_interleave(torch.arange(self.nc), counts)
+        if self.shuffle:
+            idx = idx[torch.randperm(num)]
+        idx = idx.to(self.device)
+
+        one_hot = torch.zeros((num, self.nc), dtype=torch.float32, device=self.device)
+        one_hot.scatter_(1, self.columns.to(self.device)[idx].unsqueeze(1), 1.0)
+        return one_hot, idx
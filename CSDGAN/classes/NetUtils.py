@@ -9,6 +9,10 @@ import os
 
 class NetUtils:
     """Contains utils to be inherited by other nets in this project"""
+    # Defaults for nets pickled before fast step mode and mixed precision were added. Nets set their own in __init__.
+    fast_step = False
+    mixed_precision = False
+
     def __init__(self):
         self.epoch = 0
         self.streaming_weight_history = {}
@@ -31,6 +35,13 @@ class NetUtils:
         self.norm_num = 2
         self.bins = 20  # Choice of bins=20 seems to look nice. Subject to change.
 
+        # Fast step mode - per step metrics are accumulated on device and only synced once per epoch
+        self.fast_step = False
+        self.step_metric_names = []
+        self.step_metric_sums = None
+        self.step_norm_sums = None
+        self.num_steps = 0
+
     def init_layer_list(self):
         """Initializes list of layers for tracking history"""
         nn_module_ignore_list = {'batchnorm', 'activation', 'loss', 'Noise', 'CustomCatGANLayer'}  # List of nn.modules to ignore when constructing layer_list
@@ -49,10 +60,40 @@ class NetUtils:
             self.wnorm_history[layer] = {'weight': [], 'bias': []}
             self.gnorm_history[layer] = {'weight': [], 'bias': []}
 
+    def init_step_accumulators(self, metric_names):
+        """
+        Enables fast step mode. Preallocates on-device accumulators for per step metrics and weight/gradient norms so that no host syncs are needed during training.
+        Should be ran after init_layer_list.
+        :param metric_names: Names of per step metric lists to accumulate (i.e. 'loss', 'D_x'). Flushed back into these lists once per epoch.
+        """
+        self.fast_step = True
+        self.step_metric_names = list(metric_names)
+        self.step_metric_sums = torch.zeros(len(self.step_metric_names), device=self.device)
+        self.step_norm_sums = torch.zeros(len(self.layer_list), 4, device=self.device)  # Weight, bias, weight grad, bias grad
+        self.num_steps = 0
+
+    def accumulate_step_metric(self, name, value):
+        """Adds a per step metric to its on-device accumulator without syncing"""
+        self.step_metric_sums[self.step_metric_names.index(name)] += value.detach()
+
+    def flush_step_accumulators(self):
+        """
+        Single device to host transfer of the accumulated per step metrics. Each per step list is replaced by its epoch mean,
+        which leaves the per epoch summaries computed from it unchanged.
+        """
+        if self.num_steps > 0:
+            means = (self.step_metric_sums / self.num_steps).cpu().numpy()
+            for name, mean in zip(self.step_metric_names, means):
+                setattr(self, name, [float(mean)])
+        self.step_metric_sums.zero_()
+
     def next_epoch(self):
         """Resets internal storage of training history to stream next epoch"""
         self.epoch += 1
 
+        if self.fast_step:
+            self.flush_step_accumulators()
+
         self.losses.append(np.mean(self.loss))
         self.loss = []
 
@@ -64,11 +105,19 @@ class NetUtils:
             self.streaming_weight_history[layer] = {'weight': [], 'bias': []}
             self.streaming_gradient_history[layer] = {'weight': [], 'bias': []}
 
+        if self.fast_step:
+            self.step_norm_sums.zero_()
+            self.num_steps = 0
+
     def store_weight_and_grad_norms(self):
         """
         Appends training history for summarization and visualization later. Scales each norm by the number of elements.
         Should be ran once per step per subnet.
         """
+        if self.fast_step:
+            self.accumulate_weight_and_grad_norms()
+            return
+
         for layer in self.layer_list:
             self.streaming_weight_history[layer]['weight'].append(layer.weight.norm(self.norm_num).detach().cpu().numpy().take(0) / layer.weight.numel())
             self.streaming_weight_history[layer]['bias'].append(layer.bias.norm(self.norm_num).detach().cpu().numpy().take(0) / layer.bias.numel())
@@ -76,6 +125,40 @@ class NetUtils:
             self.streaming_gradient_history[layer]['weight'].append(layer.weight.grad.norm(self.norm_num).detach().cpu().numpy().take(0) / layer.weight.grad.numel())
             self.streaming_gradient_history[layer]['bias'].append(layer.bias.grad.norm(self.norm_num).detach().cpu().numpy().take(0) / layer.bias.grad.numel())
 
+    def accumulate_weight_and_grad_norms(self):
+        """
+        Fast step version of store_weight_and_grad_norms. Rather than storing every norm, accumulates the sum of norm ** norm_num on device,
+        which is all update_wnormz and update_gnormz need.
+        """
+        with torch.no_grad():
+            norms = torch.stack([torch.stack((layer.weight.norm(self.norm_num) / layer.weight.numel(),
+                                              layer.bias.norm(self.norm_num) / layer.bias.numel(),
+                                              layer.weight.grad.norm(self.norm_num) / layer.weight.grad.numel(),
+                                              layer.bias.grad.norm(self.norm_num) / layer.bias.grad.numel())) for layer in self.layer_list])
+            self.step_norm_sums += norms ** self.norm_num
+        self.num_steps += 1
+
+    def streaming_norms(self):
+        """
+        Norms of the streamed weight and gradient history of the current epoch by layer
+        :return: Tuple of dictionaries keyed by layer containing a (weight, bias) norm pair and the number of steps streamed, for weights and gradients respectively
+        """
+        w_norms, g_norms = {}, {}
+        if self.fast_step:
+            norms = (self.step_norm_sums.cpu().numpy() ** (1. / self.norm_num)) if self.num_steps > 0 else np.zeros((len(self.layer_list), 4))
+            for i, layer in enumerate(self.layer_list):
+                w_norms[layer] = (norms[i, 0], norms[i, 1], self.num_steps)
+                g_norms[layer] = (norms[i, 2], norms[i, 3], self.num_steps)
+        else:
+            for layer in self.layer_list:
+                w_norms[layer] = (np.linalg.norm(self.streaming_weight_history[layer]['weight'], self.norm_num),
+                                  np.linalg.norm(self.streaming_weight_history[layer]['bias'], self.norm_num),
+                                  len(self.streaming_weight_history[layer]['weight']))
+                g_norms[layer] = (np.linalg.norm(self.streaming_gradient_history[layer]['weight'], self.norm_num),
+                                  np.linalg.norm(self.streaming_gradient_history[layer]['bias'], self.norm_num),
+                                  len(self.streaming_gradient_history[layer]['weight']))
+        return w_norms, g_norms
+
     def update_hist_list(self):
         """
         Updates the histogram history based on the weights at the end of an epoch.
@@ -100,9 +183,9 @@ class NetUtils:
         :return: list of norms of weights by layer, as well as overall weight norm
         """
         total_norm = 0
+        w_norms, _ = self.streaming_norms()
         for layer in self.wnorm_history:
-            w_norm = np.linalg.norm(self.streaming_weight_history[layer]['weight'], self.norm_num)
-            b_norm = np.linalg.norm(self.streaming_weight_history[layer]['bias'], self.norm_num)
+            w_norm, b_norm, _ = w_norms[layer]
             self.wnorm_history[layer]['weight'].append(w_norm)
             self.wnorm_history[layer]['bias'].append(b_norm)
 
@@ -122,9 +205,10 @@ class NetUtils:
         :return: list of gradient norms by layer, as well as overall gradient norm
         """
         total_norm = 0
+        _, g_norms = self.streaming_norms()
         for layer in self.gnorm_history:
-            w_norm = np.linalg.norm(self.streaming_gradient_history[layer]['weight'], self.norm_num) / len(self.streaming_gradient_history[layer]['weight'])
-            b_norm = np.linalg.norm(self.streaming_gradient_history[layer]['bias'], self.norm_num) / len(self.streaming_gradient_history[layer]['bias'])
+            w_norm, b_norm, num_steps = g_norms[layer]
+            w_norm, b_norm = w_norm / num_steps, b_norm / num_steps
 
             self.gnorm_history[layer]['weight'].append(w_norm)
             self.gnorm_history[layer]['bias'].append(b_norm)
@@ -291,16 +375,27 @@ class NetUtils:
 
 
 class GaussianNoise(nn.Module):
-    """Gaussian noise regularizer"""
+    """
+    Gaussian noise regularizer. Sigma is a 0-dim buffer updated in place as it is annealed (see set_sigma),
+    so that a compiled netD sees the same tensor every epoch instead of a new constant to retrace for.
+    """
     def __init__(self, device, sigma=0.1):
         super().__init__()
         self.device = device
-        self.sigma = sigma
+        self.register_buffer('sigma', torch.tensor(float(sigma), device=device))
+
+    def __setstate__(self, state):
+        """Layers pickled before sigma was a buffer kept it as a float"""
+        super().__setstate__(state)
+        if 'sigma' in self.__dict__:
+            self.register_buffer('sigma', torch.tensor(float(self.__dict__.pop('sigma')), device=self.device))
+
+    def set_sigma(self, sigma):
+        self.sigma.fill_(sigma)
 
     def forward(self, x):
-        if self.training and self.sigma != 0.0:
-            sampled_noise = torch.randn(*x.size(), device=self.device) * self.sigma
-            x = x + sampled_noise
+        if self.training:
+            x = x + torch.randn_like(x) * self.sigma
         return x
 
 
@@ -308,30 +403,67 @@ class CustomCatGANLayer(nn.Module):
     def __init__(self, cat_mask, le_dict):
         super().__init__()
         # Softmax activation
-        self.sm = nn.Softmax(dim=-2)
+        self.sm = nn.Softmax(dim=-1)
 
         # Masks
-        self.cat = torch.Tensor(cat_mask).nonzero()
-        self.cont = torch.Tensor(~cat_mask).nonzero()
+        cat = torch.tensor(cat_mask, dtype=torch.bool).nonzero().view(-1)
+        cont = torch.tensor(~cat_mask, dtype=torch.bool).nonzero().view(-1)
+        self.num_cat = len(cat)
 
         # Label encoding dictionary
         self.le_dict = le_dict
+        self.cat_sizes = [len(le.classes_) for le in le_dict.values()]
+        assert sum(self.cat_sizes) == self.num_cat, "Categorical mask does not match the label encoders"
+
+        self.init_layout(cat=cat, cont=cont)
+
+    def __setstate__(self, state):
+        """Layers pickled before the layout was precomputed kept the indices of the categorical and continuous columns instead"""
+        super().__setstate__(state)
+        if 'cat' in self.__dict__:
+            cat, cont = self.__dict__.pop('cat').view(-1), self.__dict__.pop('cont').view(-1)
+            self.sm = nn.Softmax(dim=-1)
+            self.num_cat = len(cat)
+            self.cat_sizes = [len(le.classes_) for le in self.le_dict.values()]
+            self.init_layout(cat=cat, cont=cont)
+
+    def init_layout(self, cat, cont):
+        """
+        Precompute the layout: permutation putting categorical columns first, and the feature (segment) each categorical column belongs to.
+        Both are plain tensors rather than buffers, so that they stay out of the state dict, and follow the layer across devices through _apply.
+        :param cat: Indices of the categorical columns
+        :param cont: Indices of the continuous columns
+        """
+        self.perm = torch.cat([cat, cont])
+        self.segment_ids = torch.repeat_interleave(torch.arange(len(self.cat_sizes)), torch.tensor(self.cat_sizes, dtype=torch.int64))
+
+    def _apply(self, fn, *args, **kwargs):
+        """Apply fn (e.g. a move to another device) to the precomputed layout as well. Conversions of floating point types leave it untouched."""
+        self.perm, self.segment_ids = fn(self.perm), fn(self.segment_ids)
+        return super()._apply(fn, *args, **kwargs)
 
     def forward(self, input_layer):
         """
         Softmax for each categorical variable - https://medium.com/jungle-book/towards-data-set-augmentation-with-gans-9dd64e9628e6
+        All features are handled at once with a segmented softmax: subtract the per-feature max, exponentiate, and normalize by per-feature sums.
         :param input_layer: fully connected input layer with size out_dim
-        :return: output of forward pass
+        :return: output of forward pass, categorical columns first
         """
-        cont = input_layer[:, self.cont]
+        x = input_layer.index_select(1, self.perm)
+        if self.num_cat == 0:
+            return x
+
+        cat, cont = x[:, :self.num_cat], x[:, self.num_cat:]
+        if not hasattr(cat, 'scatter_reduce'):  # Older versions of torch, one softmax per feature
+            return torch.cat([self.sm(chunk) for chunk in torch.split(cat, self.cat_sizes, dim=1)] + [cont], 1)
 
-        cat = input_layer[:, self.cat]
-        catted = torch.empty_like(cat)
-        curr = 0
-        for _, le in self.le_dict.items():
-            newcurr = curr + len(le.classes_)
-            catted[:, curr:newcurr] = self.sm(cat[:, curr:newcurr])
-            curr = newcurr
+        cat = cat.float()  # Normalize in fp32 when running under autocast
+        segment_ids = self.segment_ids.expand_as(cat)
+        segment_shape = (cat.shape[0], len(self.cat_sizes))
 
-        return torch.cat([catted, cont], 1)
+        seg_max = torch.full(segment_shape, float('-inf'), device=cat.device)
+        seg_max = seg_max.scatter_reduce(1, segment_ids, cat.detach(), reduce='amax')  # Shift only for numerical stability, no gradient needed
+        exp = torch.exp(cat - seg_max.gather(1, segment_ids))
+        seg_sum = torch.zeros(segment_shape, device=cat.device).scatter_add(1, segment_ids, exp)
 
+        return torch.cat([(exp / seg_sum.gather(1, segment_ids)).to(x.dtype), cont], 1)
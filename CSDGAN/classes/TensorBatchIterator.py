@@ -0,0 +1,50 @@
+import math
+import torch
+
+
+class TensorBatchIterator:
+    """
+    Lightweight stand-in for a DataLoader over tensors that are already resident in memory (or on the training device).
+    Shuffles with a single permutation per epoch and yields index-select slices, avoiding a __getitem__ call per row and a collate per batch.
+    """
+    def __init__(self, x, y, batch_size, shuffle=True, drop_last=False, fixed_shape=False, dataset=None):
+        """
+        :param x: Tensor of features, indexed along the first dimension
+        :param y: Tensor of labels, indexed along the first dimension
+        :param batch_size: Number of rows per batch
+        :param shuffle: Whether to draw a new permutation each epoch
+        :param drop_last: Whether to drop the final batch if it is smaller than batch_size
+        :param fixed_shape: Whether to pad the final batch with rows from the start of the epoch's permutation so every batch has batch_size rows.
+        Ignored if drop_last is True.
+        :param dataset: Data set the tensors belong to. Kept so the iterator can be used anywhere a DataLoader's dataset attribute is accessed.
+        """
+        assert x.shape[0] == y.shape[0], "x and y must have the same number of rows"
+        assert batch_size > 0, "Batch size must be positive"
+
+        self.x = x
+        self.y = y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.fixed_shape = fixed_shape
+        self.dataset = dataset
+
+    def __len__(self):
+        n = self.x.shape[0]
+        return n // self.batch_size if self.drop_last else math.ceil(n / self.batch_size)
+
+    def __iter__(self):
+        n = self.x.shape[0]
+        if self.shuffle:
+            idx = torch.randperm(n, device=self.x.device)
+        else:
+            idx = torch.arange(n, device=self.x.device)
+
+        num_batches = len(self)
+        if self.fixed_shape and not self.drop_last and n % self.batch_size != 0:
+            total = num_batches * self.batch_size
+            idx = idx.repeat(math.ceil(total / n))[:total]
+
+        for i in range(num_batches):
+            batch_idx = idx[i * self.batch_size:(i + 1) * self.batch_size]
+            yield self.x.index_select(0, batch_idx), self.y.index_select(0, batch_idx.to(self.y.device))
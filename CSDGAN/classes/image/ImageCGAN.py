@@ -2,15 +2,20 @@ import CSDGAN.utils.db as db
 import CSDGAN.utils.constants as cs
 import utils.image_utils as iu
 import utils.utils as uu
-from CSDGAN.classes.image.ImageDataset import OnlineGeneratedImageDataset
+from CSDGAN.classes.image.ImageDataset import OnlineGeneratedImageDataset, MemmapGeneratedImageDataset, GeneratedImageIterable
 from CSDGAN.classes.image.ImageNetD import ImageNetD
 from CSDGAN.classes.image.ImageNetG import ImageNetG
 from CSDGAN.classes.image.ImageNetE import ImageNetE
-from CSDGAN.classes.NetUtils import GaussianNoise
+from CSDGAN.classes.image.ImageFeatureStats import ImageFeatureStats
+from CSDGAN.classes.image.ImageMemoryPlanner import ImageMemoryPlanner
 from CSDGAN.classes.CGANUtils import CGANUtils
+from CSDGAN.classes.EvaluationContext import EvaluationContext
 
 import time
+import datetime
 from torch.utils import data
+from torch.nn.parallel import DistributedDataParallel
+import torch.distributed as dist
 import imageio
 import copy
 import os
@@ -29,7 +34,9 @@ class ImageCGAN(CGANUtils):
                  netD_nf, netD_lr, netD_beta1, netD_beta2, netD_wd,
                  netE_lr, netE_beta1, netE_beta2, netE_wd,
                  fake_data_set_size, fake_bs,
-                 eval_num_epochs, early_stopping_patience, grid_num_examples=10):
+                 eval_num_epochs, early_stopping_patience, grid_num_examples=10, fast_step=False, mixed_precision=False, compile_nets=False, async_eval=False,
+                 eval_metric='evaluator', fake_data_mode='online', fake_refresh_rate=5, adaptive_eval=False, eval_budget=None,
+                 checkpoint_top_k=None, data_residency='auto'):
         super().__init__()
 
         self.path = path  # default file path for saved objects
@@ -62,16 +69,45 @@ class ImageCGAN(CGANUtils):
         self.discrim_noise_linear_anneal = discrim_noise_linear_anneal
         self.dn_rate = 0.0
 
+        # Keep per step metrics on device, only syncing once per epoch
+        self.fast_step = fast_step
+
+        # Run forward passes under bfloat16 autocast. Optimizers and losses stay in fp32.
+        assert not mixed_precision or uu.mixed_precision_supported(), "Mixed precision requires a version of torch with autocast support"
+        self.mixed_precision = mixed_precision
+
+        # Compile netG and netD forward passes for the training loop. Compilation happens lazily on the first training step.
+        self.compile_nets = compile_nets
+
         # Evaluator properties
-        self.fake_shuffle = True
-        self.fake_num_workers = 6
+        self.fake_prefetch = cs.IMAGE_FAKE_DATA_PREFETCH
         self.fake_data_set_size = fake_data_set_size
         self.fake_bs = fake_bs
 
+        # 'online' calls netG for every batch of fake data. 'memmap' generates each fake data set once into a memory-mapped buffer under the run folder,
+        # drawing fresh samples every fake_refresh_rate evaluator epochs.
+        assert fake_data_mode in {'online', 'memmap'}, "Fake data mode must be either 'online' or 'memmap'"
+        self.fake_data_mode = fake_data_mode
+        self.fake_refresh_rate = fake_refresh_rate
+
         self.netE_params = {'lr': netE_lr, 'beta1': netE_beta1, 'beta2': netE_beta2, 'wd': netE_wd}
 
         self.eval_num_epochs = eval_num_epochs
         self.early_stopping_patience = early_stopping_patience
+        self.async_eval = async_eval  # Whether to evaluate snapshots of netG in the background while training continues
+        self.adaptive_eval = adaptive_eval  # Whether to schedule evaluations with an EvaluationScheduler instead of every eval_freq epochs
+        self.eval_budget = eval_budget  # Maximum number of evaluations per call to train_gan when evaluating adaptively
+
+        # 'evaluator' trains netE from scratch on fake data for each evaluation and scores it on the real test set.
+        # 'feature_stats' scores fake data with the evaluator trained on real data during benchmarking (see init_feature_stats) and selects by Frechet distance.
+        assert eval_metric in {'evaluator', 'feature_stats'}, "Evaluation metric must be either 'evaluator' or 'feature_stats'"
+        self.eval_metric = eval_metric
+        self.feature_stats = None  # Initialized through init_feature_stats method
+        self.checkpoint_top_k = checkpoint_top_k  # Number of best generators to keep on disk, see CheckpointRegistry. If None, all are kept.
+
+        # Where the real splits are read from during training, see ImageMemoryPlanner. Applied through init_data_residency.
+        assert data_residency in {'auto', 'disk', 'memory', 'device'}, "Data residency must be 'auto', 'disk', 'memory' or 'device'"
+        self.data_residency = data_residency
 
         # Initialized through init_fake_gen method
         self.fake_train_set = None
@@ -79,11 +115,20 @@ class ImageCGAN(CGANUtils):
         self.fake_val_set = None
         self.fake_val_gen = None
 
+        # Distributed training properties, initialized through init_distributed method
+        self.rank = 0
+        self.world_size = 1
+        self.netG_ddp = None
+        self.netD_ddp = None
+        self.dist_train_gen = None
+
         # Instantiate sub-nets
         self.netG = ImageNetG(nz=self.nz, num_channels=self.num_channels, nf=netG_nf, x_dim=self.x_dim, nc=self.nc, device=self.device, path=self.path,
-                              grid_num_examples=self.grid_num_examples, lr=netG_lr, beta1=netG_beta1, beta2=netG_beta2, wd=netG_wd).to(self.device)
+                              grid_num_examples=self.grid_num_examples, lr=netG_lr, beta1=netG_beta1, beta2=netG_beta2, wd=netG_wd,
+                              fast_step=self.fast_step, mixed_precision=self.mixed_precision).to(self.device)
         self.netD = ImageNetD(nf=netD_nf, num_channels=self.num_channels, nc=self.nc, noise=self.discrim_noise, device=self.device, x_dim=self.x_dim,
-                              path=self.path, lr=netD_lr, beta1=netD_beta1, beta2=netD_beta2, wd=netD_wd).to(self.device)
+                              path=self.path, lr=netD_lr, beta1=netD_beta1, beta2=netD_beta2, wd=netD_wd,
+                              fast_step=self.fast_step, mixed_precision=self.mixed_precision).to(self.device)
         self.netE = None  # Initialized through init_evaluator method
         self.nets = {self.netG, self.netD, self.netE}
 
@@ -94,9 +139,19 @@ class ImageCGAN(CGANUtils):
         self.fake_label = 0
         self.stored_loss = []
         self.stored_acc = []
+        self.stored_fd = []  # Frechet distances, if eval_metric is 'feature_stats'
+        self.stored_class_acc = []  # Accuracy on the fake images of each class, if eval_metric is 'feature_stats'
 
         self.fixed_imgs = [self.gen_fixed_img_grid()]
 
+    def state_defaults(self):
+        """Defaults of the attributes added to image CGANs as well"""
+        defaults = super().state_defaults()
+        defaults.update({'fake_prefetch': cs.IMAGE_FAKE_DATA_PREFETCH, 'fake_data_mode': 'online', 'fake_refresh_rate': 5, 'feature_stats': None,
+                         'data_residency': 'auto', 'rank': 0, 'world_size': 1, 'netG_ddp': None, 'netD_ddp': None, 'dist_train_gen': None,
+                         'stored_fd': [], 'stored_class_acc': []})
+        return defaults
+
     def train_gan(self, num_epochs, print_freq, eval_freq=None, run_id=None, logger=None, retrain=False):
         """
         Primary method for training
@@ -108,41 +163,61 @@ class ImageCGAN(CGANUtils):
         :param retrain: Whether model is being retrained
         """
         assert logger if run_id else True, "Must pass a logger if run_id is passed"
+        assert self.rank == 0 or (run_id is None and eval_freq is None), "Only the main process may track a run or evaluate"
 
         total_epochs = self.epoch + num_epochs
+        main_process = self.rank == 0
+        train_gen = self.train_gen if self.dist_train_gen is None else self.dist_train_gen
 
         if run_id:
             checkpoints = [int(num_epochs * i / 4) for i in range(1, 4)]
 
+        scheduler = self.init_eval_scheduler(eval_freq=eval_freq, num_epochs=num_epochs)
+
         if self.label_noise_linear_anneal:
             self.ln_rate = self.label_noise / num_epochs
 
         if self.discrim_noise_linear_anneal:
             self.dn_rate = self.discrim_noise / num_epochs
 
-        uu.train_log_print(run_id=run_id, logger=logger, statement="Beginning training")
+        if main_process:
+            uu.train_log_print(run_id=run_id, logger=logger, statement="Beginning training")
         og_start_time = time.time()
         start_time = time.time()
 
         for epoch in range(num_epochs):
-            for x, y in self.train_gen:
+            if self.dist_train_gen is not None:
+                self.dist_train_gen.sampler.set_epoch(self.epoch)
+
+            for x, y in train_gen:
                 y = torch.eye(self.nc)[y] if len(y.shape) == 1 else y
                 x, y = x.to(self.device), y.to(self.device)
                 self.train_one_step(x, y)
 
             self.next_epoch()
 
+            if not main_process:  # Other processes only contribute gradients
+                continue
+
             if self.epoch % print_freq == 0 or (self.epoch == num_epochs):
                 uu.train_log_print(run_id=run_id, logger=logger, statement="Time: %ds" % (time.time() - start_time))
                 start_time = time.time()
 
                 self.print_progress(total_epochs=total_epochs, run_id=run_id, logger=logger)
 
-            if eval_freq is not None:
-                if self.epoch % eval_freq == 0 or (self.epoch == num_epochs):
-                    self.init_fake_gen()
-                    self.test_model(train_gen=self.fake_train_gen, val_gen=self.fake_val_gen)
-                    uu.train_log_print(run_id=run_id, logger=logger, statement="Epoch: %d\tEvaluator Score: %.4f" % (self.epoch, np.max(self.stored_acc[-1])))
+            if self.eval_due(eval_freq=eval_freq, num_epochs=num_epochs, scheduler=scheduler, run_id=run_id, logger=logger):
+                if self.async_eval:
+                    self.submit_evaluation()
+                else:
+                    if self.eval_metric == 'feature_stats':
+                        self.test_feature_stats()
+                    else:
+                        self.init_fake_gen()
+                        self.test_model(train_gen=self.fake_train_gen, val_gen=self.fake_val_gen)
+                    self.record_checkpoint(epoch=self.epoch)
+                    uu.train_log_print(run_id=run_id, logger=logger, statement=self.eval_statement(epoch=self.epoch))
+
+            self.collect_evaluations(run_id=run_id, logger=logger)
 
             if run_id:
                 if self.epoch in checkpoints:
@@ -152,8 +227,67 @@ class ImageCGAN(CGANUtils):
                     status_id = status_id.replace('Train', 'Retrain') if retrain else status_id
                     db.query_set_status(run_id=run_id, status_id=cs.STATUS_DICT[status_id])
 
-        uu.train_log_print(run_id=run_id, logger=logger, statement="Total training time: %ds" % (time.time() - og_start_time))
-        uu.train_log_print(run_id=run_id, logger=logger, statement="Training complete")
+        if self.async_evaluator is not None and self.async_evaluator.pending:
+            uu.train_log_print(run_id=run_id, logger=logger, statement="Waiting for %d pending evaluations" % len(self.async_evaluator.pending))
+            self.collect_evaluations(wait=True, run_id=run_id, logger=logger)
+
+        if main_process:
+            uu.train_log_print(run_id=run_id, logger=logger, statement="Total training time: %ds" % (time.time() - og_start_time))
+            uu.train_log_print(run_id=run_id, logger=logger, statement="Training complete")
+
+    def init_data_residency(self, run_id=None, logger=None):
+        """
+        Decide with an ImageMemoryPlanner whether to keep streaming the real splits from disk or to hold them decoded in memory (or on the device),
+        based on data_residency, and swap train_gen, val_gen and test_gen accordingly. Resident splits are shuffled with one permutation per epoch.
+        :return: Chosen mode
+        """
+        planner = ImageMemoryPlanner()
+        gens = {'train': self.train_gen, 'val': self.val_gen, 'test': self.test_gen}
+        mode, statement = planner.plan(gens=gens, device=self.device, mode=self.data_residency)
+        uu.train_log_print(run_id=run_id, logger=logger, statement=statement)
+        gens = planner.apply(gens=gens, device=self.device, mode=mode)
+        self.train_gen, self.val_gen, self.test_gen = gens['train'], gens['val'], gens['test']
+        self.data_gen = self.train_gen
+        return mode
+
+    def init_distributed(self, rank, world_size, init_method):
+        """
+        Join a process group for data-parallel training. netG and netD are wrapped in DistributedDataParallel so gradients are averaged across processes
+        every step, and each process trains on its own shard of train_gen. Only the main process (rank 0) prints, evaluates and tracks the run.
+        :param rank: Rank of the current process
+        :param world_size: Total number of processes training
+        :param init_method: URL specifying how to initialize the process group, such as file:///path/to/shared/file
+        """
+        assert 0 <= rank < world_size, "Rank must be between 0 and world_size - 1"
+        assert self.netG_ddp is None, "Distributed training already initialized"
+
+        dist.init_process_group(backend=cs.IMAGE_DISTRIBUTED_BACKEND, init_method=init_method, rank=rank, world_size=world_size,
+                                timeout=datetime.timedelta(seconds=cs.IMAGE_DISTRIBUTED_TIMEOUT))
+        self.rank = rank
+        self.world_size = world_size
+
+        self.netG_ddp = DistributedDataParallel(self.netG)
+        self.netD_ddp = DistributedDataParallel(self.netD)
+
+        sampler = data.distributed.DistributedSampler(self.train_gen.dataset, num_replicas=world_size, rank=rank, shuffle=True)
+        self.dist_train_gen = data.DataLoader(self.train_gen.dataset, batch_size=self.train_gen.batch_size, sampler=sampler,
+                                              num_workers=self.train_gen.num_workers)
+
+    def destroy_distributed(self):
+        """Leave the process group and drop the distributed wrappers so the CGAN can be pickled and used by a single process again"""
+        if dist.is_initialized():
+            dist.destroy_process_group()
+        self.rank = 0
+        self.world_size = 1
+        self.netG_ddp = None
+        self.netD_ddp = None
+        self.dist_train_gen = None
+
+    def forward_nets(self):
+        """Route training forward passes through the DistributedDataParallel wrappers when training across processes (run eagerly)"""
+        if self.netG_ddp is not None:
+            return self.netG_ddp, self.netD_ddp
+        return super().forward_nets()
 
     def test_model(self, train_gen, val_gen):
         """
@@ -162,17 +296,74 @@ class ImageCGAN(CGANUtils):
         :param val_gen: Same as above ^
         """
         self.init_evaluator(train_gen, val_gen)
-        self.netE.train_evaluator(num_epochs=self.eval_num_epochs, eval_freq=1, real=False, es=self.early_stopping_patience)
-        torch.save(self.netG.state_dict(), self.path + "/stored_generators/Epoch_" + str(self.epoch) + "_Generator.pt")
-        loss, acc = self.netE.eval_once_real(self.test_gen)
+        self.netE.train_evaluator(num_epochs=self.eval_num_epochs, eval_freq=1, es=self.early_stopping_patience)
+        self.checkpoint_netG()
+        loss, acc = self.netE.eval_once_real(self.real_test_gen())
         self.stored_loss.append(loss.item())
         self.stored_acc.append(acc.item())
 
+    def test_feature_stats(self):
+        """Score netG with the evaluator trained on real data. Much cheaper than test_model, as nothing is trained."""
+        self.checkpoint_netG()
+        self.store_evaluation(self.score_netG(self.netG))
+
+    def init_feature_stats(self, real_netE):
+        """
+        Set up the 'feature_stats' evaluation metric, caching the features of the real test set
+        :param real_netE: netE trained on real data, as returned by eval_on_real_data
+        """
+        self.feature_stats = ImageFeatureStats(netE=real_netE, test_gen=self.real_test_gen(), device=self.device, nc=self.nc, nz=self.nz, bs=self.fake_bs,
+                                               num_examples=cs.IMAGE_FEATURE_STATS_NUM_EXAMPLES)
+
+    def score_netG(self, netG):
+        """
+        With the 'evaluator' metric, train a CNN evaluator from scratch on data generated by netG and evaluate it on the real test set.
+        With the 'feature_stats' metric, score data generated by netG with the evaluator trained on real data.
+        :param netG: Generator to evaluate, self.netG or a copy of it for evaluations in the background
+        :return: Tuple of test loss and test accuracy, or of Frechet distance and accuracy of each class for 'feature_stats'
+        """
+        if self.eval_metric == 'feature_stats':
+            assert self.feature_stats is not None, "Run init_feature_stats before evaluating with the 'feature_stats' metric"
+            return self.feature_stats.score(netG)
+
+        # Fake data and evaluator stay local, as this may run in the background while training reads the CGAN's own
+        _, fake_train_gen, _, fake_val_gen = self.build_fake_gens(netG=netG)
+        netE = self.build_evaluator(fake_train_gen, fake_val_gen)
+        netE.train_evaluator(num_epochs=self.eval_num_epochs, eval_freq=1, es=self.early_stopping_patience)
+        loss, acc = netE.eval_once_real(self.real_test_gen())
+        return loss.item(), acc.item()
+
+    def store_evaluation(self, result):
+        """Store the results returned by score_netG. With the 'feature_stats' metric, the stored accuracy is the mean accuracy across classes."""
+        if self.eval_metric == 'feature_stats':
+            fd, class_acc = result
+            self.stored_fd.append(fd)
+            self.stored_class_acc.append(class_acc)
+            self.stored_acc.append(float(np.mean(class_acc)))
+        else:
+            loss, acc = result
+            self.stored_loss.append(loss)
+            self.stored_acc.append(acc)
+
+    def checkpoint_scores(self):
+        """Accuracy of each evaluation, or its Frechet distance for 'feature_stats'"""
+        if self.eval_metric == 'feature_stats':
+            return list(self.stored_fd)
+        return super().checkpoint_scores()
+
+    def eval_statement(self, epoch):
+        """Statement logging the latest evaluation"""
+        statement = super().eval_statement(epoch=epoch)
+        if self.eval_metric == 'feature_stats':
+            statement += "\tFrechet Distance: %.4f" % self.stored_fd[-1]
+        return statement
+
     def next_epoch(self):
         """Run netG and netD methods to prepare for next epoch. Mostly saves histories and resets history collection objects."""
         self.epoch += 1
 
-        self.fixed_imgs.append(self.gen_fixed_img_grid())
+        if self.rank == 0:
+            self.fixed_imgs.append(self.gen_fixed_img_grid())
 
         self.netG.next_epoch()
         self.netG.next_epoch_gen()
@@ -183,28 +374,68 @@ class ImageCGAN(CGANUtils):
         # Anneal noise rates
         self.label_noise -= self.ln_rate
         self.discrim_noise -= self.dn_rate
-        self.netD.noise = GaussianNoise(device=self.device, sigma=self.discrim_noise)
+        self.netD.noise.set_sigma(self.discrim_noise)
 
     def init_evaluator(self, train_gen, val_gen):
         """
         Initialize the netE sub-net. This is done as a separate method because we want to reinitialize netE each time we want to evaluate it.
         We can also evaluate on the original, real data by specifying these training generators.
         """
-        self.netE = ImageNetE(train_gen=train_gen, val_gen=val_gen, test_gen=self.test_gen, device=self.device, x_dim=self.x_dim, le=self.le,
-                              num_channels=self.num_channels, nc=self.nc, path=self.path, **self.netE_params).to(self.device)
+        self.netE = self.build_evaluator(train_gen, val_gen)
         self.nets = {self.netG, self.netD, self.netE}
 
-    def init_fake_gen(self):
+    def build_evaluator(self, train_gen, val_gen):
+        """
+        :return: New netE, to be trained on train_gen and val_gen and tested on the real test set
+        """
+        return ImageNetE(train_gen=train_gen, val_gen=val_gen, test_gen=self.real_test_gen(), device=self.device, x_dim=self.x_dim, le=self.le,
+                         num_channels=self.num_channels, nc=self.nc, path=self.path, mixed_precision=self.mixed_precision,
+                         **self.netE_params).to(self.device)
+
+    def init_eval_context(self):
+        """Build the EvaluationContext of the test set, reading the packed test split in place or holding the test images within the memory budget"""
+        return EvaluationContext.from_image_gen(test_gen=self.test_gen, labels_list=list(self.le.classes_))
+
+    def real_test_gen(self):
+        """Loader of the real test set of the evaluation context, iterated in a fixed order. Used by evaluators in place of test_gen."""
+        return self.get_eval_context().image_gen
+
+    def init_fake_gen(self, netG=None):
+        """
+        Initialize fake training and validation generators, iterating over whole batches produced on the device
+        :param netG: Generator to produce the fake data with. If None, self.netG is used.
+        """
+        if netG is None:
+            netG = self.netG
+
+        self.fake_train_set, self.fake_train_gen, self.fake_val_set, self.fake_val_gen = self.build_fake_gens(netG=netG)
+
+    def build_fake_gens(self, netG):
+        """
+        :param netG: Generator to produce the fake data with
+        :return: Tuple of fake training set and generator, and fake validation set and generator
+        """
         # Initialize fake training set and validation set to be same size
-        self.fake_train_set = OnlineGeneratedImageDataset(netG=self.netG, size=self.fake_data_set_size, nz=self.nz, nc=self.nc, bs=self.fake_bs,
-                                                          ohe=self.ohe, device=self.device, x_dim=self.x_dim)
-        self.fake_train_gen = data.DataLoader(self.fake_train_set, batch_size=self.fake_bs,
-                                              shuffle=self.fake_shuffle, num_workers=self.fake_num_workers)
+        fake_train_set = self.init_fake_set(netG=netG, name='train')
+        fake_train_gen = GeneratedImageIterable(fake_train_set, device=self.device, prefetch=self.fake_prefetch)
 
-        self.fake_val_set = OnlineGeneratedImageDataset(netG=self.netG, size=self.fake_data_set_size, nz=self.nz, nc=self.nc, bs=self.fake_bs,
-                                                        ohe=self.ohe, device=self.device, x_dim=self.x_dim)
-        self.fake_val_gen = data.DataLoader(self.fake_val_set, batch_size=self.fake_bs,
-                                            shuffle=self.fake_shuffle, num_workers=self.fake_num_workers)
+        fake_val_set = self.init_fake_set(netG=netG, name='val')
+        fake_val_gen = GeneratedImageIterable(fake_val_set, device=self.device, prefetch=self.fake_prefetch)
+        return fake_train_set, fake_train_gen, fake_val_set, fake_val_gen
+
+    def init_fake_set(self, netG, name):
+        """
+        :param netG: Generator to produce the fake data with
+        :param name: Name of the data set (train or val), naming its buffer in memmap mode
+        :return: Fake data set of the type given by fake_data_mode
+        """
+        if self.fake_data_mode == 'memmap':
+            return MemmapGeneratedImageDataset(netG=netG, size=self.fake_data_set_size, nz=self.nz, nc=self.nc, num_channels=self.num_channels,
+                                               bs=self.fake_bs, ohe=self.ohe, device=self.device, x_dim=self.x_dim,
+                                               path=os.path.join(self.path, 'fake_data', name + '.dat'), refresh_rate=self.fake_refresh_rate,
+                                               dtype=cs.IMAGE_FAKE_DATA_MEMMAP_DTYPE)
+        return OnlineGeneratedImageDataset(netG=netG, size=self.fake_data_set_size, nz=self.nz, nc=self.nc, bs=self.fake_bs,
+                                           ohe=self.ohe, device=self.device, x_dim=self.x_dim)
 
     def eval_on_real_data(self, num_epochs, train_gen=None, val_gen=None, test_gen=None, es=None):
         """
@@ -223,10 +454,10 @@ class ImageCGAN(CGANUtils):
             val_gen = self.val_gen
 
         if test_gen is None:
-            test_gen = self.test_gen
+            test_gen = self.real_test_gen()
 
         self.init_evaluator(train_gen, val_gen)
-        self.netE.train_evaluator(num_epochs=num_epochs, eval_freq=1, real=True, es=es)
+        self.netE.train_evaluator(num_epochs=num_epochs, eval_freq=1, es=es)
         _, og_result = self.netE.eval_once_real(test_gen)
         og_result = og_result.numpy().take(0)
         return og_result, copy.copy(self.netE)
@@ -832,14 +1063,12 @@ class ImageCGAN(CGANUtils):
 
         dataset = OnlineGeneratedImageDataset(netG=self.netG, size=size, nz=self.nz, nc=self.nc, bs=bs,
                                               ohe=self.ohe, device=self.device, x_dim=self.x_dim, stratify=stratify)
-        gen = data.DataLoader(dataset, batch_size=bs,
-                              shuffle=False, num_workers=self.fake_num_workers)
+        gen = GeneratedImageIterable(dataset, device='cpu', prefetch=self.fake_prefetch)
 
         label = 'genned_img' if label is None else label
 
-        gen.dataset.next_epoch()
-        with torch.no_grad():
-            for i in range(gen.dataset.batches_per_epoch):
-                batch, labels = gen.dataset.next_batch()
-                for j, img in enumerate(batch):
-                    vutils.save_image(img, os.path.join(path, label + '_' + str(i + j) + '.png'))
+        num_saved = 0
+        for batch, labels in gen:
+            for img in batch:
+                vutils.save_image(img, os.path.join(path, label + '_' + str(num_saved) + '.png'))
+                num_saved += 1
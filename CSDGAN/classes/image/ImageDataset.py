@@ -1,10 +1,13 @@
 import utils.image_utils as IU
+from CSDGAN.classes.LabelSampler import LabelSampler
+from CSDGAN.classes.TensorBatchIterator import TensorBatchIterator
 
 from torch.utils import data
-import random
 import torchvision.transforms as t
-from torchvision.datasets.folder import ImageFolder
 import os
+import json
+import queue
+import threading
 import numpy as np
 import torch
 
@@ -58,33 +61,18 @@ class GeneratedImageDataset(data.Dataset):
 
         self.device = device
 
+        self.label_sampler = LabelSampler(nc=self.nc)
+
         self.x, self.y = self.gen_data(stratify=stratify)
 
     def gen_labels(self, stratify=None):
         """
         Generate labels for generating fake data
         :param stratify: How to proportion out the labels. If None, a straight average is used.
-        :return: Tuple of one hot encoded labels and the labels themselves
-        """
-        # Generate array of counts per label to be generated
-        if stratify is None:
-            stratify = [1 / self.nc for i in range(self.nc)]
-        counts = np.round(np.dot(stratify, self.size), decimals=0).astype('int')
-        while np.sum(counts) != self.size:
-            if np.sum(counts) > self.size:
-                counts[random.choice(range(self.nc))] -= 1
-            else:
-                counts[random.choice(range(self.nc))] += 1
-        # Generate array of label names
-        labels = np.empty(self.size)
-        current_index = 0
-        for i in range(self.nc):
-            labels[current_index:(current_index + counts[i])] = i
-            current_index += counts[i]
-        # One hot encode labels
-        arr = self.ohe.transform(labels.reshape(-1, 1))
-        # Convert to tensor
-        return torch.from_numpy(arr).type(dtype=torch.float32)
+        :return: One hot encoded labels, grouped by class
+        """
+        one_hot, _ = self.label_sampler.sample(num=self.size, stratify=stratify)
+        return one_hot
 
     def gen_data(self, stratify=None):
         """Generate fake training data examples for netE. Requires prior run of gen_labels"""
@@ -113,20 +101,317 @@ class GeneratedImageDataset(data.Dataset):
         return self.x[index], self.y[index]
 
 
-class ImageFolderWithPaths(ImageFolder):
+class MemmapGeneratedImageDataset(data.Dataset):
+    """
+    Drop-in alternative to OnlineGeneratedImageDataset for training netE on fake data. Rather than calling netG for every batch of every epoch,
+    the whole fake data set is generated once into a preallocated memory-mapped buffer under the run folder, and each epoch reads it back in a new
+    shuffled order. Fresh samples (for the same labels) are generated every refresh_rate epochs.
+    A uint8 buffer stores images at the same precision as the real (8 bit) images, float16 keeps more of the precision of netG.
+    """
+    def __init__(self, netG, size, nz, nc, num_channels, bs, ohe, device, x_dim, path, refresh_rate=1, dtype='uint8', stratify=None):
+        """
+        :param path: File to memory-map the buffer to. Overwritten if it exists.
+        :param refresh_rate: Number of epochs between generating fresh samples. If None, samples are only generated once.
+        :param dtype: Storage type of the buffer, either 'uint8' or 'float16'
+        """
+        assert dtype in {'uint8', 'float16'}, "Buffer dtype must be either 'uint8' or 'float16'"
+        assert refresh_rate is None or refresh_rate >= 1, "Refresh rate must be None or at least 1"
+
+        self.netG = netG
+
+        self.size = size
+        self.nz = nz
+        self.nc = nc
+        self.num_channels = num_channels
+        self.bs = bs
+        self.x_dim = x_dim
+
+        self.ohe = ohe
+
+        self.device = device
+
+        self.path = path
+        self.refresh_rate = refresh_rate
+        self.dtype = dtype
+
+        self.label_sampler = LabelSampler(nc=self.nc, shuffle=True)
+
+        self.full_y = self.gen_labels(stratify=stratify)
+        self.internal_counter = 0
+        self.epochs_since_refresh = 0
+        self.perm = np.arange(self.size)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.x = np.memmap(self.path, dtype=self.dtype, mode='w+', shape=(self.size, self.num_channels, self.x_dim[0], self.x_dim[1]))
+        self.gen_data()
+
+        self.batches_per_epoch = int(np.ceil(self.size / self.bs))
+
+    def gen_labels(self, stratify=None):
+        """
+        Generate labels for generating fake data
+        :param stratify: How to proportion out the labels. If None, a straight average is used.
+        :return: One hot encoded labels for the entire generator (shuffled)
+        """
+        one_hot, _ = self.label_sampler.sample(num=self.size, stratify=stratify)
+        return one_hot
+
+    def gen_data(self):
+        """Fill the buffer with freshly generated examples for the labels in full_y"""
+        self.netG.eval()
+        with torch.no_grad():
+            for start in range(0, self.size, self.bs):
+                y = self.full_y[start:start + self.bs].to(self.device)
+                noise = torch.randn(y.shape[0], self.nz, device=self.device)
+                self.x[start:start + y.shape[0]] = self.to_storage(self.netG(noise, y).to('cpu'))
+
+    def to_storage(self, x):
+        """Convert a batch of images (between 0 and 1) to the storage type of the buffer"""
+        if self.dtype == 'uint8':
+            return torch.round(x.float() * 255).to(torch.uint8).numpy()
+        return x.to(torch.float16).numpy()
+
+    def from_storage(self, x):
+        """Convert a batch of images read from the buffer back to float tensors"""
+        x = torch.from_numpy(x)
+        if self.dtype == 'uint8':
+            return x.float().div_(255)
+        return x.float()
+
+    def next_batch(self):
+        # Read each batch in file order, keeping labels aligned
+        idx = np.sort(self.perm[self.internal_counter:self.internal_counter + self.bs])
+        self.internal_counter += self.bs
+        return self.from_storage(self.x[idx]), self.full_y[torch.from_numpy(idx)]
+
+    def next_epoch(self):
+        if self.refresh_rate is not None and self.epochs_since_refresh >= self.refresh_rate:
+            self.gen_data()
+            self.epochs_since_refresh = 0
+        self.epochs_since_refresh += 1
+        self.perm = np.random.permutation(self.size)
+        self.internal_counter = 0
+
+    def __getstate__(self):
+        """The buffer is not pickled, it is reopened from path when unpickled"""
+        state = self.__dict__.copy()
+        state['x'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if os.path.exists(self.path):
+            self.x = np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(self.size, self.num_channels, self.x_dim[0], self.x_dim[1]))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.from_storage(self.x[index]), self.full_y[index]
+
+
+class GeneratedImageIterable(data.IterableDataset):
     """
-    Custom dataset that includes image file paths. Extends torchvision.datasets.ImageFolder
+    Iterates over one epoch of a fake data set (OnlineGeneratedImageDataset or MemmapGeneratedImageDataset) in whole batches on the device,
+    so netE can consume fake data exactly like a DataLoader of real data. Batches are produced in the main process, without worker processes.
+    If prefetch is positive, a background thread produces up to that many batches ahead of the consumer.
     """
+    def __init__(self, dataset, device, prefetch=0):
+        """
+        :param dataset: Fake data set providing next_epoch, next_batch and batches_per_epoch
+        :param device: Device to yield batches on
+        :param prefetch: Number of batches to produce ahead in a background thread. If 0, batches are produced as they are consumed.
+        """
+        self.dataset = dataset
+        self.device = device
+        self.prefetch = prefetch
+
+    def __len__(self):
+        return self.dataset.batches_per_epoch
+
+    def batches(self):
+        self.dataset.next_epoch()
+        for i in range(self.dataset.batches_per_epoch):
+            x, y = self.dataset.next_batch()
+            yield x.to(self.device), y.to(self.device)
+
+    def __iter__(self):
+        if self.prefetch <= 0:
+            return self.batches()
+        return self.prefetched_batches()
+
+    def prefetched_batches(self):
+        """Yield batches produced by a background thread. The thread stops early if the consumer stops iterating."""
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for batch in self.batches():
+                    if not put(batch):
+                        return
+                put(end)
+            except Exception as e:  # Raised in the consumer instead
+                put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+
+class PackedImageDataset(data.Dataset):
+    """
+    Split of a preprocessed image data set packed into a single file (see img_data_loading.ingest_image_zip): a contiguous uint8 array of every image
+    (N x C x H x W), an int64 array of class indices and a small JSON header describing both. Both arrays are memory-mapped rather than read into memory.
+    Items match those of an ImageFolder with a ToTensor transform (float images between 0 and 1, class index), without decoding any image files.
+    """
+    def __init__(self, folder, split):
+        """
+        :param folder: Directory the split was packed into
+        :param split: Name of the split (e.g. 'train')
+        """
+        self.folder = folder
+        self.split = split
+        with open(os.path.join(folder, split + '.json'), 'r') as f:
+            self.header = json.load(f)
+        self.classes = self.header['classes']
+        self.images, self.labels = None, None
+        self.open()
+
+    def open(self):
+        """Memory-map the arrays copy-on-write, so that they can be viewed as tensors without ever writing to the files"""
+        num_images, shape = self.header['num_images'], tuple(self.header['shape'])
+        images = np.memmap(os.path.join(self.folder, self.header['images']), dtype=np.uint8, mode='c', shape=(num_images,) + shape)
+        labels = np.memmap(os.path.join(self.folder, self.header['labels']), dtype=np.int64, mode='c', shape=(num_images,))
+        self.images, self.labels = torch.from_numpy(images), torch.from_numpy(labels)
+
+    @staticmethod
+    def exists(folder, split):
+        return os.path.exists(os.path.join(folder, split + '.json'))
+
+    def __getstate__(self):
+        """The arrays are not pickled, they are reopened from folder when unpickled"""
+        state = self.__dict__.copy()
+        state['images'], state['labels'] = None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.open()
+
+    def __len__(self):
+        return self.header['num_images']
 
-    # override the __getitem__ method. this is the method that dataloader calls
     def __getitem__(self, index):
-        # this is what ImageFolder normally returns
-        original_tuple = super(ImageFolderWithPaths, self).__getitem__(index)
-        # the image file path
-        img_id = os.path.basename(self.imgs[index][0])
-        # make a new tuple that includes original and the path
-        tuple_with_id = (original_tuple + (img_id,))
-        return tuple_with_id
+        return self.images[index].float().div_(255), int(self.labels[index])
+
+
+class PackedImageLoader(TensorBatchIterator):
+    """
+    Stand-in for a DataLoader over an ImageFolder, iterating over a PackedImageDataset in whole batches:
+    each batch is a single index select on the memory-mapped uint8 images, converted to float images between 0 and 1.
+    """
+    num_workers = 0  # For compatibility with code reading the number of workers of a DataLoader
+
+    def __init__(self, dataset, batch_size, shuffle=True):
+        """
+        :param dataset: PackedImageDataset
+        :param batch_size: Number of images per batch
+        :param shuffle: Whether to draw a new permutation each epoch
+        """
+        super().__init__(x=dataset.images, y=dataset.labels, batch_size=batch_size, shuffle=shuffle, dataset=dataset)
+
+    def __iter__(self):
+        for x, y in super().__iter__():
+            yield x.float().div_(255), y
+
+    def __getstate__(self):
+        """The arrays are reopened by the dataset when unpickled"""
+        state = self.__dict__.copy()
+        state['x'], state['y'] = None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.x, self.y = self.dataset.images, self.dataset.labels
+
+
+class ResidentImageLoader(TensorBatchIterator):
+    """
+    Stand-in for the loader of a split (DataLoader or PackedImageLoader) holding the whole split decoded in memory, or on the training device,
+    as uint8 images (a quarter of the size of float images, and lossless for images decoded from 8 bit files). Each epoch draws a single permutation, and each batch is an index select converted
+    to float images between 0 and 1, matching the batches of the source loader. Only the source loader is pickled: the split is decoded again
+    on first iteration after unpickling.
+    """
+    def __init__(self, source, device, shuffle=True):
+        """
+        :param source: Loader of the split, yielding batches of float images between 0 and 1 and class indices
+        :param device: Device to hold the split on
+        :param shuffle: Whether to draw a new permutation each epoch
+        """
+        self.source = source
+        self.device = torch.device(device)
+        self.num_workers = getattr(source, 'num_workers', 0)  # Read when training data-parallel, see ImageCGAN.init_distributed
+        x, y = self.decode()
+        super().__init__(x=x, y=y, batch_size=source.batch_size, shuffle=shuffle, dataset=source.dataset)
+
+    def decode(self):
+        """
+        :return: Tuple of every image of the source split as a uint8 tensor and every class index as an int64 tensor, both on device
+        """
+        if isinstance(self.source, PackedImageLoader):  # Already uint8, no need to convert
+            return self.source.x.to(self.device, copy=True), self.source.y.to(self.device, copy=True)
+
+        dataset = self.source.dataset
+        loader = data.DataLoader(dataset, batch_size=self.source.batch_size, shuffle=False, num_workers=self.num_workers)
+        x = torch.empty((len(dataset),) + tuple(dataset[0][0].shape), dtype=torch.uint8, device=self.device)
+        y = torch.empty(len(dataset), dtype=torch.int64, device=self.device)
+        start = 0
+        for batch, labels in loader:
+            x[start:start + len(batch)] = torch.round(batch * 255).to(torch.uint8)
+            y[start:start + len(batch)] = labels
+            start += len(batch)
+        return x, y
+
+    def __iter__(self):
+        if self.x is None:
+            self.x, self.y = self.decode()
+        for x, y in super().__iter__():
+            yield x.float().div_(255), y
+
+    def __len__(self):
+        return super().__len__() if self.x is not None else len(self.source)
+
+    def __getstate__(self):
+        """The decoded split is not pickled, it is decoded again from the source loader when first needed"""
+        state = self.__dict__.copy()
+        state['x'], state['y'] = None, None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.device.type == 'cuda' and not torch.cuda.is_available():
+            self.device = torch.device('cpu')
 
 
 class OnlineGeneratedImageDataset(data.Dataset):
@@ -143,6 +428,8 @@ class OnlineGeneratedImageDataset(data.Dataset):
 
         self.device = device
 
+        self.label_sampler = LabelSampler(nc=self.nc, shuffle=True)
+
         self.full_y = self.gen_labels(stratify=stratify)
         self.internal_counter = 0
         self.x, self.y = None, None
@@ -155,38 +442,18 @@ class OnlineGeneratedImageDataset(data.Dataset):
         :param stratify: How to proportion out the labels. If None, a straight average is used.
         :return: One hot encoded labels for the entire generator (shuffled)
         """
-        # Generate array of counts per label to be generated
-        if stratify is None:
-            stratify = [1 / self.nc for i in range(self.nc)]
-        counts = np.round(np.dot(stratify, self.size), decimals=0).astype('int')
-        while np.sum(counts) != self.size:
-            if np.sum(counts) > self.size:
-                counts[random.choice(range(self.nc))] -= 1
-            else:
-                counts[random.choice(range(self.nc))] += 1
-        # Generate array of label names
-        labels = np.empty(self.size)
-        current_index = 0
-        for i in range(self.nc):
-            labels[current_index:(current_index + counts[i])] = i
-            current_index += counts[i]
-        # One hot encode labels
-        arr = self.ohe.transform(labels.reshape(-1, 1))
-        # Shuffle order of labels
-        np.random.shuffle(arr)
-        # Convert to tensor
-        return torch.from_numpy(arr).type(dtype=torch.float32)
+        one_hot, _ = self.label_sampler.sample(num=self.size, stratify=stratify)
+        return one_hot
 
     def gen_data(self, start, stop):
-        """Generate fake training data examples for netE. Requires prior run of gen_labels"""
+        """Generate fake training data examples for netE, left on the device. Requires prior run of gen_labels"""
         stop = min(self.size, stop)  # Cap at length of data set
         y = self.full_y[start:stop].to(self.device)
         self.netG.eval()
 
         with torch.no_grad():
             noise = torch.randn(y.shape[0], self.nz, device=self.device)
-            x = self.netG(noise, y).to('cpu')
-        y = y.to('cpu')
+            x = self.netG(noise, y)
 
         return x, y
 
@@ -0,0 +1,80 @@
+import utils.utils as uu
+
+import numpy as np
+import torch
+
+
+class ImageFeatureStats:
+    """
+    Scores generators against a frozen evaluator already trained on real data (real_netE from benchmarking), without training anything.
+    The feature mean and covariance of the real test set are computed once. Each score is then a single pass of fake images through the evaluator,
+    giving the Frechet distance between the real and fake features and the accuracy of the evaluator on the fake images of each class.
+    """
+    def __init__(self, netE, test_gen, device, nc, nz, bs, num_examples):
+        """
+        :param netE: ImageNetE trained on real data. Only ever run in eval mode, never trained further.
+        :param test_gen: Generator of the real test set
+        :param device: Device to generate and score on
+        :param nc: Number of classes
+        :param nz: Size of the noise vector of netG
+        :param bs: Batch size for generating and scoring
+        :param num_examples: Number of fake images to score (split evenly across classes)
+        """
+        self.netE = netE
+        self.device = device
+        self.nc = nc
+        self.nz = nz
+        self.bs = bs
+        self.num_per_class = int(np.ceil(num_examples / nc))
+
+        feats = []
+        for x, _ in test_gen:
+            feats.append(self.embed(x.to(self.device))[0])
+        self.real_mu, self.real_sigma = self.feature_stats(torch.cat(feats))
+
+    def embed(self, x):
+        """
+        :param x: Batch of images
+        :return: Tuple of features and logits of the evaluator
+        """
+        self.netE.eval()
+        with torch.no_grad(), uu.autocast(device=self.device, enabled=self.netE.mixed_precision):
+            feats = self.netE.embed(x)
+            logits = self.netE.output(feats)
+        return feats.float(), logits.float()
+
+    def score(self, netG):
+        """
+        :param netG: Generator to score
+        :return: Tuple of the Frechet distance to the real test set features and a NumPy array of the accuracy on the fake images of each class
+        """
+        netG.eval()
+        labels = torch.arange(self.nc, device=self.device).repeat_interleave(self.num_per_class)
+        y = torch.eye(self.nc, device=self.device)
+        feats, num_correct = [], torch.zeros(self.nc, device=self.device)
+
+        for start in range(0, len(labels), self.bs):
+            batch_labels = labels[start:start + self.bs]
+            with torch.no_grad():
+                x = netG(torch.randn(len(batch_labels), self.nz, device=self.device), y[batch_labels])
+            batch_feats, logits = self.embed(x)
+            feats.append(batch_feats)
+            num_correct += torch.bincount(batch_labels[logits.argmax(dim=1) == batch_labels], minlength=self.nc).float()
+
+        mu, sigma = self.feature_stats(torch.cat(feats))
+        return self.frechet_distance(mu, sigma), (num_correct / self.num_per_class).cpu().numpy()
+
+    @staticmethod
+    def feature_stats(feats):
+        """Mean and covariance of a batch of features, in float64 NumPy arrays"""
+        feats = feats.cpu().numpy().astype(np.float64)
+        return feats.mean(axis=0), np.cov(feats, rowvar=False)
+
+    def frechet_distance(self, mu, sigma):
+        """
+        Frechet distance between Gaussians fit to the real and fake features: |mu_r - mu_f|^2 + tr(S_r + S_f - 2 (S_r S_f)^(1/2)).
+        The trace of the matrix square root is the sum of the square roots of the eigenvalues of S_r S_f, which are real and non-negative up to round-off.
+        """
+        eigenvalues = np.linalg.eigvals(self.real_sigma.dot(sigma)).real
+        tr_covmean = np.sqrt(np.clip(eigenvalues, 0, None)).sum()
+        return float(np.sum((self.real_mu - mu) ** 2) + np.trace(self.real_sigma) + np.trace(sigma) - 2 * tr_covmean)
@@ -0,0 +1,148 @@
+import CSDGAN.utils.img_data_loading as cuidl
+
+from zipfile import ZipFile, BadZipFile
+from collections import Counter
+from PIL import Image
+import pandas as pd
+import json
+import zlib
+import os
+
+
+class ImageManifest:
+    """
+    Contents of an uploaded image data set (name, label, size and mode of every image), built once at upload from the zip's central directory
+    and the header of each image, without decoding any pixels. Saved as JSON in the run folder, so that later stages and web pages read it
+    instead of scanning the upload again. Images are listed in ImageFolder order (by label, then by name).
+    """
+    filename = 'manifest.json'
+    load_mode = 'RGB'  # Mode images are converted to when loaded, as by the loader of an ImageFolder
+
+    def __init__(self, folder, classes, images):
+        """
+        :param folder: Name of the folder in the zip containing one folder of images per label
+        :param classes: List of label names, sorted
+        :param images: List of tuples of member name, class index, width, height and mode of each image, in ImageFolder order
+        """
+        self.folder = folder
+        self.classes = classes
+        self.images = images
+
+    @classmethod
+    def build(cls, zip_path, folder):
+        """
+        Validates the names in the zip (see img_data_loading.scan_image_zip), then reads the header of every image
+        :param zip_path: Path to the uploaded zip
+        :param folder: Name of the folder in the zip containing one folder of images per label
+        :return: ImageManifest of the zip
+        """
+        dataset_map, labels = cuidl.scan_image_zip(zip_path=zip_path, folder=folder)
+        dataset_map = dataset_map.sort_values(by=['label', 'id'])
+        class_idx = {label: i for i, label in enumerate(labels)}
+
+        images = []
+        with ZipFile(zip_path, 'r') as zip_ref:
+            for name, label in zip(dataset_map['id'], dataset_map['label']):
+                images.append((name, class_idx[label]) + cls.read_header(zip_ref=zip_ref, name=name))
+        return cls(folder=folder, classes=list(labels), images=images)
+
+    @staticmethod
+    def read_header(zip_ref, name):
+        """
+        :param zip_ref: Open ZipFile
+        :param name: Name of an image member of zip_ref
+        :return: Tuple of width, height and mode of the image, read from its header alone
+        """
+        header = None
+        try:
+            with zip_ref.open(name) as f:
+                img = Image.open(f)  # Lazy, only the header is read and parsed
+                header = img.size[0], img.size[1], img.mode
+        except (OSError, BadZipFile, zlib.error):  # Unidentified image (UnidentifiedImageError subclasses OSError) or corrupt member
+            pass
+        assert header is not None, "File %s could not be read as an image. Check that it is not corrupt." % name
+        return header
+
+    @property
+    def num_images(self):
+        return len(self.images)
+
+    @property
+    def num_channels(self):
+        return len(self.load_mode)
+
+    def class_counts(self):
+        """
+        :return: Series of the number of images of each label, indexed by label
+        """
+        counts = Counter(class_idx for _, class_idx, _, _, _ in self.images)
+        return pd.Series([counts[i] for i in range(len(self.classes))], index=pd.Index(self.classes, name='label'))
+
+    def sizes(self):
+        """
+        :return: Counter of the number of images of each size (width, height)
+        """
+        return Counter((width, height) for _, _, width, height, _ in self.images)
+
+    def modes(self):
+        """
+        :return: Counter of the number of images of each mode (e.g. 'RGB', 'L')
+        """
+        return Counter(mode for _, _, _, _, mode in self.images)
+
+    def consistent_size(self):
+        return len(self.sizes()) == 1
+
+    def x_dim(self):
+        """
+        :return: Default image dimensions (height, width): those of the first image if every image has the same size,
+        otherwise the smallest height and width across images, so that every image can be cropped to them
+        """
+        if self.consistent_size():
+            _, _, width, height, _ = self.images[0]
+            return height, width
+        return min(height for _, _, _, height, _ in self.images), min(width for _, _, width, _, _ in self.images)
+
+    def size_statement(self, max_sizes=5):
+        """
+        :return: Statement flagging images of inconsistent sizes, or None if every image has the same size
+        """
+        if self.consistent_size():
+            return None
+        sizes = self.sizes().most_common()
+        listed = ', '.join('%d by %d (%d images)' % (width, height, count) for (width, height), count in sizes[:max_sizes])
+        return "Images are not all the same size: %s%s. Dimensions default to the smallest width and height across images." % \
+               (listed, ' and %d other sizes' % (len(sizes) - max_sizes) if len(sizes) > max_sizes else '')
+
+    def dataset_map(self):
+        """
+        :return: Tuple of table with one row per image, with member name and label as features, and a vector of labels, as returned by scan_image_zip
+        """
+        df = pd.DataFrame(data={'id': [name for name, _, _, _, _ in self.images],
+                                'label': [self.classes[class_idx] for _, class_idx, _, _, _ in self.images]})
+        return df, list(self.classes)
+
+    def save(self, run_dir):
+        """Write the manifest, with a summary of its contents, to its JSON file in run_dir"""
+        state = {'folder': self.folder, 'num_images': self.num_images, 'classes': self.classes,
+                 'class_counts': [int(x) for x in self.class_counts()],
+                 'sizes': [[width, height, count] for (width, height), count in self.sizes().most_common()],
+                 'modes': dict(self.modes()),
+                 'images': [list(x) for x in self.images]}
+        tmp_path = os.path.join(run_dir, self.filename + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, os.path.join(run_dir, self.filename))
+
+    @classmethod
+    def load(cls, run_dir):
+        """
+        :param run_dir: Run folder the manifest was saved to
+        :return: ImageManifest read from the JSON file in run_dir, or None if there is none
+        """
+        path = os.path.join(run_dir, cls.filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            state = json.load(f)
+        return cls(folder=state['folder'], classes=state['classes'], images=[tuple(x) for x in state['images']])
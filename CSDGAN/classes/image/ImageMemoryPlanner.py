@@ -0,0 +1,105 @@
+import CSDGAN.utils.constants as cs
+import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset, ResidentImageLoader
+
+import numpy as np
+import torch
+
+
+class ImageMemoryPlanner:
+    """
+    Decides where the real train, val and test splits of an image run are read from during training:
+    'disk' streams every batch through the loaders of the splits (decoding image files, or reading packed splits),
+    'memory' decodes every split once into host memory and 'device' decodes every split once onto the training device.
+    The footprint of the splits is estimated from their image counts, dimensions and channels (as uint8 images, as held by ResidentImageLoader),
+    without decoding them. The splits go to the device if they fit its budget, otherwise to host memory if they fit the memory budget.
+    """
+    modes = ('disk', 'memory', 'device')
+
+    def __init__(self, memory_budget=cs.IMAGE_MEMORY_BUDGET, device_memory_fraction=cs.IMAGE_DEVICE_MEMORY_FRACTION):
+        """
+        :param memory_budget: Largest footprint held in host memory, in bytes
+        :param device_memory_fraction: Share of the memory of a CUDA device the splits may take up
+        """
+        assert 0 <= device_memory_fraction <= 1, "Device memory fraction must be between 0 and 1"
+
+        self.memory_budget = memory_budget
+        self.device_memory_fraction = device_memory_fraction
+
+    @staticmethod
+    def image_shape(gen):
+        """Shape of the images of a split, read from the header of a packed split or from its first image"""
+        dataset = gen.dataset
+        if isinstance(dataset, PackedImageDataset):
+            return tuple(dataset.header['shape'])
+        return tuple(dataset[0][0].shape)
+
+    @staticmethod
+    def footprint(gen):
+        """
+        :param gen: Loader of a split
+        :return: Tuple of the number of images, the shape of each image and the bytes needed to hold the split decoded (uint8 images and int64 labels)
+        """
+        num_images, shape = len(gen.dataset), ImageMemoryPlanner.image_shape(gen)
+        return num_images, shape, num_images * (int(np.prod(shape)) + 8)
+
+    def device_budget(self, device):
+        """Largest footprint held on device, in bytes. 0 for CPU devices, whose memory is the host memory."""
+        device = torch.device(device)
+        if device.type != 'cuda':
+            return 0
+        return int(torch.cuda.get_device_properties(device).total_memory * self.device_memory_fraction)
+
+    def plan(self, gens, device, mode='auto'):
+        """
+        :param gens: Dictionary of split name to loader
+        :param device: Training device
+        :param mode: 'auto' to decide from the footprint, or one of modes to force it
+        :return: Tuple of the chosen mode and a statement describing the decision
+        """
+        assert mode == 'auto' or mode in self.modes, "Data residency must be 'auto', 'disk', 'memory' or 'device'"
+
+        footprints = {split: self.footprint(gen) for split, gen in gens.items()}
+        total = sum(size for _, _, size in footprints.values())
+        device_budget = self.device_budget(device)
+
+        if mode == 'auto':
+            if 0 < total <= device_budget:
+                mode = 'device'
+            elif total <= self.memory_budget:
+                mode = 'memory'
+            else:
+                mode = 'disk'
+            reason = 'device budget %s, memory budget %s' % (self.format_size(device_budget) if device_budget else 'n/a', self.format_size(self.memory_budget))
+        else:
+            reason = 'forced'
+        if mode == 'device' and torch.device(device).type != 'cuda':
+            mode = 'memory'  # The device is the host
+
+        splits = ', '.join('%s: %d images of %s' % (split, num_images, 'x'.join(str(d) for d in shape)) for split, (num_images, shape, _) in footprints.items())
+        where = {'disk': 'read from disk', 'memory': 'held in host memory', 'device': 'held on ' + str(device)}[mode]
+        statement = "Image splits %s (%s; %s decoded; %s)" % (where, splits, self.format_size(total), reason)
+        return mode, statement
+
+    @staticmethod
+    def apply(gens, device, mode):
+        """
+        :param gens: Dictionary of split name to loader
+        :param device: Training device
+        :param mode: Mode returned by plan
+        :return: Dictionary of split name to loader, ResidentImageLoaders over the decoded splits unless mode is 'disk'
+        """
+        sources = {split: gen.source if isinstance(gen, ResidentImageLoader) else gen for split, gen in gens.items()}
+        if mode == 'disk':
+            return sources
+        resident_device = torch.device(device if mode == 'device' else 'cpu')
+        return {split: gens[split] if isinstance(gens[split], ResidentImageLoader) and gens[split].device == resident_device else
+                ResidentImageLoader(source=gen, device=resident_device, shuffle=cuidl.loader_shuffles(gens[split]))
+                for split, gen in sources.items()}
+
+    @staticmethod
+    def format_size(num_bytes):
+        for unit in ['B', 'KiB', 'MiB', 'GiB']:
+            if num_bytes < 1024 or unit == 'GiB':
+                return '%.1f %s' % (num_bytes, unit)
+            num_bytes /= 1024
@@ -1,4 +1,5 @@
 import utils.image_utils as iu
+import utils.utils as uu
 from CSDGAN.classes.NetUtils import NetUtils, GaussianNoise
 
 import torch.optim as optim
@@ -13,7 +14,7 @@ import matplotlib.pyplot as plt
 
 # Discriminator class
 class ImageNetD(nn.Module, NetUtils):
-    def __init__(self, nf, nc, num_channels, device, path, x_dim, noise=0.0, lr=2e-4, beta1=0.5, beta2=0.999, wd=0):
+    def __init__(self, nf, nc, num_channels, device, path, x_dim, noise=0.0, lr=2e-4, beta1=0.5, beta2=0.999, wd=0, fast_step=False, mixed_precision=False):
         super().__init__()
         NetUtils.__init__(self)
         self.name = "Discriminator"
@@ -51,7 +52,8 @@ class ImageNetD(nn.Module, NetUtils):
         self.m = nn.Sigmoid()
 
         # Loss and Optimizer
-        self.loss_fn = nn.BCELoss()  # BCE Loss combined with sigmoid for numeric stability
+        self.mixed_precision = mixed_precision  # If True, trained on logits with a fused loss that is safe under bfloat16 autocast
+        self.loss_fn = nn.BCEWithLogitsLoss() if self.mixed_precision else nn.BCELoss()
         self.opt = optim.Adam(self.parameters(), lr=lr, betas=(beta1, beta2), weight_decay=wd)
 
         # Initialize weights
@@ -67,17 +69,21 @@ class ImageNetD(nn.Module, NetUtils):
         self.D_G_z1 = []  # Per step
         self.Avg_D_fakes = []  # Store D_G_z1 across epochs
 
+        if fast_step:
+            self.init_step_accumulators(metric_names=['loss', 'D_x', 'D_G_z1'])
+
         # Grad CAM
         self.gradients = None
         self.final_conv_output = None
 
-    def forward(self, img, labels):
+    def forward(self, img, labels, logits=False):
         """
         Deep Convolutional Downsampling Network of Variable Image Size (on creation only)
         layer[0] = Conv2d
         layer[1] = BatchNorm2d
         :param img: Input image of cropped size
         :param labels: Label embedding
+        :param logits: Whether to return the logits instead of applying the sigmoid activation
         :return: Binary classification (sigmoid activation on a single unit hidden layer)
         """
         x = self.noise(img)
@@ -85,6 +91,8 @@ class ImageNetD(nn.Module, NetUtils):
         for i, (layer_name, layer) in enumerate(self.arch.items()):
             if i < (len(self.arch) - 1):
                 x = self.act(layer[1](layer[0](x)))
+            elif uu.is_compiling():  # Grad CAM hooks are not needed for training and would break the compiled graph
+                x = self.act(layer[1](layer[0](x)))
             else:  # Handle final conv layer specially for grad CAM purposes
                 self.final_conv_output = layer[0](x)
                 self.final_conv_output.requires_grad_()
@@ -97,21 +105,35 @@ class ImageNetD(nn.Module, NetUtils):
 
         agg = torch.cat((x, y), dim=1)
         agg = self.act(self.fc_agg(agg))
-        return self.m(self.fc_output(agg))
+        x = self.fc_output(agg)
+        return x if logits else self.m(x)
 
     def train_one_step_real(self, output, label):
         self.zero_grad()
+        output = output.float()  # Loss is always computed in fp32
         self.loss_real = self.loss_fn(output, label)
         self.loss_real.backward()
-        self.D_x.append(output.mean().item())
+        output = torch.sigmoid(output.detach()) if self.mixed_precision else output
+        if self.fast_step:
+            self.accumulate_step_metric('D_x', output.mean())
+        else:
+            self.D_x.append(output.mean().item())
 
     def train_one_step_fake(self, output, label):
+        output = output.float()
         self.loss_fake = self.loss_fn(output, label)
         self.loss_fake.backward()
-        self.D_G_z1.append(output.mean().item())
+        output = torch.sigmoid(output.detach()) if self.mixed_precision else output
+        if self.fast_step:
+            self.accumulate_step_metric('D_G_z1', output.mean())
+        else:
+            self.D_G_z1.append(output.mean().item())
 
     def combine_and_update_opt(self):
-        self.loss.append(self.loss_real.item() + self.loss_fake.item())
+        if self.fast_step:
+            self.accumulate_step_metric('loss', self.loss_real + self.loss_fake)
+        else:
+            self.loss.append(self.loss_real.item() + self.loss_fake.item())
         self.opt.step()
         self.store_weight_and_grad_norms()
 
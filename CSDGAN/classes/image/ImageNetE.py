@@ -18,7 +18,7 @@ import matplotlib.pyplot as plt
 
 # Evaluator class
 class ImageNetE(nn.Module, NetUtils):
-    def __init__(self, train_gen, val_gen, test_gen, device, path, x_dim, num_channels, nc, le, lr, beta1, beta2, wd):
+    def __init__(self, train_gen, val_gen, test_gen, device, path, x_dim, num_channels, nc, le, lr, beta1, beta2, wd, mixed_precision=False):
         super().__init__()
         self.name = "Evaluator"
 
@@ -54,6 +54,7 @@ class ImageNetE(nn.Module, NetUtils):
         self.act = nn.LeakyReLU(0.2)
 
         # Loss and Optimizer
+        self.mixed_precision = mixed_precision  # If True, forward passes are run under bfloat16 autocast
         self.loss = None
         self.loss_fn = nn.CrossEntropyLoss()
         self.opt = optim.Adam(self.parameters(), lr=lr, betas=(beta1, beta2), weight_decay=wd)
@@ -78,8 +79,17 @@ class ImageNetE(nn.Module, NetUtils):
         layer[1] = BatchNorm2d
         layer[2] = MaxPool2d
         """
+        return self.output(self.embed(x, cam=True))  # No softmax activation needed because it is built into CrossEntropyLoss in pytorch
+
+    def embed(self, x, cam=False):
+        """
+        Features of the final hidden layer, used as the feature space for comparing real and fake images
+        :param x: Batch of images
+        :param cam: Whether to hook the final conv layer for grad CAM purposes
+        :return: Batch of features (examples x fc_features)
+        """
         for i, (layer_name, layer) in enumerate(self.arch.items()):
-            if i < (len(self.arch) - 1):
+            if i < (len(self.arch) - 1) or not cam:
                 x = layer[2](self.do2d(self.act(layer[1](layer[0](x)))))
             else:  # Handle final conv layer specially for grad CAM purposes
                 self.final_conv_output = layer[0](x)
@@ -89,8 +99,7 @@ class ImageNetE(nn.Module, NetUtils):
                 x = layer[2](self.do2d(self.act(layer[1](self.final_conv_output))))
 
         x = x.view(-1, self.flattened_dim)
-        x = self.do1d(self.act(self.fc1(x)))
-        return self.output(x)  # No softmax activation needed because it is built into CrossEntropyLoss in pytorch
+        return self.do1d(self.act(self.fc1(x)))
 
     def train_one_epoch_real(self):
         self.train()
@@ -104,28 +113,15 @@ class ImageNetE(nn.Module, NetUtils):
             running_count += len(batch)
         return train_loss / running_count
 
-    def train_one_epoch_fake(self):
-        self.train()
-        train_loss = 0
-        running_count = 0
-        self.train_gen.dataset.next_epoch()
-        for i in range(self.train_gen.dataset.batches_per_epoch):
-            batch, labels = self.train_gen.dataset.next_batch()
-            labels = torch.eye(self.nc)[labels] if len(labels.shape) == 1 else labels
-            self.train_step(batch=batch, labels=labels)
-            # Update running totals
-            train_loss += self.loss
-            running_count += len(batch)
-        return train_loss / running_count
-
     def train_step(self, batch, labels):
         # Forward pass
         batch, labels = batch.to(self.device), labels.to(self.device)
         self.zero_grad()
-        fwd = self.forward(batch)
+        with uu.autocast(device=self.device, enabled=self.mixed_precision):
+            fwd = self.forward(batch)
         # Calculate loss and update optimizer
         label_ind = torch.argmax(labels, -1)
-        self.loss = self.loss_fn(fwd, label_ind)
+        self.loss = self.loss_fn(fwd.float(), label_ind)
         self.loss.backward()
         self.opt.step()
 
@@ -139,27 +135,9 @@ class ImageNetE(nn.Module, NetUtils):
                 # Forward pass
                 labels = torch.eye(self.nc)[labels] if len(labels.shape) == 1 else labels
                 batch, labels = batch.to(self.device), labels.to(self.device)
-                fwd = self.forward(batch)
-                # Calculate loss and accuracy, and update running totals
-                label_ind = torch.argmax(labels, -1)
-                val_loss += self.loss_fn(fwd, label_ind)
-                num_correct += sum(torch.argmax(fwd, -1) == label_ind)
-                running_count += len(batch)
-        return val_loss / running_count, num_correct / running_count
-
-    def eval_once_fake(self, gen):
-        self.eval()
-        val_loss = 0
-        num_correct = torch.zeros(1)
-        running_count = 0
-        gen.dataset.next_epoch()
-        with torch.no_grad():
-            for i in range(gen.dataset.batches_per_epoch):
-                batch, labels = gen.dataset.next_batch()
-                # Forward pass
-                labels = torch.eye(self.nc)[labels] if len(labels.shape) == 1 else labels
-                batch, labels = batch.to(self.device), labels.to(self.device)
-                fwd = self.forward(batch)
+                with uu.autocast(device=self.device, enabled=self.mixed_precision):
+                    fwd = self.forward(batch)
+                fwd = fwd.float()
                 # Calculate loss and accuracy, and update running totals
                 label_ind = torch.argmax(labels, -1)
                 val_loss += self.loss_fn(fwd, label_ind)
@@ -167,19 +145,14 @@ class ImageNetE(nn.Module, NetUtils):
                 running_count += len(batch)
         return val_loss / running_count, num_correct / running_count
 
-    def train_evaluator(self, num_epochs, eval_freq, real, es=None):
+    def train_evaluator(self, num_epochs, eval_freq, es=None):
+        """Train on train_gen, either real data or fake data from a GeneratedImageIterable, evaluating on val_gen every eval_freq epochs"""
         for epoch in range(num_epochs):
-            if real:
-                total_loss = self.train_one_epoch_real()
-            else:
-                total_loss = self.train_one_epoch_fake()
+            total_loss = self.train_one_epoch_real()
             self.train_losses.append(total_loss.item())
 
             if epoch % eval_freq == 0 or (epoch == num_epochs - 1):
-                if real:
-                    total_loss, total_acc = self.eval_once_real(gen=self.val_gen)
-                else:
-                    total_loss, total_acc = self.eval_once_fake(gen=self.val_gen)
+                total_loss, total_acc = self.eval_once_real(gen=self.val_gen)
                 self.val_losses.append(total_loss.item())
                 self.val_acc.append(total_acc.item())
 
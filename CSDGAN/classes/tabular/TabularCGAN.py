@@ -3,15 +3,21 @@ import utils.utils as uu
 import CSDGAN.utils.db as db
 from CSDGAN.classes.tabular.TabularNetG import TabularNetG
 from CSDGAN.classes.tabular.TabularNetD import TabularNetD
+from CSDGAN.classes.tabular.TabularReencoder import TabularReencoder
+from CSDGAN.classes.tabular.TabularDecoder import TabularDecoder
+from CSDGAN.classes.tabular.TabularFidelity import TabularFidelity
 from CSDGAN.classes.CGANUtils import CGANUtils
-from CSDGAN.classes.NetUtils import GaussianNoise
+from CSDGAN.classes.EvaluationContext import EvaluationContext
+from CSDGAN.classes.LabelSampler import LabelSampler
 
+from torch.utils import data
 import time
 import numpy as np
-import random
 import torch
 import pandas as pd
 import matplotlib.pyplot as plt
+from joblib import Parallel, delayed
+import threading
 import os
 
 
@@ -20,7 +26,9 @@ class TabularCGAN(CGANUtils):
                  netG_H, netG_lr, netG_beta1, netG_beta2, netG_wd,
                  netD_H, netD_lr, netD_beta1, netD_beta2, netD_wd,
                  eval_param_grid, eval_folds, test_ranges, seed, eval_stratify,
-                 label_noise, label_noise_linear_anneal, discrim_noise, discrim_noise_linear_anneal):
+                 label_noise, label_noise_linear_anneal, discrim_noise, discrim_noise_linear_anneal, fast_step=False, mixed_precision=False, compile_nets=False,
+                 eval_n_jobs=None, async_eval=False, eval_backend='sklearn', adaptive_eval=False,
+                 eval_budget=None, eval_metric='evaluator', checkpoint_top_k=None):
         super().__init__()
 
         self.path = path  # default file path for saved objects
@@ -36,12 +44,32 @@ class TabularCGAN(CGANUtils):
         self.labels_list = self.data_gen.dataset.labels_list
         self.out_dim = self.data_gen.dataset.out_dim
 
+        # Label sampler, reencoder and decoder of generated data
+        self.label_sampler = None
+        self.reencoder = None
+        self.decoder = None
+        self.init_codecs()
+
         # Evaluator properties
         self.eval_param_grid = eval_param_grid
         self.eval_folds = eval_folds
         self.test_ranges = test_ranges
         self.seed = seed
         self.eval_stratify = eval_stratify
+        self.eval_n_jobs = eval_n_jobs  # CPU budget for evaluation. If None, all CPUs are used.
+        self.async_eval = async_eval  # Whether to evaluate snapshots of netG in the background while training continues
+        self.adaptive_eval = adaptive_eval  # Whether to schedule evaluations with an EvaluationScheduler instead of every eval_freq epochs
+        self.eval_budget = eval_budget  # Maximum number of evaluations per call to train_gan when evaluating adaptively
+        assert eval_backend in {'sklearn', 'torch'}, "Evaluation backend must be one of 'sklearn' or 'torch'"
+        self.eval_backend = eval_backend  # Logistic regression backend for evaluation, see uu.train_test_logistic_reg
+        self.eval_warm_starts = {}  # Fitted weights of the torch backend by test range, to warm start the next evaluation
+
+        # 'evaluator' fits logistic regressions on fake data of each test range and scores them on the real test set.
+        # 'fidelity' compares the distributions of fake data and the real test set with a TabularFidelity and selects by its overall distance.
+        assert eval_metric in {'evaluator', 'fidelity'}, "Evaluation metric must be either 'evaluator' or 'fidelity'"
+        self.eval_metric = eval_metric
+        self.fidelity = None  # Built lazily through get_fidelity
+        self.checkpoint_top_k = checkpoint_top_k  # Number of best generators to keep on disk, see CheckpointRegistry. If None, all are kept.
 
         # Anti-discriminator properties
         assert 0.0 <= label_noise <= 1.0, "Label noise must be between 0 and 1"
@@ -53,12 +81,22 @@ class TabularCGAN(CGANUtils):
         self.discrim_noise_linear_anneal = discrim_noise_linear_anneal
         self.dn_rate = 0.0
 
+        # Keep per step metrics on device, only syncing once per epoch
+        self.fast_step = fast_step
+
+        # Run forward passes under bfloat16 autocast. Optimizers and losses stay in fp32.
+        assert not mixed_precision or uu.mixed_precision_supported(), "Mixed precision requires a version of torch with autocast support"
+        self.mixed_precision = mixed_precision
+
+        # Compile netG and netD forward passes for the training loop. Compilation happens lazily on the first training step.
+        self.compile_nets = compile_nets
+
         # Instantiate sub-nets
         self.netG = TabularNetG(nz=self.nz, H=netG_H, out_dim=self.out_dim, nc=self.nc, device=self.device,
                                 wd=netG_wd, cat_mask=self.data_gen.dataset.preprocessed_cat_mask, le_dict=self.data_gen.dataset.le_dict,
-                                lr=netG_lr, beta1=netG_beta1, beta2=netG_beta2).to(device)
+                                lr=netG_lr, beta1=netG_beta1, beta2=netG_beta2, fast_step=self.fast_step, mixed_precision=self.mixed_precision).to(device)
         self.netD = TabularNetD(H=netD_H, out_dim=self.out_dim, nc=self.nc, device=self.device, wd=netD_wd, noise=self.discrim_noise,
-                                lr=netD_lr, beta1=netD_beta1, beta2=netD_beta2).to(device)
+                                lr=netD_lr, beta1=netD_beta1, beta2=netD_beta2, fast_step=self.fast_step, mixed_precision=self.mixed_precision).to(device)
         self.nets = {self.netG, self.netD}
 
         # Training properties
@@ -67,6 +105,31 @@ class TabularCGAN(CGANUtils):
         self.real_label = 1
         self.fake_label = 0
         self.stored_acc = []
+        self.stored_fidelity = []  # Dictionaries of distances returned by TabularFidelity.score, if eval_metric is 'fidelity'
+
+    def __setstate__(self, state):
+        """Build the label sampler, reencoder and decoder of CGANs pickled before they were added"""
+        super().__setstate__(state)
+        if self.label_sampler is None:
+            self.init_codecs()
+
+    def state_defaults(self):
+        """Defaults of the attributes added to tabular CGANs as well"""
+        defaults = super().state_defaults()
+        defaults.update({'label_sampler': None, 'reencoder': None, 'decoder': None, 'eval_n_jobs': None, 'eval_backend': 'sklearn', 'eval_warm_starts': {},
+                         'fidelity': None, 'stored_fidelity': []})
+        return defaults
+
+    def init_codecs(self):
+        """Build the objects converting between generated data and the basis of the original data, from the encoders of the data set"""
+        # One hot columns of generated labels follow the pd.get_dummies encoding of the real labels
+        self.label_sampler = LabelSampler(nc=self.nc, device=self.device, columns=pd.get_dummies(self.labels_list).values.argmax(1).tolist())
+
+        # Snaps generated categorical outputs to one hot encodings
+        self.reencoder = TabularReencoder(le_dict=self.data_gen.dataset.le_dict)
+
+        # Inverse transforms reencoded data back to the basis of the original data
+        self.decoder = TabularDecoder(dataset=self.data_gen.dataset)
 
     def train_gan(self, num_epochs, cadence, print_freq, eval_freq=None, run_id=None, logger=None, retrain=False):
         """
@@ -84,9 +147,19 @@ class TabularCGAN(CGANUtils):
         total_epochs = self.epoch + num_epochs
         device_check = self.data_gen.dataset.device != self.device
 
+        # Data set already lives on the training device - skip the DataLoader's per row __getitem__ calls and collate
+        if device_check:
+            batch_gen = self.data_gen
+        else:
+            batch_gen = self.data_gen.dataset.batch_iterator(batch_size=self.data_gen.batch_size,
+                                                             shuffle=isinstance(self.data_gen.sampler, data.RandomSampler),
+                                                             drop_last=self.data_gen.drop_last)
+
         if run_id:
             checkpoints = [int(num_epochs * i / 4) for i in range(1, 4)]
 
+        scheduler = self.init_eval_scheduler(eval_freq=eval_freq, num_epochs=num_epochs)
+
         if self.label_noise_linear_anneal:
             self.ln_rate = self.label_noise / num_epochs
 
@@ -98,7 +171,7 @@ class TabularCGAN(CGANUtils):
         start_time = time.time()
         for epoch in range(num_epochs):
             for i in range(cadence):
-                for x, y in self.data_gen:
+                for x, y in batch_gen:
                     if device_check:
                         x, y = x.to(self.device), y.to(self.device)
                     self.train_one_step(x, y)
@@ -111,10 +184,15 @@ class TabularCGAN(CGANUtils):
 
                 self.print_progress(total_epochs=total_epochs, run_id=run_id, logger=logger)
 
-            if eval_freq is not None:
-                if self.epoch % eval_freq == 0 or (self.epoch == num_epochs):
-                    self.stored_acc.append(self.test_model(stratify=self.eval_stratify, run_id=run_id))
-                    uu.train_log_print(run_id=run_id, logger=logger, statement="Epoch: %d\tEvaluator Score: %.4f" % (self.epoch, np.max(self.stored_acc[-1])))
+            if self.eval_due(eval_freq=eval_freq, num_epochs=num_epochs, scheduler=scheduler, run_id=run_id, logger=logger):
+                if self.async_eval:
+                    self.submit_evaluation(stratify=self.eval_stratify)
+                else:
+                    self.store_evaluation(self.test_model(stratify=self.eval_stratify, run_id=run_id))
+                    self.record_checkpoint(epoch=self.epoch)
+                    uu.train_log_print(run_id=run_id, logger=logger, statement=self.eval_statement(epoch=self.epoch))
+
+            self.collect_evaluations(run_id=run_id, logger=logger)
 
             if run_id:
                 if self.epoch in checkpoints:
@@ -124,6 +202,10 @@ class TabularCGAN(CGANUtils):
                     status_id = status_id.replace('Train', 'Retrain') if retrain else status_id
                     db.query_set_status(run_id=run_id, status_id=cs.STATUS_DICT[status_id])
 
+        if self.async_evaluator is not None and self.async_evaluator.pending:
+            uu.train_log_print(run_id=run_id, logger=logger, statement="Waiting for %d pending evaluations" % len(self.async_evaluator.pending))
+            self.collect_evaluations(wait=True, run_id=run_id, logger=logger)
+
         uu.train_log_print(run_id=run_id, logger=logger, statement="Total training time: %ds" % (time.time() - og_start_time))
         uu.train_log_print(run_id=run_id, logger=logger, statement="Training complete")
 
@@ -132,29 +214,106 @@ class TabularCGAN(CGANUtils):
         Train a model on fake data and evaluate on test data in order to evaluate network as it trains
         :param stratify: How to proportion out the labels. If None, a straight average is used.
         :param run_id: Only included if being run as part of the csdgan app
-        :return: Tuple of list of classes trained and the scores each achieved
+        :return: Scores returned by score_netG
         """
-        fake_scores = []
+        fake_scores = self.score_netG(netG=self.netG, stratify=stratify)
 
-        for size in self.test_ranges:
-            genned_data, genned_labels = self.gen_fake_data(bs=size, stratify=stratify)
+        if run_id:
+            db.query_verify_live_run(run_id=run_id)
 
-            if self.data_gen.dataset.le_dict is not None:
-                genned_data = self.reencode(genned_data, self.data_gen.dataset.le_dict)
+        self.checkpoint_netG()
 
-            score_fake_tmp = uu.train_test_logistic_reg(x_train=genned_data, y_train=genned_labels,
-                                                        x_test=self.data_gen.dataset.x_test.cpu().detach().numpy(), y_test=self.data_gen.dataset.y_test.cpu().detach().numpy(),
-                                                        param_grid=self.eval_param_grid, cv=self.eval_folds, random_state=self.seed,
-                                                        labels_list=self.labels_list, verbose=0)
+        return fake_scores
 
-            fake_scores.append(score_fake_tmp)
+    def score_netG(self, netG, stratify=None):
+        """
+        Train models on data generated by netG (one per test range) and evaluate them on test data
+        :param netG: Generator to evaluate, either self.netG or a copy of it being evaluated in the background
+        With the 'fidelity' metric, compare the distributions of data generated by netG and of the test data instead.
+        :param stratify: How to proportion out the labels. If None, a straight average is used.
+        :return: List of scores achieved, one per test range, or dictionary of distances for 'fidelity'
+        """
+        if self.eval_metric == 'fidelity':
+            return self.score_fidelity(netG=netG, stratify=stratify)
+
+        # Generate every fake data set up front so that evaluators can be fit concurrently
+        genned = [self.gen_fake_data(bs=size, stratify=stratify, reencode=True, netG=netG) for size in self.test_ranges]
+
+        # Split the CPU budget between concurrent fits rather than letting each fit use every CPU.
+        # Background evaluations, which run while training continues in another thread, fit one at a time with the whole budget instead.
+        n_jobs = self.eval_n_jobs or os.cpu_count() or 1
+        num_workers = max(1, min(len(genned), n_jobs)) if threading.current_thread() is threading.main_thread() else 1
+        context = self.get_eval_context()
+        fit_kwargs = {'x_test': context.x_test, 'y_test': context.y_test,
+                      'param_grid': self.eval_param_grid, 'cv': self.eval_folds, 'random_state': self.seed, 'labels_list': self.labels_list, 'verbose': 0}
+
+        if self.eval_backend == 'torch':
+            # Batched torch fits stay in process, warm starting from the weights fit on the same test range in the previous evaluation
+            return [uu.train_test_logistic_reg(x_train=x, y_train=y, backend='torch', device=self.device,
+                                               warm_start=self.eval_warm_starts.setdefault(size, {}), **fit_kwargs)
+                    for size, (x, y) in zip(self.test_ranges, genned)]
+
+        fit_kwargs['n_jobs'] = max(1, n_jobs // num_workers)
+        if num_workers == 1:
+            return [uu.train_test_logistic_reg(x_train=x, y_train=y, **fit_kwargs) for x, y in genned]
+
+        # Loky starts fresh worker processes rather than forking this one, whose torch thread pools are already running.
+        # The largest data sets are dispatched first so they do not end up running alone at the end.
+        order = sorted(range(len(genned)), key=lambda i: -len(genned[i][1]))
+        scores = Parallel(n_jobs=num_workers, backend='loky')(delayed(uu.train_test_logistic_reg)(x_train=genned[i][0], y_train=genned[i][1], **fit_kwargs)
+                                                              for i in order)
+        scores = dict(zip(order, scores))
+        return [scores[i] for i in range(len(genned))]
+
+    def init_eval_context(self):
+        """Build the EvaluationContext of the test split of the data set"""
+        return EvaluationContext.from_tabular_dataset(self.data_gen.dataset)
+
+    def score_fidelity(self, netG, stratify=None):
+        """
+        :param netG: Generator to evaluate
+        :param stratify: How to proportion out the labels. If None, a straight average is used.
+        :return: Dictionary of distances between cs.TABULAR_FIDELITY_NUM_EXAMPLES rows generated by netG and the test data, see TabularFidelity.score
+        """
+        one_hot, _ = self.label_sampler.sample(num=cs.TABULAR_FIDELITY_NUM_EXAMPLES, stratify=stratify)
+        noise = torch.randn(cs.TABULAR_FIDELITY_NUM_EXAMPLES, self.nz, device=self.device)
 
-            if run_id:
-                db.query_verify_live_run(run_id=run_id)
+        netG.eval()
+        with torch.no_grad():
+            fake_data = self.reencode(netG(noise, one_hot))
 
-            torch.save(self.netG.state_dict(), os.path.join(self.path, "stored_generators", "Epoch_" + str(self.epoch) + "_Generator.pt"))
+        # Classes are identified by their one hot column on both sides, as in the EvaluationContext
+        return self.get_fidelity().score(x_fake=fake_data.cpu().numpy(), y_fake=one_hot.argmax(dim=1).cpu().numpy())
 
-        return fake_scores
+    def get_fidelity(self):
+        """
+        :return: TabularFidelity of the test data, built the first time it is needed
+        """
+        if self.fidelity is None:
+            context = self.get_eval_context()
+            self.fidelity = TabularFidelity(x_real=context.x_test, y_real=context.y_idx, le_dict=self.data_gen.dataset.le_dict, nc=self.nc)
+        return self.fidelity
+
+    def store_evaluation(self, result):
+        """Store the scores returned by score_netG"""
+        if self.eval_metric == 'fidelity':
+            self.stored_fidelity.append(result)
+        else:
+            self.stored_acc.append(result)
+
+    def checkpoint_scores(self):
+        """Best score across test ranges of each evaluation, or its overall distance for 'fidelity'"""
+        if self.eval_metric == 'fidelity':
+            return [result['fidelity'] for result in self.stored_fidelity]
+        return super().checkpoint_scores()
+
+    def eval_statement(self, epoch):
+        """Statement logging the latest evaluation"""
+        if self.eval_metric != 'fidelity':
+            return super().eval_statement(epoch=epoch)
+        result = self.stored_fidelity[-1]
+        return "Epoch: %d\tFidelity: %.4f\tKS: %.4f\tTV: %.4f\tCorrelation: %.4f" % (epoch, result['fidelity'], np.mean(result['ks']) if result['ks'].size else 0,
+                                                                                   np.mean(result['tv']) if result['tv'].size else 0, result['corr'])
 
     def next_epoch(self):
         """Run netG and netD methods to prepare for next epoch. Mostly saves histories and resets history collection objects."""
@@ -169,22 +328,30 @@ class TabularCGAN(CGANUtils):
         # Anneal noise rates
         self.label_noise -= self.ln_rate
         self.discrim_noise -= self.dn_rate
-        self.netD.noise = GaussianNoise(device=self.device, sigma=self.discrim_noise)
+        self.netD.noise.set_sigma(self.discrim_noise)
 
-    def gen_fake_data(self, bs, stratify=None):
+    def gen_fake_data(self, bs, stratify=None, reencode=False, netG=None):
         """
         Generate fake data. Calls gen_labels method below.
         :param bs: Batch size of fake data to generate
         :param stratify: How to proportion out the labels. If None, a straight average is used.
+        :param reencode: Whether to reencode categorical variables (on device) before returning the data
+        :param netG: Generator to use. If None, self.netG is used.
         :return: Tuple of generated data and associated labels
         """
+        if netG is None:
+            netG = self.netG
+
         noise = torch.randn(bs, self.nz, device=self.device)
         fake_labels, output_labels = self.gen_labels(num=bs, stratify=stratify)
         fake_labels = fake_labels.to(self.device)
 
-        self.netG.eval()
+        netG.eval()
         with torch.no_grad():
-            fake_data = self.netG(noise, fake_labels).cpu().detach().numpy()
+            fake_data = netG(noise, fake_labels)
+            if reencode:
+                fake_data = self.reencode(fake_data)
+            fake_data = fake_data.cpu().detach().numpy()
 
         return fake_data, output_labels
 
@@ -193,80 +360,18 @@ class TabularCGAN(CGANUtils):
         Generate labels for generating fake data
         :param num: Number of desired labels
         :param stratify: How to proportion out the labels. If None, a straight average is used.
-        :return: Tuple of one hot encoded labels and the labels themselves
+        :return: Tuple of one hot encoded labels (on device) and the labels themselves
         """
-        if stratify is None:
-            stratify = [1 / self.nc for i in range(self.nc)]
-        counts = np.round(np.dot(stratify, num), decimals=0).astype('int')
-        while np.sum(counts) != num:
-            if np.sum(counts) > num:
-                counts[random.choice(range(self.nc))] -= 1
-            else:
-                counts[random.choice(range(self.nc))] += 1
-        output_one_hot = np.empty((0, self.nc))
-        one_hot = pd.get_dummies(self.labels_list)
-        output_labels = np.empty(0)
-        for i in range(self.nc):
-            tmp_one_hot = np.empty((counts[i], self.nc))
-            tmp_labels = np.full(counts[i], self.labels_list[i])
-            output_labels = np.concatenate((output_labels, tmp_labels), axis=0)
-            for j in range(self.nc):
-                tmp_one_hot[:, j] = one_hot.iloc[i, j]
-            output_one_hot = np.concatenate((output_one_hot, tmp_one_hot), axis=0)
-            output_one_hot = torch.tensor(output_one_hot, dtype=torch.float)
-        return output_one_hot, output_labels
-
-    def reencode(self, raw_fake_output, le_dict):
+        one_hot, idx = self.label_sampler.sample(num=num, stratify=stratify)
+        return one_hot, np.asarray(self.labels_list)[idx.cpu().numpy()]
+
+    def reencode(self, data):
         """
-        Reencode categorical variables with the label encoder
-        :param raw_fake_output: Data generated by netG
-        :param le_dict: Dictionary of LabelEncoders to be used for inverse transformation back to original raw data
+        Reencode categorical variables with the label encoder, in place
+        :param data: Data generated by netG, either a numpy array or a torch tensor
         :return: Generated data inverse transformed and prepared for train_test_logistic_reg method. Data is still scaled and one hot encoded.
         """
-        curr = 0
-        new_fake_output = np.copy(raw_fake_output)
-        for _, le in le_dict.items():
-            n = len(le.classes_)
-            newcurr = curr + n
-            max_idx = np.argmax(raw_fake_output[:, curr:newcurr], 1)
-            new_fake_output[:, curr:newcurr] = np.eye(n)[max_idx]
-            curr = newcurr
-        return new_fake_output
-
-    def rev_ohe_le_scaler(self, data, genned_labels, dep_var, preprocessed_cat_mask, ohe, le_dict, scaler, cat_inputs, cont_inputs, int_inputs):
-        """
-        :param data: Output of reencode method
-        :param genned_labels: Labels corresponding to generated data
-        :return: Generated data fully inverse transformed to be on the same basis as the original raw data
-        """
-        df = pd.DataFrame(index=range(data.shape[0]), columns=[dep_var] + list(cat_inputs) + list(cont_inputs))
-
-        # Add labels
-        df[dep_var] = genned_labels
-
-        # Split into cat and cont variables
-        cat_arr = data[:, preprocessed_cat_mask]
-        cont_arr = data[:, ~preprocessed_cat_mask]
-
-        # Inverse transform categorical variables
-        if any(self.data_gen.dataset.ohe.categorical_features):  # Check for any categorical features
-            numerics = ohe.inverse_transform(cat_arr)
-            for i, le in enumerate(le_dict.items()):
-                df[le[0]] = le[1].inverse_transform(numerics[:, i].astype('int'))
-        # Inverse transform continuous variables
-        if scaler is None:
-            og_cont_arr = cont_arr
-        else:
-            og_cont_arr = scaler.inverse_transform(cont_arr)
-        df[cont_inputs] = og_cont_arr
-
-        # Round integer inputs
-        df[int_inputs] = df[int_inputs].round(decimals=0).astype('int')
-
-        # Fix data types to match original DataFrame
-        df = df.astype(self.data_gen.dataset.df_dtypes)
-
-        return df
+        return self.reencoder.reencode(data)
 
     def plot_progress(self, benchmark_acc, show, save=None):
         """
@@ -278,6 +383,9 @@ class TabularCGAN(CGANUtils):
         if save is None:
             save = self.path
 
+        if self.eval_metric == 'fidelity':
+            return self.plot_fidelity(show=show, save=save)
+
         length = len(self.stored_acc)
         num_tests = len(self.test_ranges)
 
@@ -304,35 +412,38 @@ class TabularCGAN(CGANUtils):
             assert os.path.exists(save), "Check that the desired save path exists."
             plt.savefig(os.path.join(save, cs.FILENAME_PLOT_PROGRESS), bbox_inches='tight', dpi=100)
 
+    def plot_fidelity(self, show, save):
+        """Plot the distances of each evaluation with the 'fidelity' metric. Saved under the same file name as plot_progress."""
+        xs = np.arange(1, len(self.stored_fidelity) + 1)
+        plt.plot(xs, [x['fidelity'] for x in self.stored_fidelity], label='Fidelity', linewidth=2)
+        if self.stored_fidelity and self.stored_fidelity[0]['ks'].size:
+            plt.plot(xs, [np.mean(x['ks']) for x in self.stored_fidelity], label='KS')
+        if self.stored_fidelity and self.stored_fidelity[0]['tv'].size:
+            plt.plot(xs, [np.mean(x['tv']) for x in self.stored_fidelity], label='TV')
+        plt.plot(xs, [x['corr'] for x in self.stored_fidelity], label='Correlation')
+
+        plt.xlabel('Evaluation', fontweight='bold')
+        plt.ylabel('Distance', fontweight='bold')
+        plt.title('Fidelity Over Training Evaluations', fontweight='bold')
+        plt.legend()
+
+        if show:
+            plt.show()
+
+        if save:
+            assert os.path.exists(save), "Check that the desired save path exists."
+            plt.savefig(os.path.join(save, cs.FILENAME_PLOT_PROGRESS), bbox_inches='tight', dpi=100)
+
     def gen_data(self, size, stratify=None):
         """Generates a data set formatted like the original data"""
-        genned_data, genned_labels = self.gen_fake_data(bs=size, stratify=stratify)
-        genned_data = self.reencode(genned_data, self.data_gen.dataset.le_dict)
-        genned_data_df = self.rev_ohe_le_scaler(data=genned_data,
-                                                genned_labels=genned_labels,
-                                                dep_var=self.data_gen.dataset.dep_var,
-                                                preprocessed_cat_mask=self.data_gen.dataset.preprocessed_cat_mask,
-                                                ohe=self.data_gen.dataset.ohe,
-                                                le_dict=self.data_gen.dataset.le_dict,
-                                                scaler=self.data_gen.dataset.scaler,
-                                                cat_inputs=self.data_gen.dataset.cat_inputs,
-                                                cont_inputs=self.data_gen.dataset.cont_inputs,
-                                                int_inputs=self.data_gen.dataset.int_inputs)
+        genned_data, genned_labels = self.gen_fake_data(bs=size, stratify=stratify, reencode=True)
+        genned_data_df = self.decoder.decode(data=genned_data, labels=genned_labels)
         return genned_data_df
 
     def gen_og_data(self):
         """Rebuilds the original data set via the data_gen.dataset"""
         data = np.concatenate((self.data_gen.dataset.x_train.cpu().numpy(), self.data_gen.dataset.x_test.cpu().numpy()), axis=0)
         labels = np.concatenate((self.data_gen.dataset.y_train.cpu().numpy(), self.data_gen.dataset.y_test.cpu().numpy()), axis=0).argmax(axis=1)
-        data = self.reencode(data, self.data_gen.dataset.le_dict)
-        data_df = self.rev_ohe_le_scaler(data=data,
-                                         genned_labels=labels,
-                                         dep_var=self.data_gen.dataset.dep_var,
-                                         preprocessed_cat_mask=self.data_gen.dataset.preprocessed_cat_mask,
-                                         ohe=self.data_gen.dataset.ohe,
-                                         le_dict=self.data_gen.dataset.le_dict,
-                                         scaler=self.data_gen.dataset.scaler,
-                                         cat_inputs=self.data_gen.dataset.cat_inputs,
-                                         cont_inputs=self.data_gen.dataset.cont_inputs,
-                                         int_inputs=self.data_gen.dataset.int_inputs)
+        data = self.reencode(data)
+        data_df = self.decoder.decode(data=data, labels=labels)
         return data_df
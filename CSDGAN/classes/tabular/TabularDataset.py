@@ -1,3 +1,4 @@
+from CSDGAN.classes.TensorBatchIterator import TensorBatchIterator
 from torch.utils import data
 import utils.utils as uu
 import torch
@@ -91,3 +92,11 @@ class TabularDataset(data.Dataset):
 
     def get_dev(self):
         return self.x_train.device
+
+    def batch_iterator(self, batch_size, shuffle=True, drop_last=False, fixed_shape=False):
+        """
+        Fast path for iterating over the training set once it is tensor-resident (i.e. after to_dev). See TensorBatchIterator for details.
+        :return: TensorBatchIterator over x_train and y_train
+        """
+        return TensorBatchIterator(x=self.x_train, y=self.y_train, batch_size=batch_size, shuffle=shuffle, drop_last=drop_last, fixed_shape=fixed_shape,
+                                   dataset=self)
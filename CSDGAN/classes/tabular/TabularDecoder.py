@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+class TabularDecoder:
+    """
+    Inverse transforms reencoded data (one hot encoded categorical columns first, followed by scaled continuous columns) back to the basis of the
+    original raw DataFrame. Built once from the encoders of a TabularDataset:
+    categorical levels are looked up directly from their one hot positions in arrays of the original values, continuous columns are unscaled with a
+    single multiply-add, and every column is produced in its original dtype before the DataFrame is built.
+    """
+    def __init__(self, dataset):
+        """
+        :param dataset: TabularDataset whose encoders and scaler were used to preprocess the data
+        """
+        self.dep_var = dataset.dep_var
+        self.cat_inputs = list(dataset.le_dict)
+        self.cont_inputs = list(dataset.cont_inputs)
+        self.int_inputs = set(dataset.int_inputs)
+        self.dtypes = dataset.df_dtypes
+
+        sizes = np.array([len(le.classes_) for _, le in dataset.le_dict.items()], dtype=np.int64)
+        self.num_cat = int(sizes.sum())
+        assert dataset.preprocessed_cat_mask[:self.num_cat].all() and not dataset.preprocessed_cat_mask[self.num_cat:].any(), \
+            "Categorical columns must precede continuous columns"
+
+        # Maps one hot columns to the index of their level within each feature (one hot data @ level_idx -> index of hot level per feature)
+        self.level_idx = np.zeros((self.num_cat, len(sizes)), dtype=np.float32)
+        starts = np.cumsum(sizes) - sizes
+        for i, (start, size) in enumerate(zip(starts, sizes)):
+            self.level_idx[start:start + size, i] = np.arange(size)
+
+        # Original values of each level, already in the dtype of the original column where possible
+        self.lookups = [self.to_dtype(le.classes_, self.dtypes[name]) for name, le in dataset.le_dict.items()]
+
+        if dataset.scaler is None:
+            self.scale, self.mean = None, None
+        else:
+            num_cont = len(self.cont_inputs)
+            self.scale = np.ones(num_cont) if dataset.scaler.scale_ is None else dataset.scaler.scale_.astype(np.float64)
+            self.mean = np.zeros(num_cont) if dataset.scaler.mean_ is None else dataset.scaler.mean_.astype(np.float64)
+
+    def decode(self, data, labels):
+        """
+        :param data: Output of reencode method (categorical features must be exactly one hot)
+        :param labels: Labels corresponding to data
+        :return: DataFrame with the dependent variable, categorical and continuous features on the same basis and with the same dtypes as the original raw data
+        """
+        columns = {self.dep_var: self.to_dtype(np.asarray(labels), self.dtypes[self.dep_var])}
+
+        if self.num_cat > 0:
+            codes = np.rint(np.dot(data[:, :self.num_cat], self.level_idx)).astype(np.int64)
+            for i, name in enumerate(self.cat_inputs):
+                columns[name] = self.lookups[i][codes[:, i]]
+
+        cont = np.array(data[:, self.num_cat:], dtype=np.float64, order='F')  # Column major so that each feature is a contiguous view
+        if self.scale is not None:
+            cont *= self.scale
+            cont += self.mean
+        for i, name in enumerate(self.cont_inputs):
+            col = cont[:, i]
+            if name in self.int_inputs:
+                col = np.rint(col, out=col).astype(np.int64)
+            columns[name] = self.to_dtype(col, self.dtypes[name])
+
+        return pd.DataFrame(columns, columns=list(columns))
+
+    @staticmethod
+    def to_dtype(arr, dtype):
+        """Cast arr to dtype, using pandas extension arrays for dtypes numpy does not support (e.g. category)"""
+        if pd.api.types.is_extension_array_dtype(dtype):
+            return pd.array(arr, dtype=dtype)
+        return arr.astype(dtype, copy=False)
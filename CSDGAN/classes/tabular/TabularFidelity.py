@@ -0,0 +1,189 @@
+import numpy as np
+
+
+class TabularFidelity:
+    """
+    Distances between the marginal and pairwise distributions of real and generated data, computed on the encoded matrices produced by TabularDataset
+    (one hot encoded categorical columns first, in the order of le_dict, followed by scaled continuous columns), overall and within each class:
+    KS statistic of each continuous column, total variation distance of each categorical feature, and mean absolute difference of the correlation matrices.
+    Statistics of the real data are computed once. Scoring is vectorized across columns and classes, so that it is cheap enough to run as an evaluation metric.
+    All distances are between 0 (identical distributions) and 1, lower is better.
+    """
+    def __init__(self, x_real, y_real, le_dict, nc):
+        """
+        :param x_real: NumPy array of real data, encoded and scaled as by TabularDataset
+        :param y_real: NumPy array of the class index of each row of x_real
+        :param le_dict: Dictionary of LabelEncoders, one per categorical feature
+        :param nc: Number of classes
+        """
+        assert x_real.shape[0] == y_real.shape[0], "x_real and y_real must have the same number of rows"
+
+        self.nc = nc
+        self.sizes = np.array([len(le.classes_) for _, le in le_dict.items()], dtype=np.int64)
+        self.starts = np.cumsum(self.sizes) - self.sizes  # First column of each categorical feature
+        self.num_cat = int(self.sizes.sum())
+
+        x_real, y_real = self.sort_by_class(x=x_real, y=y_real)
+        self.real_cont = x_real[:, self.num_cat:]
+        self.real_y = y_real
+        self.real_counts = np.bincount(y_real, minlength=nc)
+        self.class_weights = self.real_counts / self.real_counts.sum()
+        self.real_freqs, self.real_class_freqs = self.level_freqs(x=x_real, counts=self.real_counts)
+        self.real_corr, self.real_class_corr = self.corrs(x=x_real, counts=self.real_counts)
+
+    def score(self, x_fake, y_fake):
+        """
+        :param x_fake: NumPy array of generated data, with categorical features reencoded to one hot encodings
+        :param y_fake: NumPy array of the class index of each row of x_fake
+        :return: Dictionary of distances. 'ks' (per continuous column), 'tv' (per categorical feature) and 'corr' compare the whole data sets,
+        'class_ks', 'class_tv' and 'class_corr' compare each class (NaN for classes missing from either data set),
+        and 'fidelity' is the mean of the six, with classes weighted by their share of the real data.
+        """
+        x_fake, y_fake = self.sort_by_class(x=x_fake, y=y_fake)
+        fake_counts = np.bincount(y_fake, minlength=self.nc)
+        present = (self.real_counts > 0) & (fake_counts > 0)
+
+        result = {}
+        result['ks'], result['class_ks'] = self.ks(real=self.real_cont, real_y=self.real_y, fake=x_fake[:, self.num_cat:], fake_y=y_fake, num_segments=self.nc)
+
+        fake_freqs, fake_class_freqs = self.level_freqs(x=x_fake, counts=fake_counts)
+        result['tv'] = self.tv(self.real_freqs[None, :], fake_freqs[None, :])[0]
+        result['class_tv'] = self.tv(self.real_class_freqs, fake_class_freqs)
+
+        fake_corr, fake_class_corr = self.corrs(x=x_fake, counts=fake_counts)
+        result['corr'] = self.corr_diff(self.real_corr[None], fake_corr[None])[0]
+        result['class_corr'] = self.corr_diff(self.real_class_corr, fake_class_corr)
+
+        for name in ['class_ks', 'class_tv', 'class_corr']:
+            result[name][~present] = np.nan
+
+        weights = np.where(present, self.class_weights, 0)
+        weights = weights / weights.sum() if weights.sum() > 0 else weights
+        components = [np.mean(result['ks']) if result['ks'].size else np.nan,
+                      np.mean(result['tv']) if result['tv'].size else np.nan,
+                      result['corr'],
+                      np.sum(weights * np.nan_to_num(result['class_ks'].mean(axis=1))) if result['ks'].size else np.nan,
+                      np.sum(weights * np.nan_to_num(result['class_tv'].mean(axis=1))) if result['tv'].size else np.nan,
+                      np.sum(weights * np.nan_to_num(result['class_corr']))]
+        result['fidelity'] = float(np.nanmean(components))
+        return result
+
+    @staticmethod
+    def sort_by_class(x, y):
+        """Rows of x and y grouped by class, so that each class is a contiguous block"""
+        y = np.asarray(y, dtype=np.int64)
+        order = np.argsort(y, kind='stable')
+        return np.asarray(x)[order], y[order]
+
+    @staticmethod
+    def ks(real, real_y, fake, fake_y, num_segments):
+        """
+        Two sample KS statistic of every column, overall and within every segment (class), from a single sort by value.
+        Rows are sorted by value (then stably by segment), with each real row weighing 1 / (real rows) and each fake row -1 / (fake rows).
+        The running sum of the weights is then the difference between the two empirical CDFs, which returns to 0 at the end of each segment.
+        Only the last of each run of tied values is a valid evaluation point of the CDFs.
+        :param real: NumPy array of real data
+        :param real_y: NumPy array of the segment of each row of real
+        :param fake: NumPy array of generated data
+        :param fake_y: NumPy array of the segment of each row of fake
+        :param num_segments: Number of segments
+        :return: Tuple of a NumPy array of overall KS statistics (columns) and a NumPy array of KS statistics within each segment (segments x columns),
+        NaN for segments missing from either data set
+        """
+        by_segment = np.full((num_segments, real.shape[1]), np.nan)
+        if real.shape[1] == 0 or len(real) == 0 or len(fake) == 0:
+            return np.full(real.shape[1], np.nan), by_segment
+
+        real_counts, fake_counts = np.bincount(real_y, minlength=num_segments), np.bincount(fake_y, minlength=num_segments)
+        present = (real_counts > 0) & (fake_counts > 0)
+
+        # Columns are laid out contiguously (columns x rows) for sorting
+        values = np.ascontiguousarray(np.concatenate((real, fake)).T)
+        segments = np.concatenate((real_y, fake_y))
+        order = np.argsort(values, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+
+        weights = np.concatenate((np.full(len(real), 1 / len(real)), np.full(len(fake), -1 / len(fake))))
+        overall = TabularFidelity.max_cdf_diff(values=values, weights=weights[order], segments=None)
+
+        # Rows of segments missing from either data set weigh nothing, keeping every other segment's running sum intact
+        with np.errstate(divide='ignore'):
+            weights = np.concatenate((1 / real_counts[real_y], -1 / fake_counts[fake_y]))
+        weights[~present[segments]] = 0
+        segment_order = np.argsort(segments[order], axis=1, kind='stable')
+        order = np.take_along_axis(order, segment_order, axis=1)
+        values = np.take_along_axis(values, segment_order, axis=1)
+        cdf_diff = TabularFidelity.max_cdf_diff(values=values, weights=weights[order], segments=segments[order])
+
+        sizes = real_counts + fake_counts
+        nonempty = sizes > 0
+        by_segment[nonempty] = np.maximum.reduceat(cdf_diff, (np.cumsum(sizes) - sizes)[nonempty], axis=1).T
+        by_segment[~present] = np.nan
+        return overall, by_segment
+
+    @staticmethod
+    def max_cdf_diff(values, weights, segments):
+        """
+        :param values: NumPy array of values (columns x rows), each row sorted (within segments)
+        :param weights: NumPy array of the weight of each value
+        :param segments: NumPy array of the segment of each value. If None, the values form a single segment.
+        :return: Maximum absolute difference between the CDFs over each column if segments is None, otherwise the absolute differences at every value,
+        zeroed where a tie or the next value of the same segment follows
+        """
+        cdf_diff = np.abs(np.cumsum(weights, axis=1))
+        last_of_run = np.ones_like(cdf_diff, dtype=bool)
+        last_of_run[:, :-1] = values[:, 1:] != values[:, :-1]
+        if segments is None:
+            return np.where(last_of_run, cdf_diff, 0).max(axis=1)
+        last_of_run[:, :-1] |= segments[:, 1:] != segments[:, :-1]
+        cdf_diff[~last_of_run] = 0
+        return cdf_diff
+
+    def level_freqs(self, x, counts):
+        """
+        :param x: NumPy array of one hot encoded data, grouped by class
+        :param counts: Number of rows of each class
+        :return: Tuple of the frequency of each level overall and a NumPy array of the frequencies within each class (classes x levels)
+        """
+        x_cat = x[:, :self.num_cat].astype(np.float64)
+        class_freqs = np.zeros((self.nc, self.num_cat))
+        present = counts > 0
+        if self.num_cat and present.any():
+            class_freqs[present] = np.add.reduceat(x_cat, (np.cumsum(counts) - counts)[present], axis=0) / counts[present, None]
+        return x_cat.mean(axis=0) if len(x_cat) else np.zeros(self.num_cat), class_freqs
+
+    def tv(self, p, q):
+        """Total variation distance of each categorical feature between rows of level frequencies p and q"""
+        if self.num_cat == 0:
+            return np.zeros((p.shape[0], 0))
+        return 0.5 * np.add.reduceat(np.abs(p - q), self.starts, axis=1)
+
+    def corrs(self, x, counts):
+        """
+        :param x: NumPy array of data, grouped by class
+        :param counts: Number of rows of each class
+        :return: Tuple of the correlation matrix of x and a NumPy array of the correlation matrix within each class
+        """
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        return self.corr(x), np.stack([self.corr(x[bounds[c]:bounds[c + 1]]) for c in range(self.nc)])
+
+    @staticmethod
+    def corr(x):
+        """Correlation matrix of the columns of x. Constant columns have a correlation of 0 with every other column."""
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) < 2:
+            return np.zeros((x.shape[1], x.shape[1]))
+        x = x - x.mean(axis=0)
+        cov = x.T.dot(x)
+        std = np.sqrt(np.diag(cov))
+        std[std == 0] = np.inf
+        return cov / np.outer(std, std)
+
+    @staticmethod
+    def corr_diff(real_corr, fake_corr):
+        """Mean absolute difference between the off diagonal entries of stacked correlation matrices, halved so that it lies between 0 and 1"""
+        num_cols = real_corr.shape[-1]
+        if num_cols < 2:
+            return np.zeros(real_corr.shape[0])
+        off_diag = ~np.eye(num_cols, dtype=bool)
+        return 0.5 * np.abs(real_corr - fake_corr)[:, off_diag].mean(axis=1)
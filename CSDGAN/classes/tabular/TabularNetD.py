@@ -7,7 +7,7 @@ import numpy as np
 
 # Discriminator class
 class TabularNetD(nn.Module, NetUtils):
-    def __init__(self, device, H, out_dim, nc, noise, lr=2e-4, beta1=0.5, beta2=0.999, wd=0):
+    def __init__(self, device, H, out_dim, nc, noise, lr=2e-4, beta1=0.5, beta2=0.999, wd=0, fast_step=False, mixed_precision=False):
         super().__init__()
         NetUtils.__init__(self)
         self.name = "Discriminator"
@@ -26,7 +26,8 @@ class TabularNetD(nn.Module, NetUtils):
         self.m = nn.Sigmoid()
 
         # Loss and Optimizer
-        self.loss_fn = nn.BCELoss()  # BCE Loss
+        self.mixed_precision = mixed_precision  # If True, trained on logits with a fused loss that is safe under bfloat16 autocast
+        self.loss_fn = nn.BCEWithLogitsLoss() if self.mixed_precision else nn.BCELoss()
         self.opt = optim.Adam(self.parameters(), lr=lr, betas=(beta1, beta2), weight_decay=wd)
 
         # Record history of training
@@ -39,33 +40,51 @@ class TabularNetD(nn.Module, NetUtils):
         self.D_G_z1 = []  # Per step
         self.Avg_D_fakes = []  # Store D_G_z1 across epochs
 
+        if fast_step:
+            self.init_step_accumulators(metric_names=['loss', 'D_x', 'D_G_z1'])
+
         # Initialize weights
         self.weights_init()
 
-    def forward(self, row, labels):
+    def forward(self, row, labels, logits=False):
         """
         :param row: Row of input data to discriminate on
         :param labels: Label embedding
+        :param logits: Whether to return the logits instead of applying the sigmoid activation
         :return: Binary classification (sigmoid activation on a single unit hidden layer)
         """
         row = self.noise(row)
         x = torch.cat([row, labels], 1)
         x = self.act(self.fc1(x))
-        return self.m(self.output(x))
+        x = self.output(x)
+        return x if logits else self.m(x)
 
     def train_one_step_real(self, output, label):
         self.zero_grad()
+        output = output.float()  # Loss is always computed in fp32
         self.loss_real = self.loss_fn(output, label)
         self.loss_real.backward()
-        self.D_x.append(output.mean().item())
+        output = torch.sigmoid(output.detach()) if self.mixed_precision else output
+        if self.fast_step:
+            self.accumulate_step_metric('D_x', output.mean())
+        else:
+            self.D_x.append(output.mean().item())
 
     def train_one_step_fake(self, output, label):
+        output = output.float()
         self.loss_fake = self.loss_fn(output, label)
         self.loss_fake.backward()
-        self.D_G_z1.append(output.mean().item())
+        output = torch.sigmoid(output.detach()) if self.mixed_precision else output
+        if self.fast_step:
+            self.accumulate_step_metric('D_G_z1', output.mean())
+        else:
+            self.D_G_z1.append(output.mean().item())
 
     def combine_and_update_opt(self):
-        self.loss.append(self.loss_real.item() + self.loss_fake.item())
+        if self.fast_step:
+            self.accumulate_step_metric('loss', self.loss_real + self.loss_fake)
+        else:
+            self.loss.append(self.loss_real.item() + self.loss_fake.item())
         self.opt.step()
         self.store_weight_and_grad_norms()
 
@@ -7,7 +7,7 @@ import numpy as np
 
 # Generator class
 class TabularNetG(nn.Module, NetUtils):
-    def __init__(self, device, nz, H, out_dim, nc, lr=2e-4, beta1=0.5, beta2=0.999, wd=0, cat_mask=None, le_dict=None):
+    def __init__(self, device, nz, H, out_dim, nc, lr=2e-4, beta1=0.5, beta2=0.999, wd=0, cat_mask=None, le_dict=None, fast_step=False, mixed_precision=False):
         super().__init__()
         NetUtils.__init__(self)
         self.name = "Generator"
@@ -26,7 +26,8 @@ class TabularNetG(nn.Module, NetUtils):
         self.sm = nn.Softmax(dim=-2)
 
         # Loss and Optimizer
-        self.loss_fn = nn.BCELoss()  # BCE Loss
+        self.mixed_precision = mixed_precision  # If True, netD outputs are logits and a fused loss that is safe under bfloat16 autocast is used
+        self.loss_fn = nn.BCEWithLogitsLoss() if self.mixed_precision else nn.BCELoss()
         self.opt = optim.Adam(self.parameters(), lr=lr, betas=(beta1, beta2), weight_decay=wd)
 
         # Initialize weights
@@ -40,6 +41,9 @@ class TabularNetG(nn.Module, NetUtils):
         self.D_G_z2 = []  # Per step
         self.Avg_G_fakes = []  # Store D_G_z2 across epochs
 
+        if fast_step:
+            self.init_step_accumulators(metric_names=['loss', 'D_G_z2'])
+
     def forward(self, noise, labels):
         """
         Single dense hidden layer network.
@@ -57,10 +61,16 @@ class TabularNetG(nn.Module, NetUtils):
 
     def train_one_step(self, output, label):
         self.zero_grad()
+        output = output.float()  # Loss is always computed in fp32
         loss_tmp = self.loss_fn(output, label)
         loss_tmp.backward()
-        self.loss.append(loss_tmp.item())
-        self.D_G_z2.append(output.mean().item())
+        output = torch.sigmoid(output.detach()) if self.mixed_precision else output
+        if self.fast_step:
+            self.accumulate_step_metric('loss', loss_tmp)
+            self.accumulate_step_metric('D_G_z2', output.mean())
+        else:
+            self.loss.append(loss_tmp.item())
+            self.D_G_z2.append(output.mean().item())
         self.opt.step()
 
         self.store_weight_and_grad_norms()
@@ -0,0 +1,74 @@
+import numpy as np
+import torch
+
+
+class TabularReencoder:
+    """
+    Snaps the softmax outputs of each categorical feature produced by netG to a one hot encoding of its most likely level, in place.
+    Ties go to the first level, matching np.argmax. Segment boundaries are precomputed once, so every feature is handled in a single pass:
+    numpy arrays (and CPU tensors) are processed in chunks of rows with np.maximum.reduceat over the transposed one hot block,
+    tensors on other devices are processed on that device with one argmax per group of features sharing the same number of levels.
+    Assumes one hot encoded categorical columns come first, in the order of le_dict (as produced by TabularDataset).
+    """
+    chunk_size = 256  # Rows per chunk for numpy arrays, small enough for each transposed chunk to stay in cache
+
+    def __init__(self, le_dict):
+        """
+        :param le_dict: Dictionary of LabelEncoders, one per categorical feature
+        """
+        self.sizes = np.array([len(le.classes_) for _, le in le_dict.items()], dtype=np.int64)
+        self.starts = np.cumsum(self.sizes) - self.sizes  # First column of each feature
+        self.num_cat = int(self.sizes.sum())
+
+        # Columns of every feature with the same number of levels, feature by feature
+        self.groups = []
+        for size in np.unique(self.sizes):
+            cols = (self.starts[self.sizes == size][:, None] + np.arange(size)).ravel()
+            self.groups.append((int(size), torch.from_numpy(cols)))
+
+    def reencode(self, data):
+        """
+        Reencode categorical variables in place
+        :param data: Numpy array or torch tensor of generated data (rows x columns)
+        :return: data, with each categorical feature one hot encoded. Continuous columns are left untouched.
+        """
+        if self.num_cat == 0:
+            return data
+        if isinstance(data, torch.Tensor):
+            if data.device.type == 'cpu':
+                self.reencode_numpy(data.detach().numpy())  # Shares memory with data
+            else:
+                self.reencode_torch(data)
+        else:
+            self.reencode_numpy(data)
+        return data
+
+    def reencode_numpy(self, data):
+        """Reencode a numpy array in place, chunk by chunk"""
+        for i in range(0, data.shape[0], self.chunk_size):
+            block = data[i:i + self.chunk_size, :self.num_cat]
+            levels = block.T.copy()
+            seg_max = np.maximum.reduceat(levels, self.starts, axis=0)
+            one_hot = levels == np.repeat(seg_max, self.sizes, axis=0)
+
+            # Ties (or NaNs) leave a feature with other than exactly one hot level. Resolve the affected rows with np.argmax.
+            for row in np.flatnonzero(np.count_nonzero(one_hot, axis=0) != len(self.sizes)):
+                one_hot[:, row] = False
+                one_hot[self.starts + self.first_max(levels[:, row]), row] = True
+
+            block[...] = one_hot.T
+
+    def first_max(self, row):
+        """
+        :param row: Categorical outputs of a single row
+        :return: Position of the first maximum within each feature, as given by np.argmax
+        """
+        return np.array([np.argmax(row[start:start + size]) for start, size in zip(self.starts, self.sizes)], dtype=np.int64)
+
+    def reencode_torch(self, data):
+        """Reencode a torch tensor in place, on its own device"""
+        for size, cols in self.groups:
+            cols = cols.to(data.device)
+            levels = data[:, cols].view(data.shape[0], -1, size)
+            one_hot = torch.arange(size, device=data.device) == levels.argmax(dim=2, keepdim=True)
+            data[:, cols] = one_hot.view(data.shape[0], -1).to(data.dtype)
@@ -2,6 +2,7 @@ from CSDGAN.auth import login_required
 import CSDGAN.utils.db as db
 import CSDGAN.utils.utils as cu
 import CSDGAN.utils.constants as cs
+import utils.utils as uu
 
 from flask import (
     Blueprint, flash, redirect, render_template, request, url_for, session, current_app, g
@@ -76,7 +77,7 @@ def create():
                 if session['format'] == 'Tabular':
                     return redirect(url_for('create.tabular'))
                 else:  # Image
-                    validation_success, msg = cu.unzip_and_validate_img_zip(run_id=session['run_id'], username=g.user['username'], title=session['title'])
+                    validation_success, msg = cu.validate_img_zip(run_id=session['run_id'], username=g.user['username'], title=session['title'])
                     if not validation_success:
                         return render_template('create/image_upload_issue.html', title=session['title'], msg=msg)
                     session['folder'] = msg
@@ -188,6 +189,23 @@ def tabular_advanced():
             else:
                 tabular_init_params['discrim_noise_linear_anneal'] = False
 
+            tabular_init_params['fast_step'] = cs.TABULAR_CGAN_INIT_PARAMS['fast_step']
+            tabular_init_params['compile_nets'] = cs.TABULAR_CGAN_INIT_PARAMS['compile_nets']
+            tabular_init_params['eval_n_jobs'] = cs.TABULAR_CGAN_INIT_PARAMS['eval_n_jobs']
+            tabular_init_params['async_eval'] = cs.TABULAR_CGAN_INIT_PARAMS['async_eval']
+            tabular_init_params['adaptive_eval'] = cs.TABULAR_CGAN_INIT_PARAMS['adaptive_eval']
+            tabular_init_params['eval_budget'] = cs.TABULAR_CGAN_INIT_PARAMS['eval_budget']
+            tabular_init_params['eval_backend'] = cs.TABULAR_CGAN_INIT_PARAMS['eval_backend']
+            tabular_init_params['eval_metric'] = cs.TABULAR_CGAN_INIT_PARAMS['eval_metric']
+            tabular_init_params['checkpoint_top_k'] = cs.TABULAR_CGAN_INIT_PARAMS['checkpoint_top_k']
+
+            if 'mixed_precision' not in request.form:
+                tabular_init_params['mixed_precision'] = cs.TABULAR_CGAN_INIT_PARAMS['mixed_precision']
+            elif request.form['mixed_precision'] == 'True':
+                tabular_init_params['mixed_precision'] = True
+            else:
+                tabular_init_params['mixed_precision'] = False
+
             tabular_eval_freq = int(request.form['tabular_eval_freq']) if request.form['tabular_eval_freq'] != '' else cs.TABULAR_DEFAULT_EVAL_FREQ
             tabular_test_size = float(request.form['ts']) if request.form['ts'] != '' else cs.TABULAR_DEFAULT_TEST_SIZE
             tabular_batch_size = int(request.form['bs']) if request.form['bs'] != '' else cs.TABULAR_DEFAULT_BATCH_SIZE
@@ -204,13 +222,16 @@ def tabular_advanced():
             return redirect(url_for('create.specify_output'))
 
     return render_template('create/tabular_advanced.html', title=session['title'], default_params=cs.TABULAR_CGAN_INIT_PARAMS, default_test_size=cs.TABULAR_DEFAULT_TEST_SIZE,
-                           default_batch_size=cs.TABULAR_DEFAULT_BATCH_SIZE, default_eval_param=cs.TABULAR_EVAL_PARAM_GRID, default_eval_folds=cs.TABULAR_EVAL_FOLDS)
+                           default_batch_size=cs.TABULAR_DEFAULT_BATCH_SIZE, default_eval_param=cs.TABULAR_EVAL_PARAM_GRID, default_eval_folds=cs.TABULAR_EVAL_FOLDS,
+                           mixed_precision_supported=uu.mixed_precision_supported())
 
 
 @bp.route('/image', methods=('GET', 'POST'))
 @login_required
 def image():
-    x_dim, num_channels, summarized_df = cu.parse_image_folder(username=g.user['username'], title=session['title'], file=session['folder'])
+    x_dim, num_channels, summarized_df, size_warning = cu.parse_image_manifest(run_id=session['run_id'], username=g.user['username'], title=session['title'])
+    if size_warning and request.method == 'GET':
+        flash(size_warning)
     if request.method == 'POST':
         if 'cancel' in request.form:
             db.clean_run(run_id=session['run_id'])
@@ -317,6 +338,24 @@ def image_advanced():
             else:
                 image_init_params['discrim_noise_linear_anneal'] = False
 
+            image_init_params['fast_step'] = cs.IMAGE_CGAN_INIT_PARAMS['fast_step']
+            image_init_params['compile_nets'] = cs.IMAGE_CGAN_INIT_PARAMS['compile_nets']
+            image_init_params['async_eval'] = cs.IMAGE_CGAN_INIT_PARAMS['async_eval']
+            image_init_params['adaptive_eval'] = cs.IMAGE_CGAN_INIT_PARAMS['adaptive_eval']
+            image_init_params['eval_budget'] = cs.IMAGE_CGAN_INIT_PARAMS['eval_budget']
+            image_init_params['eval_metric'] = cs.IMAGE_CGAN_INIT_PARAMS['eval_metric']
+            image_init_params['checkpoint_top_k'] = cs.IMAGE_CGAN_INIT_PARAMS['checkpoint_top_k']
+            image_init_params['data_residency'] = cs.IMAGE_CGAN_INIT_PARAMS['data_residency']
+            image_init_params['fake_data_mode'] = cs.IMAGE_CGAN_INIT_PARAMS['fake_data_mode']
+            image_init_params['fake_refresh_rate'] = cs.IMAGE_CGAN_INIT_PARAMS['fake_refresh_rate']
+
+            if 'mixed_precision' not in request.form:
+                image_init_params['mixed_precision'] = cs.IMAGE_CGAN_INIT_PARAMS['mixed_precision']
+            elif request.form['mixed_precision'] == 'True':
+                image_init_params['mixed_precision'] = True
+            else:
+                image_init_params['mixed_precision'] = False
+
             image_eval_freq = int(request.form['image_eval_freq']) if request.form['image_eval_freq'] != '' else cs.IMAGE_DEFAULT_EVAL_FREQ
 
             session['image_init_params'] = image_init_params
@@ -325,7 +364,8 @@ def image_advanced():
             session['advanced_options'] = True
             return redirect(url_for('create.specify_output'))
 
-    return render_template('create/image_advanced.html', title=session['title'], default_params=cs.IMAGE_CGAN_INIT_PARAMS, default_eval_freq=cs.IMAGE_DEFAULT_EVAL_FREQ)
+    return render_template('create/image_advanced.html', title=session['title'], default_params=cs.IMAGE_CGAN_INIT_PARAMS, default_eval_freq=cs.IMAGE_DEFAULT_EVAL_FREQ,
+                           mixed_precision_supported=uu.mixed_precision_supported())
 
 
 @bp.route('/specify_output', methods=('GET', 'POST'))
@@ -408,7 +448,8 @@ def success():
                                                                 session['bs'], session['x_dim'], session['splits']))
             train_model = current_app.task_queue.enqueue('CSDGAN.pipeline.train.train_image_model.train_image_model',
                                                          args=(session['run_id'], g.user['username'], session['title'], session['num_epochs'],
-                                                               session['bs'], session['nc'], session['num_channels'], image_init_params, image_eval_freq),
+                                                               session['bs'], session['nc'], session['num_channels'], image_init_params, image_eval_freq,
+                                                               cs.IMAGE_DEFAULT_NUM_PROCS),
                                                          depends_on=make_dataset,
                                                          job_timeout=-1)
             generate_data = current_app.task_queue.enqueue('CSDGAN.pipeline.generate.generate_image_data.generate_image_data',
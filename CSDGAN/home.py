@@ -86,8 +86,7 @@ def gen_more_data():
         if session['format'] == 'Tabular':
             dep_choices = cu.parse_tabular_dep(run_id=session['run_id'], dep_var=session['dep_var'])
         else:  # Image
-            folder = os.listdir(os.path.join(cs.RUN_FOLDER, g.user['username'], session['title']))[0]
-            dep_choices = sorted(os.listdir(os.path.join(cs.RUN_FOLDER, g.user['username'], session['title'], folder, 'train')))
+            dep_choices = cu.parse_image_labels(username=g.user['username'], title=session['title'])
 
         return render_template('home/gen_more_data.html', title=session['title'], dep_var=session['dep_var'],
                                dep_choices=dep_choices, max_examples_per_class='{:,d}'.format(cs.MAX_EXAMPLE_PER_CLASS))
@@ -124,7 +123,8 @@ def continue_training():
         db.query_incr_retrains(run_id=session['run_id'])
         db.query_set_status(run_id=session['run_id'], status_id=cs.STATUS_DICT['Retraining kicked off'])
         retrain = current_app.task_queue.enqueue('CSDGAN.pipeline.train.retrain.retrain',
-                                                 args=(session['run_id'], g.user['username'], session['title'], int(request.form['num_epochs'])),
+                                                 args=(session['run_id'], g.user['username'], session['title'], int(request.form['num_epochs']),
+                                                       cs.IMAGE_DEFAULT_NUM_PROCS),
                                                  job_timeout=-1)
         db.query_update_train_id(run_id=session['run_id'], train_id=retrain.get_id())
         logger.info('User #{} ({}) continued training Run #{} ({})'.format(g.user['id'], g.user['username'], session['run_id'], session['title']))
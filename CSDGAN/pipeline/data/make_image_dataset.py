@@ -2,6 +2,8 @@ import CSDGAN.utils.constants as cs
 import CSDGAN.utils.db as db
 import CSDGAN.utils.utils as cu
 import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset, PackedImageLoader
+from CSDGAN.classes.image.ImageManifest import ImageManifest
 
 import logging
 import os
@@ -12,12 +14,13 @@ def make_image_dataset(run_id, username, title, folder, bs, x_dim=None, splits=N
     """
     Requirements of image data set is that it should be a single zip with all images with same label in a folder named with the label name
     Images should either be the same size, or a specified image size should be provided (all images will be cropped to the same size)
-    Assumes that file has been pre-unzipped and checked by the create.py functions/related util functions
+    Assumes that the uploaded zip has been checked by the create.py functions/related util functions
     This file accomplishes the following:
         1. Accepts a desired image size (optional, else first image dim will be used), batch size, and train/val/test splits
-        2. Splits data into train/val/test splits via stratified sampling and moves into corresponding folders
-        3. Deletes original unzipped images
+        2. Splits data into train/val/test splits via stratified sampling, using the image manifest saved when the upload was validated
+        3. Streams each image from the zip, cropping it and writing it into its split, packed into a single memory-mapped file (see PackedImageDataset)
         4. Pickles label encoder, one hot encoder, resulting image size, and all three generators
+    The zip is never extracted, so images are read from disk once and written once.
     """
     run_id = str(run_id)
     db.query_verify_live_run(run_id=run_id)
@@ -32,24 +35,30 @@ def make_image_dataset(run_id, username, title, folder, bs, x_dim=None, splits=N
         run_dir = os.path.join(cs.RUN_FOLDER, username, title)
         assert os.path.exists(run_dir), "Run directory does not exist"
 
-        unzipped_path = os.path.join(run_dir, folder)
-        assert os.path.exists(unzipped_path), "Unzipped path does not exist"
-
-        # Load and preprocess data
-        import_gen = cuidl.import_dataset(path=unzipped_path, bs=bs, shuffle=False, incl_paths=True)
+        path = os.path.join(cs.UPLOAD_FOLDER, run_id)
+        zip_path = os.path.join(path, os.listdir(path)[0])
+        assert os.path.splitext(zip_path)[1] == '.zip', "Image file path passed is not zip"
 
+        # Stream data from the zip into packed train/val/test splits, mapped out by the manifest saved at upload
+        manifest = ImageManifest.load(run_dir)
+        if manifest is None:
+            logger.info('Image manifest not found, mapping out the zip instead')
+        packed_folder = os.path.join(run_dir, cs.IMAGE_PACKED_FOLDER)
         splits = [float(num) for num in splits]
-        le, ohe, x_dim = cuidl.preprocess_imported_dataset(path=unzipped_path, import_gen=import_gen,
-                                                           splits=splits, x_dim=x_dim)
+        le, ohe, x_dim = cuidl.ingest_image_zip(zip_path=zip_path, folder=folder, out_folder=packed_folder,
+                                                splits=splits, x_dim=x_dim,
+                                                num_workers=cs.IMAGE_PREPROCESS_NUM_WORKERS,
+                                                logger=logger,
+                                                manifest=manifest)
 
-        logger.info('Data successfully imported and preprocessed. Splitting into train/val/test...')
+        logger.info('Data successfully imported, preprocessed and split into train/val/test. Creating generators...')
 
         # Create data loader for each component of data set
-        train_gen = cuidl.import_dataset(os.path.join(unzipped_path, 'train'), bs=bs, shuffle=True, incl_paths=False)
-        val_gen = cuidl.import_dataset(os.path.join(unzipped_path, 'val'), bs=bs, shuffle=True, incl_paths=False)
-        test_gen = cuidl.import_dataset(os.path.join(unzipped_path, 'test'), bs=bs, shuffle=True, incl_paths=False)
+        train_gen = PackedImageLoader(PackedImageDataset(folder=packed_folder, split='train'), batch_size=bs, shuffle=True)
+        val_gen = PackedImageLoader(PackedImageDataset(folder=packed_folder, split='val'), batch_size=bs, shuffle=True)
+        test_gen = PackedImageLoader(PackedImageDataset(folder=packed_folder, split='test'), batch_size=bs, shuffle=True)
 
-        logger.info('Data successfully split into train/val/test. Pickling and exiting.')
+        logger.info('Generators successfully created. Pickling and exiting.')
 
         # Pickle relevant objects
         with open(os.path.join(run_dir, "le.pkl"), "wb") as f:
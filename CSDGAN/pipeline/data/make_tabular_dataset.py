@@ -33,25 +33,17 @@ def make_tabular_dataset(run_id, username, title, dep_var, cont_inputs, int_inpu
         file = os.listdir(path)[0]
         assert os.path.splitext(file)[1] in {'.txt', '.csv', '.zip'}, "Path is not zip or flat file"
         if os.path.splitext(file)[1] == '.zip':
-            logger.info('Tabular file contained in zip. Unzipping...')
-            zip_ref = ZipFile(os.path.join(path, file), 'r')
-            zip_ref.extractall(run_dir)
-            zip_ref.close()
-
-            unzipped_path = os.path.join(run_dir, os.path.splitext(file)[0])
-
-            if os.path.isdir(unzipped_path):
-                assert os.path.exists(unzipped_path), \
-                    "Flat file in zip not named the same as zip file"
-                unzipped_file = os.listdir(unzipped_path)[0]
-                assert os.path.splitext(unzipped_file)[1] in {'.txt', '.csv'}, \
-                    "Flat file in zip should be .txt or .csv"
-                data = pd.read_csv(os.path.join(unzipped_path, unzipped_file), header=0)
-            else:
-                unzipped_file = [file for file in os.listdir(run_dir) if file not in ['gen_dict.pkl', 'run_log.log']][0]  # Expected entries
+            logger.info('Tabular file contained in zip. Reading it from the zip...')
+            with ZipFile(os.path.join(path, file), 'r') as zip_ref:
+                # The flat file is either in a folder named the same as the zip file, or at the top level of the zip
+                members = [name for name in zip_ref.namelist() if not name.endswith('/') and not name.startswith('__MACOSX/')]
+                in_folder = [name for name in members if name.startswith(os.path.splitext(file)[0] + '/')]
+                assert len(members) > 0, "Zip contains no files"
+                unzipped_file = (in_folder or members)[0]
                 assert os.path.splitext(unzipped_file)[1] in {'.txt', '.csv'}, \
                     "Flat file in zip should be .txt or .csv"
-                data = pd.read_csv(os.path.join(run_dir, unzipped_file), header=0)
+                with zip_ref.open(unzipped_file) as f:
+                    data = pd.read_csv(f, header=0)
         else:
             logger.info('Tabular file not contained in zip.')
             data = pd.read_csv(os.path.join(path, file), header=0)
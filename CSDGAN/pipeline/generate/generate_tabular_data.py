@@ -45,23 +45,12 @@ def generate_tabular_data(run_id, username, title, aug=None):
         if aug is None:
             logger.info('Successfully loaded in CGAN. Generating data...')
 
-        # Generate data
-        df = pd.DataFrame(columns=CGAN.data_gen.dataset.df_cols)
-        for i, (dep_class, size) in enumerate(gen_dict.items()):
-            if size > 0:
-                stratify = np.eye(CGAN.nc)[i]
-                tmp_df = CGAN.gen_data(size=size, stratify=stratify)
-                tmp_df = tmp_df[df.columns.to_list()]
-                df = pd.concat((df, tmp_df), axis=0)
+        # Generate data and stream it to the output file
+        zip_title = title if aug is None else title + ' Additional Data ' + str(aug)
+        cu.export_tabular_to_zip(dfs=gen_data_chunks(CGAN=CGAN, gen_dict=gen_dict), username=username, run_title=title, zip_title=zip_title)
 
         if aug is None:
-            logger.info('Successfully generated data. Saving output to file...')
-
-        # Output data
-        if aug is not None:
-            cu.export_tabular_to_zip(df=df, username=username, run_title=title, zip_title=title + ' Additional Data ' + str(aug))
-        else:
-            cu.export_tabular_to_zip(df=df, username=username, run_title=title, zip_title=title)
+            logger.info('Successfully generated data and saved output to file.')
 
         if aug is None:
             db.query_set_status(run_id=run_id, status_id=cs.STATUS_DICT['Complete'])
@@ -73,3 +62,21 @@ def generate_tabular_data(run_id, username, title, aug=None):
             logger.exception('Error: %s', e)
         raise Exception("Intentionally failing process after broadly catching an exception. "
                         "Logs describing this error can be found in the run's specific logs file.")
+
+
+def gen_data_chunks(CGAN, gen_dict, chunk_size=cs.TABULAR_GEN_CHUNK_SIZE):
+    """
+    Generates data class by class in chunks of at most chunk_size rows
+    :param CGAN: Trained TabularCGAN
+    :param gen_dict: Dictionary with dependent variable labels as keys and number of examples to generate as values
+    :return: Generator of DataFrames formatted like the original data. Yields a single empty DataFrame if nothing is requested, so that a header is still written.
+    """
+    columns = CGAN.data_gen.dataset.df_cols
+    empty = True
+    for i, (dep_class, size) in enumerate(gen_dict.items()):
+        stratify = np.eye(CGAN.nc)[i]
+        for start in range(0, size, chunk_size):
+            empty = False
+            yield CGAN.gen_data(size=min(chunk_size, size - start), stratify=stratify)[columns]
+    if empty:
+        yield pd.DataFrame(columns=columns)
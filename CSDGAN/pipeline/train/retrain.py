@@ -1,15 +1,16 @@
 import CSDGAN.utils.constants as cs
 import CSDGAN.utils.db as db
 import CSDGAN.utils.utils as cu
+from CSDGAN.pipeline.train.train_image_model import train_distributed
 
 import logging
 import os
 import pickle as pkl
 
 
-def retrain(run_id, username, title, num_epochs):
+def retrain(run_id, username, title, num_epochs, num_procs):
     """
-    Continues training a tabular model for a specified number of epochs
+    Continues training a tabular model for a specified number of epochs. Image models are trained across num_procs local processes if greater than 1.
     """
     run_id = str(run_id)
     db.query_verify_live_run(run_id=run_id)
@@ -36,6 +37,9 @@ def retrain(run_id, username, title, num_epochs):
                            run_id=run_id,
                            logger=logging.getLogger('train_info'),
                            retrain=True)
+        elif type(CGAN).__name__ == 'ImageCGAN' and num_procs > 1:
+            CGAN = train_distributed(CGAN=CGAN, run_id=run_id, username=username, title=title, num_epochs=num_epochs,
+                                     eval_freq=cs.IMAGE_DEFAULT_EVAL_FREQ, num_procs=num_procs, retrain=True)
         elif type(CGAN).__name__ == 'ImageCGAN':
             CGAN.train_gan(num_epochs=num_epochs,
                            print_freq=cs.IMAGE_DEFAULT_PRINT_FREQ,
@@ -6,12 +6,14 @@ from CSDGAN.classes.image.ImageCGAN import ImageCGAN
 import logging
 import os
 import torch
+import torch.multiprocessing as mp
 import pickle as pkl
 
 
-def train_image_model(run_id, username, title, num_epochs, bs, nc, num_channels, image_init_params, image_eval_freq):
+def train_image_model(run_id, username, title, num_epochs, bs, nc, num_channels, image_init_params, image_eval_freq, num_procs):
     """
     Trains an Image CGAN on the data preprocessed by make_image_dataset.py. Loads best generator and pickles CGAN for predictions.
+    If num_procs is greater than 1, training is split data-parallel across that many local processes.
     """
     run_id = str(run_id)
     db.query_verify_live_run(run_id=run_id)
@@ -39,9 +41,13 @@ def train_image_model(run_id, username, title, num_epochs, bs, nc, num_channels,
                          fake_bs=bs,
                          **image_init_params)
 
+        # Hold the real splits decoded in memory (or on the device) if they fit
+        CGAN.init_data_residency(run_id=run_id, logger=logger)
+
         # Benchmark and store
         logger.info('Successfully instantiated CGAN object. Beginning benchmarking...')
         db.query_set_status(run_id=run_id, status_id=cs.STATUS_DICT['Benchmarking'])
+        CGAN.get_eval_context().save(run_dir)
 
         benchmark, real_netE = CGAN.eval_on_real_data(num_epochs=image_init_params['eval_num_epochs'],
                                                       es=image_init_params['early_stopping_patience'])
@@ -51,14 +57,21 @@ def train_image_model(run_id, username, title, num_epochs, bs, nc, num_channels,
         with open(os.path.join(run_dir, 'real_netE.pkl'), 'wb') as f:
             pkl.dump(real_netE, f)
 
+        if CGAN.eval_metric == 'feature_stats':
+            CGAN.init_feature_stats(real_netE=real_netE)
+
         # Train
         logger.info('Successfully completed benchmark. Beginning training...')
         db.query_set_status(run_id=run_id, status_id=cs.STATUS_DICT['Train 0/4'])
-        CGAN.train_gan(num_epochs=num_epochs,
-                       print_freq=cs.IMAGE_DEFAULT_PRINT_FREQ,
-                       eval_freq=image_eval_freq,
-                       run_id=run_id,
-                       logger=logging.getLogger('train_info'))
+        if num_procs > 1:
+            CGAN = train_distributed(CGAN=CGAN, run_id=run_id, username=username, title=title, num_epochs=num_epochs,
+                                     eval_freq=image_eval_freq, num_procs=num_procs)
+        else:
+            CGAN.train_gan(num_epochs=num_epochs,
+                           print_freq=cs.IMAGE_DEFAULT_PRINT_FREQ,
+                           eval_freq=image_eval_freq,
+                           run_id=run_id,
+                           logger=logging.getLogger('train_info'))
 
         logger = logging.getLogger('train_func')
         logger.info('Successfully trained CGAN. Loading and saving best model...')
@@ -76,3 +89,56 @@ def train_image_model(run_id, username, title, num_epochs, bs, nc, num_channels,
         logger.exception('Error: %s', e)
         raise Exception("Intentionally failing process after broadly catching an exception. "
                         "Logs describing this error can be found in the run's specific logs file.")
+
+
+def train_distributed(CGAN, run_id, username, title, num_epochs, eval_freq, num_procs, retrain=False):
+    """
+    Trains an Image CGAN data-parallel across num_procs local processes. The CGAN is handed to the processes through CGAN.pkl in the run directory,
+    and the main process writes the trained CGAN back to the same file once training completes.
+    :return: Trained CGAN
+    """
+    assert num_procs > 1, "Distributed training requires more than one process"
+
+    run_dir = os.path.join(cs.RUN_FOLDER, username, title)
+    with open(os.path.join(run_dir, 'CGAN.pkl'), 'wb') as f:
+        pkl.dump(CGAN, f)
+
+    init_file = os.path.join(run_dir, 'dist_init')
+    if os.path.exists(init_file):
+        os.remove(init_file)
+
+    try:
+        mp.spawn(train_distributed_process, args=(num_procs, init_file, run_id, username, title, num_epochs, eval_freq, retrain), nprocs=num_procs)
+    finally:
+        if os.path.exists(init_file):
+            os.remove(init_file)
+
+    return cu.get_CGAN(username=username, title=title)
+
+
+def train_distributed_process(rank, world_size, init_file, run_id, username, title, num_epochs, eval_freq, retrain):
+    """
+    Entry point of each process spawned by train_distributed. Only the main process (rank 0) logs, evaluates, updates the run status and saves the CGAN.
+    """
+    torch.set_num_threads(max(1, os.cpu_count() // world_size))  # Split cores evenly so processes do not oversubscribe the CPU
+
+    main_process = rank == 0
+    if main_process:
+        cu.setup_run_logger(name='train_info', username=username, title=title, filename='train_log')
+
+    CGAN = cu.get_CGAN(username=username, title=title)
+    CGAN.init_distributed(rank=rank, world_size=world_size, init_method='file://' + init_file)
+
+    try:
+        CGAN.train_gan(num_epochs=num_epochs,
+                       print_freq=cs.IMAGE_DEFAULT_PRINT_FREQ,
+                       eval_freq=eval_freq if main_process else None,
+                       run_id=run_id if main_process else None,
+                       logger=logging.getLogger('train_info') if main_process else None,
+                       retrain=retrain)
+    finally:
+        CGAN.destroy_distributed()
+
+    if main_process:
+        with open(os.path.join(cs.RUN_FOLDER, username, title, 'CGAN.pkl'), 'wb') as f:
+            pkl.dump(CGAN, f)
@@ -48,14 +48,18 @@ def train_tabular_model(run_id, username, title, num_epochs, bs, tabular_init_pa
         # Benchmark and store
         logger.info('Successfully instantiated CGAN object. Beginning benchmarking...')
         db.query_set_status(run_id=run_id, status_id=cs.STATUS_DICT['Benchmarking'])
+        eval_context = CGAN.get_eval_context()
+        eval_context.save(run_dir)
         benchmark = uu.train_test_logistic_reg(x_train=CGAN.data_gen.dataset.x_train.cpu().detach().numpy(),
                                                y_train=CGAN.data_gen.dataset.y_train.cpu().detach().numpy(),
-                                               x_test=CGAN.data_gen.dataset.x_test.cpu().detach().numpy(),
-                                               y_test=CGAN.data_gen.dataset.y_test.cpu().detach().numpy(),
+                                               x_test=eval_context.x_test,
+                                               y_test=eval_context.y_test,
                                                param_grid=tabular_eval_params,
                                                cv=tabular_eval_folds,
                                                labels_list=dataset.labels_list,
-                                               verbose=False)
+                                               verbose=False,
+                                               backend=CGAN.eval_backend,
+                                               device=CGAN.device)
         db.query_update_benchmark(run_id=run_id, benchmark=benchmark)
 
         # Train
@@ -40,9 +40,26 @@ TABULAR_CGAN_INIT_PARAMS = {'netG_lr': 2e-4,  # Learning rate for adam optimizer
                             'nz': 64,
                             'sched_netG': 1,
                             'netG_H': 32,
-                            'netD_H': 32
+                            'netD_H': 32,
+                            'fast_step': False,  # Whether to keep per step training metrics on device, syncing only once per epoch
+                            'mixed_precision': False,  # Whether to run forward passes under bfloat16 autocast
+                            'compile_nets': False,  # Whether to compile netG/netD forward passes (falls back to eager if unsupported)
+                            'eval_n_jobs': None,  # CPU budget shared by the concurrent evaluation fits of each test range. None uses all CPUs.
+                            'async_eval': False,  # Whether to evaluate snapshots of netG in the background while training continues
+                            'adaptive_eval': False,  # Whether to evaluate sparsely at first, then more often as training converges, instead of every eval_freq epochs
+                            'eval_budget': None,  # Maximum number of evaluations per training call when adaptive (None = twice the fixed schedule)
+                            'eval_backend': 'sklearn',  # Logistic regression backend for evaluation. Either 'sklearn' (saga) or 'torch' (batched FISTA).
+                            'eval_metric': 'evaluator',  # 'evaluator' to fit logistic regressions on fake data each evaluation, 'fidelity' to compare distributions
+                            'checkpoint_top_k': 5  # Number of best scoring generators kept on disk (None = keep every evaluated generator)
                             }
 
+# Number of rows generated for each evaluation with the 'fidelity' metric, see TabularFidelity
+TABULAR_FIDELITY_NUM_EXAMPLES = 100000
+
+# Adaptive evaluation scheduling, see EvaluationScheduler
+EVAL_SCHEDULER_WINDOW = 10  # Number of recent epochs the convergence proxies are computed over
+EVAL_SCHEDULER_SETTLED_RATIO = 0.25  # Fraction of its peak value in the run below which a convergence proxy counts as settled
+
 # Tabular training parameters
 TABULAR_DEFAULT_NUM_EPOCHS = 10000
 TABULAR_DEFAULT_CADENCE = 1
@@ -52,6 +69,9 @@ TABULAR_MAX_NUM_EPOCHS = 100000
 TABULAR_DEFAULT_TEST_SIZE = 0.2
 TABULAR_DEFAULT_BATCH_SIZE = 1000
 
+# Tabular generation parameters
+TABULAR_GEN_CHUNK_SIZE = 50000  # Rows generated, decoded and written to the output zip at a time
+
 # Specific image initialization parameters
 IMAGE_CGAN_INIT_PARAMS = {'netG_lr': 2e-4,  # Learning rate for adam optimizer
                           'netD_lr': 2e-4,
@@ -78,18 +98,41 @@ IMAGE_CGAN_INIT_PARAMS = {'netG_lr': 2e-4,  # Learning rate for adam optimizer
                           'netD_nf': 128,
                           # Fake data generator parameters
                           'fake_data_set_size': 50000,
+                          'fake_data_mode': 'online',  # 'online' to call netG for every batch, 'memmap' to generate once into a memory-mapped buffer
+                          'fake_refresh_rate': 5,  # Evaluator epochs between drawing fresh samples in 'memmap' mode
                           # Evaluator parameters
                           'eval_num_epochs': 40,
-                          'early_stopping_patience': 3
+                          'early_stopping_patience': 3,
+                          # Training step parameters
+                          'fast_step': False,  # Whether to keep per step training metrics on device, syncing only once per epoch
+                          'mixed_precision': False,  # Whether to run forward passes under bfloat16 autocast
+                          'compile_nets': False,  # Whether to compile netG/netD forward passes (falls back to eager if unsupported)
+                          'async_eval': False,  # Whether to evaluate snapshots of netG in the background while training continues
+                          'adaptive_eval': False,  # Whether to evaluate sparsely at first, then more often as training converges, instead of every eval_freq epochs
+                          'eval_budget': None,  # Maximum number of evaluations per training call when adaptive (None = twice the fixed schedule)
+                          'eval_metric': 'evaluator',  # 'evaluator' to train netE on fake data each evaluation, 'feature_stats' to score with the benchmark netE
+                          'checkpoint_top_k': 5,  # Number of best scoring generators kept on disk (None = keep every evaluated generator)
+                          'data_residency': 'auto'  # Where real splits are read from: 'auto' to let ImageMemoryPlanner decide, or 'disk', 'memory' or 'device'
                           }
+IMAGE_MEMORY_BUDGET = 1024 ** 3 * 4  # Largest decoded footprint (bytes) of the real train/val/test splits held in host memory
+IMAGE_DEVICE_MEMORY_FRACTION = 0.25  # Share of the memory of a GPU the decoded real splits may take up to be held on it
+IMAGE_FAKE_DATA_PREFETCH = 2  # Batches of fake data produced ahead in a background thread while netE trains (0 to produce them as they are consumed)
+IMAGE_FAKE_DATA_MEMMAP_DTYPE = 'uint8'  # Storage type of fake images in 'memmap' mode ('uint8' matches the precision of the real images, or 'float16')
+IMAGE_FEATURE_STATS_NUM_EXAMPLES = 10000  # Number of fake images scored per evaluation with the 'feature_stats' metric
 
 # Image training parameters
 IMAGE_DEFAULT_NUM_EPOCHS = 400
 IMAGE_DEFAULT_TRAIN_VAL_TEST_SPLITS = [0.80, 0.10, 0.10]
+IMAGE_PREPROCESS_NUM_WORKERS = None  # Number of processes decoding, cropping and saving uploaded images (None = all CPUs)
+IMAGE_PREPROCESS_CHUNK_SIZE = 256  # Number of images handed to a preprocessing process at a time
+IMAGE_PACKED_FOLDER = 'packed'  # Folder of the run directory each split is packed into after preprocessing, see PackedImageDataset
 IMAGE_DEFAULT_BATCH_SIZE = 128
 IMAGE_DEFAULT_PRINT_FREQ = 5
 IMAGE_DEFAULT_EVAL_FREQ = 50
 IMAGE_DEFAULT_CLASS_NAME = 'Image Class'
+IMAGE_DEFAULT_NUM_PROCS = 1  # Number of local processes to train with. Values above 1 train data-parallel on CPU through torch.distributed.
+IMAGE_DISTRIBUTED_BACKEND = 'gloo'
+IMAGE_DISTRIBUTED_TIMEOUT = 24 * 60 * 60  # Seconds, non-main processes wait on the main process while it runs evaluations
 
 # Max Image parameters
 IMAGE_MAX_X_DIM = 1080
@@ -1,60 +1,79 @@
-from CSDGAN.classes.image.ImageDataset import ImageFolderWithPaths, ImageFolder
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset, PackedImageLoader, ResidentImageLoader
+from CSDGAN.classes.TensorBatchIterator import TensorBatchIterator
 import utils.image_utils as iu
 import utils.utils as uu
 import CSDGAN.utils.constants as cs
 
 from torch.utils import data
-import torchvision
+from torchvision.datasets.folder import IMG_EXTENSIONS, has_file_allowed_extension
 from sklearn.model_selection import train_test_split
-import shutil
-import torchvision.transforms as t
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from zipfile import ZipFile
+from PIL import Image
+import torchvision.transforms.functional as tf
 import pandas as pd
+import numpy as np
+import json
+import io
 import os
 
 
-def import_dataset(path, bs, shuffle, incl_paths):
+def prefer_packed_dataset(gen, folder, split):
     """
-    Image generator for a directory containing folders as label names (and images of that label within each of these label-named folders)
-    :param path: Path to parent directory
-    :param bs: Batch size
-    :param shuffle: Whether to shuffle the data order
-    :param incl_paths: Whether to use ImageFolderWithPaths or simply ImageFolder (the former returns the path to each image as a third item in the iterator).
-    :return: PyTorch DataLoader
+    :param gen: DataLoader (or PackedImageLoader) of a split. If a ResidentImageLoader, its source loader is swapped instead.
+    :param folder: Directory splits are packed into by ingest_image_zip
+    :param split: Name of the split
+    :return: PackedImageLoader over the packed split with the batch size and shuffling of gen if the split was packed, otherwise gen
     """
-    if incl_paths:
-        dataset = ImageFolderWithPaths(
-            root=path,
-            transform=torchvision.transforms.ToTensor()
-        )
-    else:
-        dataset = ImageFolder(
-            root=path,
-            transform=torchvision.transforms.ToTensor()
-        )
-    loader = data.DataLoader(
-        dataset,
-        batch_size=bs,
-        num_workers=0,
-        shuffle=shuffle
-    )
-    return loader
-
-
-def preprocess_imported_dataset(path, import_gen, splits=None, x_dim=None):
-    """
-    Preprocesses entire image data set, cropping images and splitting them into train and validation folders.
+    if isinstance(gen, ResidentImageLoader):  # Decoded again from the packed split when first needed
+        gen.source = prefer_packed_dataset(gen=gen.source, folder=folder, split=split)
+        gen.dataset = gen.source.dataset
+        return gen
+    if not PackedImageDataset.exists(folder, split):
+        return gen
+    return PackedImageLoader(PackedImageDataset(folder=folder, split=split), batch_size=gen.batch_size, shuffle=loader_shuffles(gen))
+
+
+def loader_shuffles(gen):
+    """
+    :param gen: DataLoader or TensorBatchIterator (e.g. PackedImageLoader)
+    :return: Whether gen draws a new order each epoch
+    """
+    return gen.shuffle if isinstance(gen, TensorBatchIterator) else isinstance(gen.sampler, data.RandomSampler)
+
+
+def split_image_map(dataset_map, splits):
+    """
+    Splits a table mapping out an image data set into train/val/test via stratified sampling
+    :param dataset_map: Table with one row per image and a label column, as returned by scan_image_zip
+    :param splits: Train/Validation/Test Splits
+    :return: dataset_map with a split column
+    """
+    train_val_map, test_map = train_test_split(dataset_map, test_size=splits[2], shuffle=True, stratify=dataset_map['label'])
+    train_map, val_map = train_test_split(train_val_map, test_size=splits[1] / (splits[0]+splits[1]), stratify=train_val_map['label'])
+    train_map['split'], val_map['split'], test_map['split'] = 'train', 'val', 'test'
+    return pd.concat((train_map, val_map, test_map), axis=0)
+
+
+def ingest_image_zip(zip_path, folder, out_folder, splits=None, x_dim=None, num_workers=None, chunk_size=cs.IMAGE_PREPROCESS_CHUNK_SIZE, logger=None,
+                     manifest=None):
+    """
+    Streams an uploaded image data set from its zip straight into packed splits (see PackedImageDataset), without extracting it to disk.
     Returns import information for future steps
-    1. Scan data set and map it by label
+    1. Map out and validate data set from the zip's central directory
     2. Split into train/val/test
     3. Encodes labels for one hot encoding
-    4. Initializes directories
-    5. Preprocesses images and save to directory
-    6. Delete original images
+    4. Decodes each image from the zip, crops it and writes it into its packed split
 
-    :param path: Path where unprocessed images are located and where processed images will be saved
-    :param import_gen: PyTorch DataLoader with raw images
+    :param zip_path: Path to the uploaded zip
+    :param folder: Name of the folder in the zip containing one folder of images per label
+    :param out_folder: Directory to write the packed splits to
     :param splits: Train/Validation/Test Splits
     :param x_dim: Desired dimensions of image. If None, dimensions of first image are used.
+    :param num_workers: Number of processes decoding images, each reading the zip through its own handle. If None, all CPUs are used.
+    :param chunk_size: Number of images per chunk handed to a process
+    :param logger: Logger to report progress to. If None, progress is printed.
+    :param manifest: ImageManifest of the zip. If given, the data set is mapped out and sized from it instead of from the zip.
     :return: Tuple of label encoder, one hot encoder, and image dimensions
     """
     if splits is None:
@@ -63,99 +82,157 @@ def preprocess_imported_dataset(path, import_gen, splits=None, x_dim=None):
     assert round(sum(splits), 5) == 1.0
     assert len(splits) == 3
 
-    # Scan data set, create table mapping it out by label
-    dataset_map, labels = scan_image_dataset(path)
-    train_val_map, test_map = train_test_split(dataset_map, test_size=splits[2], shuffle=True, stratify=dataset_map['label'])
-    train_map, val_map = train_test_split(train_val_map, test_size=splits[1] / (splits[0]+splits[1]), stratify=train_val_map['label'])
-    train_map['split'], val_map['split'], test_map['split'] = 'train', 'val', 'test'
-    dataset_map = pd.concat((train_map, val_map, test_map), axis=0)
-    dataset_map.sort_index(inplace=True)
-    dataset_map.set_index(keys=['id', 'label'], inplace=True)
-
-    # Set up paths for image folder
-    os.makedirs(os.path.join(path, "train"), exist_ok=True)
-    os.makedirs(os.path.join(path, "val"), exist_ok=True)
-    os.makedirs(os.path.join(path, "test"), exist_ok=True)
-
-    for label in labels:
-        os.makedirs(os.path.join(path, "train", label), exist_ok=True)
-        os.makedirs(os.path.join(path, "val", label), exist_ok=True)
-        os.makedirs(os.path.join(path, "test", label), exist_ok=True)
+    # Map out data set from the manifest or the central directory, then split it
+    if manifest is not None:
+        dataset_map, labels = manifest.dataset_map()
+    else:
+        dataset_map, labels = scan_image_zip(zip_path=zip_path, folder=folder)
+    dataset_map = split_image_map(dataset_map=dataset_map, splits=splits)
 
     _, le, ohe = uu.encode_y(labels)
 
-    # Determine crop size if not given
-    if x_dim is None:
-        x_dim = find_first_img_dim(import_gen=import_gen)
-
-    # Determine ideal crop size based on architecture
+    # Determine crop size if not given (from the manifest, or the first image in ImageFolder order), then ideal crop size based on architecture
+    if manifest is not None:
+        x_dim = manifest.x_dim() if x_dim is None else x_dim
+        num_channels = manifest.num_channels
+    else:
+        with ZipFile(zip_path, 'r') as zip_ref:
+            first = load_zip_image(zip_ref=zip_ref, name=dataset_map.sort_values(by=['label', 'id'])['id'].iloc[0])
+        x_dim = (first.size[1], first.size[0]) if x_dim is None else x_dim
+        num_channels = len(first.getbands())
     h_best_crop, _, _ = iu.find_pow_2_arch(x_dim[0])
     w_best_crop, _, _ = iu.find_pow_2_arch(x_dim[1])
+    crop = (x_dim[0] - h_best_crop, x_dim[1] - w_best_crop)
+    shape = (num_channels,) + crop
 
-    # Initialize transformer
-    transformer = t.Compose([
-        t.ToPILImage(),
-        t.CenterCrop((x_dim[0] - h_best_crop, x_dim[1] - w_best_crop))
-    ])
+    # Decode images from the zip into each packed split, in ImageFolder order (by label, then by name)
+    class_idx = {label: i for i, label in enumerate(labels)}
+    for split in ['train', 'val', 'test']:
+        split_map = dataset_map[dataset_map['split'] == split].sort_values(by=['label', 'id'])
+        header, images_path = init_packed_split(out_folder=out_folder, split=split, shape=shape, classes=labels,
+                                                labels=[class_idx[label] for label in split_map['label']])
+        tasks = list(zip(split_map['id'], range(len(split_map))))
+        process_in_chunks(worker=ingest_image_chunk, tasks=tasks, num_workers=num_workers, chunk_size=chunk_size, logger=logger,
+                          statement="Ingested %d/%d " + split + " images", zip_path=zip_path, crop=crop, path=images_path,
+                          shape=(header['num_images'],) + shape)
+        write_packed_header(out_folder=out_folder, header=header)
 
-    # Preprocess images and save into train/val folders
-    for x, y, img_ids in import_gen:
-        for i in range(len(x)):
-            img = transformer(x[i])
-            label = le.inverse_transform(y[i].view(-1)).take(0)
-            split = dataset_map.loc[img_ids[i], label].values.take(0)
-            img.save(os.path.join(path, split, label, img_ids[i]))
+    return le, ohe, crop
 
-    # Delete original images to save space
-    for label in labels:
-        shutil.rmtree(os.path.join(path, label))
 
-    return le, ohe, (x_dim[0] - h_best_crop, x_dim[1] - w_best_crop)
+def ingest_image_chunk(tasks, zip_path, crop, path, shape):
+    """
+    Worker of ingest_image_zip
+    :return: Number of images ingested
+    """
+    images = np.memmap(path, dtype=np.uint8, mode='r+', shape=shape)
+    with ZipFile(zip_path, 'r') as zip_ref:
+        for name, i in tasks:
+            img = to_chw(tf.center_crop(load_zip_image(zip_ref=zip_ref, name=name), crop))
+            assert img.shape == shape[1:], "Image %s has shape %s, expected %s. All images of a split must have the same shape." % (name, img.shape, shape[1:])
+            images[i] = img
+    images.flush()
+    return len(tasks)
 
 
-def scan_image_dataset(path):
+def scan_image_zip(zip_path, folder):
     """
-    Loops through image data set and produces a table with info about the data set
-    Assumes all extensions are the same
-    :param path: Path to image data set
-    :return: Tuple of table with one row per image, with file name and label as features, and a vector of labels
+    Maps out and validates an image data set uploaded as a zip from the names in its central directory alone, without extracting or decoding anything.
+    Every image must be in a folder named with its label, within folder (folder/label/image, or deeper, as read by ImageFolder),
+    and have an extension ImageFolder reads. Directories, hidden files (e.g. .DS_Store), macOS resource forks and entries outside folder are skipped.
+    :param zip_path: Path to the zip
+    :param folder: Name of the folder in the zip containing one folder of images per label
+    :return: Tuple of table with one row per image, with member name and label as features, and a vector of labels
     """
-    labels = sorted(os.listdir(path))
-
     dict = {'id': [], 'label': []}
-    for label in labels:
-        tmp_ids = os.listdir(os.path.join(path, label))
-        tmp_labels = [label for id in tmp_ids]
-        dict['id'] += tmp_ids
-        dict['label'] += tmp_labels
+    with ZipFile(zip_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            parts = info.filename.rstrip('/').split('/')
+            if info.is_dir() or parts[0] != folder or parts[-1].startswith('.'):
+                continue
+            assert len(parts) >= 3, "Not all files in primary folder are folders (found %s)" % info.filename
+            assert has_file_allowed_extension(parts[-1], IMG_EXTENSIONS), \
+                "File %s is not an image. Supported extensions: %s" % (info.filename, ', '.join(IMG_EXTENSIONS))
+            dict['id'].append(info.filename)
+            dict['label'].append(parts[1])
+    assert len(dict['id']) > 0, "Image folder not named the same as zip file, or contains no images"
 
     df = pd.DataFrame(data=dict)
 
-    return df, labels
+    return df, sorted(df['label'].unique())
 
 
-def find_img_folder_name(data_dir):
-    """Loops through contents of unzipped data folder and returns the first folder it finds"""
-    return [name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name))][0]
+def load_zip_image(zip_ref, name):
+    """Decodes an image member of an open zip as an RGB PIL Image, as the loader of an ImageFolder would from disk"""
+    img = Image.open(io.BytesIO(zip_ref.read(name)))
+    return img.convert('RGB')
 
 
-def find_first_img_dim(import_gen):
+def init_packed_split(out_folder, split, shape, classes, labels):
     """
-    Loads in the first image in a provided data set and returns its dimensions
-    Intentionally returns on first iteration of the loop
-    :param import_gen: PyTorch DataLoader utilizing ImageFolderWithPaths for its dataset
-    :return: dimensions of image
+    Preallocates the image array of a packed split and writes its labels
+    :param out_folder: Directory to write the packed split to
+    :param split: Name of the split, used to name the files
+    :param shape: Shape of each image (channel, height, width)
+    :param classes: List of label names, in class index order
+    :param labels: Class index of each image
+    :return: Tuple of the header of the split, to be written by write_packed_header once every image is written, and the path of the image array
     """
-    for x, _, _ in import_gen:
-        return x[0].shape[-2], x[0].shape[-1]
+    header = {'num_images': len(labels), 'shape': list(shape), 'classes': list(classes), 'images': split + '.images', 'labels': split + '.labels',
+              'split': split}
+
+    os.makedirs(out_folder, exist_ok=True)
+    images_path = os.path.join(out_folder, header['images'])
+    np.memmap(images_path, dtype=np.uint8, mode='w+', shape=(header['num_images'],) + tuple(shape)).flush()  # Preallocate
+    np.array(labels, dtype=np.int64).tofile(os.path.join(out_folder, header['labels']))
+    return header, images_path
+
+
+def write_packed_header(out_folder, header):
+    """Writes the header of a packed split, marking it as complete (see PackedImageDataset.exists)"""
+    with open(os.path.join(out_folder, header['split'] + '.json'), 'w') as f:
+        json.dump(header, f)
+
+
+def to_chw(img):
+    """Pixels of a PIL Image as a uint8 array in (channel, height, width) format, as ToTensor would lay them out"""
+    arr = np.asarray(img, dtype=np.uint8)
+    return arr[None] if arr.ndim == 2 else arr.transpose(2, 0, 1)
 
 
-def find_first_img_num_channels(import_gen):
+def process_in_chunks(worker, tasks, num_workers, chunk_size, logger, statement, **kwargs):
     """
-    Loads in the first image in a provided data set and returns its number of channels
-    Intentionally returns on first iteration of the loop
-    :param import_gen: PyTorch DataLoader utilizing ImageFolderWithPaths for its dataset
-    :return: dimensions of image
+    Runs worker over chunks of tasks on a pool of processes, reporting progress roughly every 10% of tasks
+    :param worker: Function called as worker(tasks=chunk, **kwargs), returning the number of tasks done
+    :param tasks: List of tasks
+    :param num_workers: Number of processes. If None, all CPUs are used. If 1, chunks are run in this process.
+    :param chunk_size: Number of tasks per chunk
+    :param logger: Logger to report progress to. If None, progress is printed.
+    :param statement: Progress statement, formatted with the number of tasks done and the total number of tasks
     """
-    for x, _, _ in import_gen:
-        return x[0].shape[0]
+    num_workers = num_workers or os.cpu_count() or 1
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    num_workers = min(num_workers, len(chunks))
+    report_every = max(1, len(tasks) // 10)
+
+    def report(num_done, last_reported):
+        if num_done // report_every > last_reported // report_every or num_done == len(tasks):
+            if logger is None:
+                print(statement % (num_done, len(tasks)))
+            else:
+                logger.info(statement % (num_done, len(tasks)))
+            return num_done
+        return last_reported
+
+    num_done, last_reported = 0, 0
+    if num_workers <= 1:
+        for chunk in chunks:
+            num_done += worker(tasks=chunk, **kwargs)
+            last_reported = report(num_done, last_reported)
+        return
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(worker, tasks=chunk, **kwargs) for chunk in chunks]
+        for future in as_completed(futures):
+            num_done += future.result()
+            last_reported = report(num_done, last_reported)
@@ -1,14 +1,19 @@
 import CSDGAN.utils.constants as cs
 import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.EvaluationContext import EvaluationContext
+from CSDGAN.classes.CheckpointRegistry import CheckpointRegistry
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset
+from CSDGAN.classes.image.ImageManifest import ImageManifest
 
 import os
+import io
 import pandas as pd
 import shutil
 import logging
 import unicodedata
 import string
 import datetime as d
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED
 import pickle as pkl
 from collections import OrderedDict
 
@@ -17,7 +22,15 @@ def get_CGAN(username, title):
     path = os.path.join(cs.RUN_FOLDER, username, title, 'CGAN.pkl')
     assert os.path.exists(path), 'CGAN object not found'
     with open(path, 'rb') as f:
-        return pkl.load(f)
+        CGAN = pkl.load(f)
+    CGAN.eval_context = EvaluationContext.load(os.path.dirname(path))  # If not found, rebuilt when first needed
+    CGAN.checkpoints = CheckpointRegistry.load(os.path.join(os.path.dirname(path), 'stored_generators')) or CGAN.checkpoints  # The registry on disk is the latest
+    if type(CGAN).__name__ == 'ImageCGAN':  # Read packed splits instead of decoding image files, if they were packed
+        packed_folder = os.path.join(os.path.dirname(path), cs.IMAGE_PACKED_FOLDER)
+        CGAN.train_gen, CGAN.val_gen, CGAN.test_gen = [cuidl.prefer_packed_dataset(gen=gen, folder=packed_folder, split=split)
+                                                       for gen, split in zip([CGAN.train_gen, CGAN.val_gen, CGAN.test_gen], ['train', 'val', 'test'])]
+        CGAN.data_gen = CGAN.train_gen
+    return CGAN
 
 
 def get_tabular_dataset(username, title):
@@ -49,6 +62,11 @@ def get_image_dataset(username, title):
     with open(os.path.join(run_dir, "test_gen.pkl"), "rb") as f:
         test_gen = pkl.load(f)
 
+    # Read packed splits instead of decoding image files, if they were packed
+    packed_folder = os.path.join(run_dir, cs.IMAGE_PACKED_FOLDER)
+    train_gen, val_gen, test_gen = [cuidl.prefer_packed_dataset(gen=gen, folder=packed_folder, split=split)
+                                    for gen, split in zip([train_gen, val_gen, test_gen], ['train', 'val', 'test'])]
+
     return le, ohe, train_gen, val_gen, test_gen
 
 
@@ -132,11 +150,13 @@ def validate_image_choices(dep_var, x_dim, bs, splits, num_epochs, num_channels)
     return None
 
 
-def unzip_and_validate_img_zip(run_id, username, title):
+def validate_img_zip(run_id, username, title):
     """
     Validates user submitted data set to ensure that data submitted is a zip file,
     with all images with same label in a folder named with the label name.
     Images should either be the same size, or a specified image size should be provided (all images will be cropped to the same size)
+    Validation reads the zip's central directory and the header of each image only, saving what it finds as an ImageManifest in the run folder.
+    The zip is not extracted: make_image_dataset streams images from it.
     :param run_id: Run ID associated with this run
     :return: True if validation successful, False otherwise. Also returns a message associated with the failure if failure, and name of file if successful.
     """
@@ -145,40 +165,57 @@ def unzip_and_validate_img_zip(run_id, username, title):
     if not os.path.exists(run_dir):
         return False, "Run directory does not exist"
 
-    # Perform various checks and unzip data
-    path = os.path.join(cs.UPLOAD_FOLDER, str(run_id))
-    file = os.listdir(path)[0]
-    if not os.path.splitext(file)[1] == '.zip':
+    # Perform various checks on the contents of the zip
+    zip_path = get_img_zip_path(run_id=run_id)
+    if not os.path.splitext(zip_path)[1] == '.zip':
         return False, "Image file path passed is not zip"
 
-    zip_ref = ZipFile(os.path.join(path, file), 'r')
-    zip_ref.extractall(run_dir)
-    zip_ref.close()
+    folder = os.path.splitext(os.path.basename(zip_path))[0]
+    try:
+        manifest = ImageManifest.build(zip_path=zip_path, folder=folder)
+    except AssertionError as e:
+        return False, str(e)
+    manifest.save(run_dir)
+    return True, folder
 
-    unzipped_path = os.path.join(run_dir, os.path.splitext(file)[0])
-    if not os.path.exists(unzipped_path):
-        return False, "Image folder not named the same as zip file"
-    if not all([os.path.isdir(os.path.join(unzipped_path, x)) for x in os.listdir(unzipped_path)]):
-        return False, "Not all files in primary folder are folders"
-    return True, os.path.splitext(file)[0]
+
+def get_img_zip_path(run_id):
+    """Path to the file uploaded for run_id"""
+    path = os.path.join(cs.UPLOAD_FOLDER, str(run_id))
+    return os.path.join(path, os.listdir(path)[0])
 
 
-def parse_image_folder(username, title, file):
+def parse_image_manifest(run_id, username, title):
     """
-    Parses an uploaded image data set and returns various information about its contents
+    Parses the manifest of an uploaded image data set and returns various information about its contents.
+    Uploads validated before manifests were saved have theirs built from the uploaded zip and saved now.
     Returns:
-        1. Dimensions of first image found
+        1. Default image dimensions (those of the first image found, or the smallest if sizes differ)
         2. Number of channels in image
         3. Table with rows of each label per row, and number of instances of that label in the second column
+        4. Statement flagging inconsistent image sizes, None if all images are the same size
     """
-    path = os.path.join(cs.RUN_FOLDER, username, title, file)
-    import_gen = cuidl.import_dataset(path=path, bs=cs.IMAGE_DEFAULT_BATCH_SIZE, shuffle=False, incl_paths=True)
-    x_dim = cuidl.find_first_img_dim(import_gen=import_gen)
-    num_channels = cuidl.find_first_img_num_channels(import_gen=import_gen)
-    df, _ = cuidl.scan_image_dataset(path=path)
-    summarized_df = df.groupby(by='label').size()
+    run_dir = os.path.join(cs.RUN_FOLDER, username, title)
+    manifest = ImageManifest.load(run_dir)
+    if manifest is None:
+        zip_path = get_img_zip_path(run_id=run_id)
+        manifest = ImageManifest.build(zip_path=zip_path, folder=os.path.splitext(os.path.basename(zip_path))[0])
+        manifest.save(run_dir)
+    return manifest.x_dim(), manifest.num_channels, manifest.class_counts(), manifest.size_statement()
 
-    return x_dim, num_channels, summarized_df
+
+def parse_image_labels(username, title):
+    """
+    :return: Sorted list of the labels of an image run, read from its manifest (or, for older runs, its packed training split or training folder)
+    """
+    run_dir = os.path.join(cs.RUN_FOLDER, username, title)
+    manifest = ImageManifest.load(run_dir)
+    if manifest is not None:
+        return sorted(manifest.classes)
+    if PackedImageDataset.exists(os.path.join(run_dir, cs.IMAGE_PACKED_FOLDER), 'train'):
+        return sorted(PackedImageDataset(folder=os.path.join(run_dir, cs.IMAGE_PACKED_FOLDER), split='train').classes)
+    folder = [x for x in os.listdir(run_dir) if os.path.isdir(os.path.join(run_dir, x, 'train'))][0]
+    return sorted(os.listdir(os.path.join(run_dir, folder, 'train')))
 
 
 def setup_run_logger(name, username, title, filename='run_log', level=logging.INFO):
@@ -225,17 +262,17 @@ def clean_filename(filename, replace=' '):
     return cleaned_filename[:char_limit]
 
 
-def export_tabular_to_zip(df, username, run_title, zip_title):
-    """Exports a dataframe of generated data to an appropriate zip file"""
+def export_tabular_to_zip(dfs, username, run_title, zip_title):
+    """
+    Exports generated data to an appropriate zip file. Data is streamed as CSV straight into a compressed member of the zip, so only one DataFrame is held in memory at a time.
+    :param dfs: Iterable of DataFrames of generated data, all with the same columns. The header is written from the first.
+    """
     full_path = os.path.join(cs.OUTPUT_FOLDER, username, run_title)
     os.makedirs(full_path, exist_ok=True)
-    og_dir = os.getcwd()
-    os.chdir(full_path)
-    df.to_csv(zip_title + '.txt', index=False)
-    with ZipFile(zip_title + '.zip', 'w') as z:
-        z.write(zip_title + '.txt')
-    os.remove(zip_title + '.txt')
-    os.chdir(og_dir)
+    with ZipFile(os.path.join(full_path, zip_title + '.zip'), 'w', compression=ZIP_DEFLATED) as z:
+        with z.open(zip_title + '.txt', 'w', force_zip64=True) as member, io.TextIOWrapper(member, encoding='utf-8', newline='') as f:
+            for i, df in enumerate(dfs):
+                df.to_csv(f, header=i == 0, index=False)
 
 
 def create_gen_dict(request_form, directory, username, title, aug=None):
@@ -0,0 +1,158 @@
+"""
+Benchmarks compiled netG/netD forward passes (compile_nets) against eager execution for both the TabularCGAN and the ImageCGAN.
+Reports steps per second of each mode and the resulting speedup. Time of the first (warm up) epoch, which includes compilation, is reported separately and excluded from the speed comparison.
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/compile_nets.py
+"""
+from CSDGAN.classes.image.ImageCGAN import ImageCGAN
+from CSDGAN.classes.image.ImageDataset import ImageDataset
+from CSDGAN.classes.tabular.TabularCGAN import TabularCGAN
+from CSDGAN.classes.tabular.TabularDataset import TabularDataset
+import utils.utils as uu
+
+from torch.utils import data
+import tempfile
+import random
+import time
+import os
+import numpy as np
+import pandas as pd
+import torch
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_EPOCHS = 3
+NC = 4
+
+TABULAR_NUM_ROWS = 20000
+TABULAR_BATCH_SIZE = 1000
+TABULAR_NUM_CONT = 10
+TABULAR_CAT_LEVELS = [2, 3, 5, 8, 12]  # One categorical feature per entry, with the given number of levels
+TABULAR_CGAN_INIT_PARAMS = {'nz': 64,
+                            'sched_netG': 1,
+                            'netG_H': 32,
+                            'netD_H': 32,
+                            'netG_lr': 2e-4,
+                            'netD_lr': 2e-4,
+                            'netG_beta1': 0.5,
+                            'netD_beta1': 0.5,
+                            'netG_beta2': 0.999,
+                            'netD_beta2': 0.999,
+                            'netG_wd': 0,
+                            'netD_wd': 0,
+                            'label_noise': 0.0,
+                            'label_noise_linear_anneal': False,
+                            'discrim_noise': 0.0,
+                            'discrim_noise_linear_anneal': False,
+                            'eval_param_grid': {'tol': [1e-5], 'C': [0.5], 'l1_ratio': [0]},
+                            'eval_folds': 5,
+                            'test_ranges': [TABULAR_NUM_ROWS // 10],
+                            'seed': MANUAL_SEED,
+                            'eval_stratify': None,
+                            'fast_step': True}
+
+IMAGE_BATCH_SIZE = 128
+IMAGE_SPLIT_SIZES = (3000, 500, 500)  # Train/Validation/Test
+IMAGE_CGAN_INIT_PARAMS = {'sched_netG': 2,
+                          'label_noise': 0.25,
+                          'label_noise_linear_anneal': True,
+                          'discrim_noise': 0.25,
+                          'discrim_noise_linear_anneal': True,
+                          'nc': NC,
+                          'nz': 64,
+                          'num_channels': 1,
+                          'netG_nf': 64,
+                          'netD_nf': 64,
+                          'netG_lr': 2e-4,
+                          'netD_lr': 2e-4,
+                          'netE_lr': 2e-4,
+                          'netG_beta1': 0.5,
+                          'netG_beta2': 0.999,
+                          'netD_beta1': 0.5,
+                          'netD_beta2': 0.999,
+                          'netE_beta1': 0.5,
+                          'netE_beta2': 0.999,
+                          'netG_wd': 0,
+                          'netD_wd': 0,
+                          'netE_wd': 0,
+                          'fake_data_set_size': 1000,
+                          'fake_bs': IMAGE_BATCH_SIZE,
+                          'eval_num_epochs': 1,
+                          'early_stopping_patience': 3,
+                          'fast_step': True}
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def make_tabular_df():
+    df = pd.DataFrame(np.random.randn(TABULAR_NUM_ROWS, TABULAR_NUM_CONT), columns=['cont_' + str(i) for i in range(TABULAR_NUM_CONT)])
+    for i, levels in enumerate(TABULAR_CAT_LEVELS):
+        df['cat_' + str(i)] = np.random.choice(['level_' + str(j) for j in range(levels)], TABULAR_NUM_ROWS)
+    df['label'] = np.random.choice(['class_' + str(j) for j in range(NC)], TABULAR_NUM_ROWS)
+    return df
+
+
+def make_tabular_cgan(compile_nets, device):
+    df = make_tabular_df()
+    dataset = TabularDataset(df=df, dep_var='label', cont_inputs=['cont_' + str(i) for i in range(TABULAR_NUM_CONT)], int_inputs=[],
+                             test_size=TABULAR_NUM_ROWS // 5, seed=MANUAL_SEED)
+    data_gen = data.DataLoader(dataset, batch_size=TABULAR_BATCH_SIZE, shuffle=True, num_workers=0)
+    return TabularCGAN(data_gen=data_gen, device=device, path=os.path.join(tempfile.mkdtemp(), 'tabular_' + str(compile_nets)), nc=NC,
+                       compile_nets=compile_nets, **TABULAR_CGAN_INIT_PARAMS)
+
+
+def make_image_cgan(compile_nets, device):
+    templates = torch.rand(NC, 28, 28)
+    gens = []
+    for split_size in IMAGE_SPLIT_SIZES:
+        y = torch.randint(0, NC, (split_size,))
+        x = (templates[y] + 0.25 * torch.randn(split_size, 28, 28)).clamp(0, 1)
+        gens.append(data.DataLoader(ImageDataset(x=x, y=y), batch_size=IMAGE_BATCH_SIZE, shuffle=True, num_workers=0))
+    train_gen, val_gen, test_gen = gens
+    _, le, ohe = uu.encode_y(np.arange(NC))
+    return ImageCGAN(train_gen=train_gen, val_gen=val_gen, test_gen=test_gen, le=le, ohe=ohe, device=device,
+                     path=os.path.join(tempfile.mkdtemp(), 'image_' + str(compile_nets)), compile_nets=compile_nets, **IMAGE_CGAN_INIT_PARAMS)
+
+
+def benchmark(family, compile_nets, device):
+    seed_everything(MANUAL_SEED)
+    if family == 'tabular':
+        CGAN = make_tabular_cgan(compile_nets=compile_nets, device=device)
+        train_gen = CGAN.data_gen
+        train_kwargs = {'cadence': 1}
+    else:
+        CGAN = make_image_cgan(compile_nets=compile_nets, device=device)
+        train_gen = CGAN.train_gen
+        train_kwargs = {}
+
+    # Warm up for an epoch, triggering compilation of every graph variant (partial final batch, annealed noise) when enabled
+    start_time = time.perf_counter()
+    CGAN.train_gan(num_epochs=1, print_freq=1, **train_kwargs)
+    warmup_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    CGAN.train_gan(num_epochs=NUM_EPOCHS, print_freq=NUM_EPOCHS, **train_kwargs)
+    train_time = time.perf_counter() - start_time
+
+    return {'warmup_time': warmup_time, 'steps_per_sec': NUM_EPOCHS * len(train_gen) / train_time}
+
+
+device = torch.device("cuda:0" if (torch.cuda.is_available()) else "cpu")
+print("Device:", device)
+print("Threads:", torch.get_num_threads())
+
+results = {}
+for family in ['tabular', 'image']:
+    for compile_nets in [False, True]:
+        results[(family, compile_nets)] = benchmark(family=family, compile_nets=compile_nets, device=device)
+
+print()
+print("%-10s %-10s %14s %12s" % ('Family', 'Mode', 'Warm up epoch', 'Steps/sec'))
+for (family, compile_nets), result in results.items():
+    print("%-10s %-10s %13.1fs %12.2f" % (family, 'compiled' if compile_nets else 'eager', result['warmup_time'], result['steps_per_sec']))
+print()
+for family in ['tabular', 'image']:
+    print("%s speedup: %.2fx" % (family.capitalize(), results[(family, True)]['steps_per_sec'] / results[(family, False)]['steps_per_sec']))
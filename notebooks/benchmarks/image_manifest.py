@@ -0,0 +1,62 @@
+"""
+Benchmarks building an ImageManifest of an uploaded zip (reading the header of every image) against decoding every image of the zip,
+the least a pixel-level scan of sizes, modes and class counts would cost. Writes a synthetic upload of random JPEGs to a temporary zip,
+then reports the time of each. The parsing of extracted uploads it replaced can be benchmarked from the baseline commit (git show 32e949f).
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/image_manifest.py
+"""
+import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.image.ImageManifest import ImageManifest
+
+from zipfile import ZipFile
+from PIL import Image
+import numpy as np
+import tempfile
+import shutil
+import time
+import io
+import os
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_IMAGES = 2000
+NUM_LABELS = 4
+X_DIM = (256, 256)
+FOLDER = 'upload'
+
+
+def make_zip(path, rng):
+    """Zip of one folder per label of random RGB JPEGs"""
+    with ZipFile(path, 'w') as zip_ref:
+        for i in range(NUM_IMAGES):
+            f = io.BytesIO()
+            Image.fromarray(rng.randint(0, 256, size=X_DIM + (3,), dtype=np.uint8)).save(f, format='JPEG')
+            zip_ref.writestr('%s/label_%d/img_%d.jpg' % (FOLDER, i % NUM_LABELS, i), f.getvalue())
+
+
+def decode_all(zip_path):
+    with ZipFile(zip_path, 'r') as zip_ref:
+        return [cuidl.load_zip_image(zip_ref=zip_ref, name=name).size for name in zip_ref.namelist()]
+
+
+rng = np.random.RandomState(MANUAL_SEED)
+root = tempfile.mkdtemp()
+try:
+    zip_path = os.path.join(root, FOLDER + '.zip')
+    make_zip(zip_path, rng)
+    print("Images: %d of %dx%d, zip size: %.1f MiB" % (NUM_IMAGES, X_DIM[0], X_DIM[1], os.path.getsize(zip_path) / 1024 ** 2))
+    print()
+    print("%-40s %10s" % ('Scan', 'Time (s)'))
+    for name, scan in [('Decode every image', lambda: decode_all(zip_path)),
+                       ('Manifest (headers only)', lambda: ImageManifest.build(zip_path=zip_path, folder=FOLDER))]:
+        start_time = time.perf_counter()
+        scan()
+        print("%-40s %10.3f" % (name, time.perf_counter() - start_time))
+
+    manifest = ImageManifest.build(zip_path=zip_path, folder=FOLDER)
+    manifest.save(root)
+    start_time = time.perf_counter()
+    manifest = ImageManifest.load(root)
+    manifest.x_dim(), manifest.class_counts(), manifest.size_statement()
+    print("%-40s %10.3f" % ('Reading the saved manifest', time.perf_counter() - start_time))
+finally:
+    shutil.rmtree(root)
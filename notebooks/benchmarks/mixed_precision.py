@@ -0,0 +1,108 @@
+"""
+Benchmarks the bfloat16 autocast (mixed precision) training mode against full precision training of an ImageCGAN on MNIST-shaped data.
+Reports training speed of each mode, the resulting speedup, and the change in evaluator score.
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/mixed_precision.py
+"""
+from CSDGAN.classes.image.ImageCGAN import ImageCGAN
+from CSDGAN.classes.image.ImageDataset import ImageDataset
+import utils.utils as uu
+
+from torch.utils import data
+import tempfile
+import random
+import time
+import os
+import numpy as np
+import torch
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_EPOCHS = 5
+BATCH_SIZE = 128
+NC = 10
+NUM_CHANNELS = 1
+SPLIT_SIZES = (6000, 1000, 1000)  # Train/Validation/Test
+CGAN_INIT_PARAMS = {'sched_netG': 2,
+                    'label_noise': 0.25,
+                    'label_noise_linear_anneal': True,
+                    'discrim_noise': 0.25,
+                    'discrim_noise_linear_anneal': False,
+                    'nc': NC,
+                    'nz': 64,
+                    'num_channels': NUM_CHANNELS,
+                    'netG_nf': 128,
+                    'netD_nf': 128,
+                    'netG_lr': 2e-4,
+                    'netD_lr': 2e-4,
+                    'netE_lr': 2e-4,
+                    'netG_beta1': 0.5,
+                    'netG_beta2': 0.999,
+                    'netD_beta1': 0.5,
+                    'netD_beta2': 0.999,
+                    'netE_beta1': 0.5,
+                    'netE_beta2': 0.999,
+                    'netG_wd': 0,
+                    'netD_wd': 0,
+                    'netE_wd': 0,
+                    'fake_data_set_size': 5000,
+                    'fake_bs': BATCH_SIZE,
+                    'eval_num_epochs': 10,
+                    'early_stopping_patience': 3,
+                    'fast_step': True}
+
+
+def make_mnist_shaped_data(size, templates):
+    """Each class is a fixed random 28x28 template plus pixel noise, so an evaluator can learn something meaningful"""
+    y = torch.randint(0, NC, (size,))
+    x = (templates[y] + 0.25 * torch.randn(size, 28, 28)).clamp(0, 1)
+    return x, y
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+seed_everything(MANUAL_SEED)
+templates = torch.rand(NC, 28, 28)
+gens = []
+for split_size in SPLIT_SIZES:
+    x, y = make_mnist_shaped_data(size=split_size, templates=templates)
+    gens.append(data.DataLoader(ImageDataset(x=x, y=y), batch_size=BATCH_SIZE, shuffle=True, num_workers=0))
+train_gen, val_gen, test_gen = gens
+_, le, ohe = uu.encode_y(np.arange(NC))
+
+device = torch.device("cuda:0" if (torch.cuda.is_available()) else "cpu")
+print("Device:", device)
+print("Threads:", torch.get_num_threads())
+
+results = {}
+for mixed_precision in [False, True]:
+    seed_everything(MANUAL_SEED)
+    CGAN = ImageCGAN(train_gen=train_gen, val_gen=val_gen, test_gen=test_gen, le=le, ohe=ohe, device=device,
+                     path=os.path.join(tempfile.mkdtemp(), 'mixed_precision_' + str(mixed_precision)),
+                     mixed_precision=mixed_precision, **CGAN_INIT_PARAMS)
+
+    # Warm up so one-time allocation costs are not counted
+    x, y = next(iter(train_gen))
+    CGAN.train_one_step(x.to(device), torch.eye(NC)[y].to(device))
+
+    start_time = time.perf_counter()
+    CGAN.train_gan(num_epochs=NUM_EPOCHS, print_freq=NUM_EPOCHS)
+    train_time = time.perf_counter() - start_time
+
+    CGAN.init_fake_gen()
+    CGAN.test_model(train_gen=CGAN.fake_train_gen, val_gen=CGAN.fake_val_gen)
+
+    results[mixed_precision] = {'steps_per_sec': NUM_EPOCHS * len(train_gen) / train_time,
+                                'train_time': train_time,
+                                'score': CGAN.stored_acc[-1]}
+
+print()
+print("%-16s %12s %14s %16s" % ('Mode', 'Train time', 'Steps/sec', 'Evaluator score'))
+for mixed_precision, result in results.items():
+    print("%-16s %11.1fs %14.2f %16.4f" % ('bfloat16' if mixed_precision else 'fp32', result['train_time'], result['steps_per_sec'], result['score']))
+print()
+print("Speedup: %.2fx" % (results[True]['steps_per_sec'] / results[False]['steps_per_sec']))
+print("Change in evaluator score: %+.4f" % (results[True]['score'] - results[False]['score']))
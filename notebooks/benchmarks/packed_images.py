@@ -0,0 +1,86 @@
+"""
+Benchmarks reading a training split through the packed memory-mapped store (PackedImageLoader) against decoding the same number of images
+from the uploaded zip each epoch, the per-image cost the packed store avoids. Writes a synthetic upload of random PNGs to a temporary zip,
+packs it with ingest_image_zip, then reports the time of the packing step and of an epoch each way.
+The folder-based loaders it replaced can be benchmarked from the baseline commit (git show 32e949f).
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/packed_images.py
+"""
+import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset, PackedImageLoader
+
+from zipfile import ZipFile
+from PIL import Image
+import torchvision.transforms.functional as tf
+import numpy as np
+import logging
+import tempfile
+import shutil
+import torch
+import time
+import io
+import os
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_IMAGES = 4000
+NUM_LABELS = 4
+X_DIM = (64, 64)
+BATCH_SIZE = 128
+NUM_EPOCHS = 3
+FOLDER = 'upload'
+
+
+def make_zip(path, rng):
+    """Zip of one folder per label of random RGB PNGs"""
+    with ZipFile(path, 'w') as zip_ref:
+        for i in range(NUM_IMAGES):
+            f = io.BytesIO()
+            Image.fromarray(rng.randint(0, 256, size=X_DIM + (3,), dtype=np.uint8)).save(f, format='PNG')
+            zip_ref.writestr('%s/label_%d/img_%d.png' % (FOLDER, i % NUM_LABELS, i), f.getvalue())
+
+
+def decode_epoch(zip_path, names, crop):
+    """Decode, crop and batch every image of names from the zip, as a loader reading image files would"""
+    with ZipFile(zip_path, 'r') as zip_ref:
+        for i in range(0, len(names), BATCH_SIZE):
+            batch = [cuidl.to_chw(tf.center_crop(cuidl.load_zip_image(zip_ref=zip_ref, name=name), crop)) for name in names[i:i + BATCH_SIZE]]
+            torch.from_numpy(np.stack(batch)).float().div_(255)
+
+
+def time_epochs(epoch):
+    start_time = time.perf_counter()
+    for _ in range(NUM_EPOCHS):
+        epoch()
+    return (time.perf_counter() - start_time) / NUM_EPOCHS
+
+
+def packed_epoch(gen):
+    for x, y in gen:
+        pass
+
+
+rng = np.random.RandomState(MANUAL_SEED)
+root = tempfile.mkdtemp()
+try:
+    zip_path = os.path.join(root, FOLDER + '.zip')
+    make_zip(zip_path, rng)
+    out_folder = os.path.join(root, 'packed')
+
+    start_time = time.perf_counter()
+    _, _, crop = cuidl.ingest_image_zip(zip_path=zip_path, folder=FOLDER, out_folder=out_folder,
+                                        logger=logging.getLogger('packed_images'))  # No handlers, so progress is not shown
+    pack_time = time.perf_counter() - start_time
+    packed_gen = PackedImageLoader(PackedImageDataset(folder=out_folder, split='train'), batch_size=BATCH_SIZE, shuffle=False)
+    names = sorted(cuidl.scan_image_zip(zip_path=zip_path, folder=FOLDER)[0]['id'])[:len(packed_gen.dataset)]
+
+    decode_time = time_epochs(lambda: decode_epoch(zip_path, names, crop))
+    packed_time = time_epochs(lambda: packed_epoch(packed_gen))
+
+    print("Training images: %d, size: %s, batch size: %d" % (len(names), X_DIM, BATCH_SIZE))
+    print("Packing every split: %.3fs" % pack_time)
+    print()
+    print("%-20s %16s %10s" % ('Loader', 'Epoch time (s)', 'Speedup'))
+    print("%-20s %16.3f %9.2fx" % ('Decoding from zip', decode_time, 1.0))
+    print("%-20s %16.3f %9.2fx" % ('Packed', packed_time, decode_time / packed_time))
+finally:
+    shutil.rmtree(root)
@@ -0,0 +1,78 @@
+"""
+Benchmarks an epoch over a training split held decoded in memory (ResidentImageLoader, as chosen by ImageMemoryPlanner)
+against streaming it from disk through the packed split (PackedImageLoader). Writes a synthetic upload of random PNGs to a temporary zip
+and packs it with ingest_image_zip, then reports the planner's decision, the time to load the split once and the time of an epoch through each loader.
+The folder-based loaders packed splits replaced can be benchmarked from the baseline commit (git show 32e949f).
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/resident_images.py
+"""
+import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset, PackedImageLoader
+from CSDGAN.classes.image.ImageMemoryPlanner import ImageMemoryPlanner
+
+from zipfile import ZipFile
+from PIL import Image
+import numpy as np
+import logging
+import tempfile
+import shutil
+import torch
+import time
+import io
+import os
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_IMAGES = 4000
+NUM_LABELS = 4
+X_DIM = (64, 64)
+BATCH_SIZE = 128
+NUM_EPOCHS = 3
+FOLDER = 'upload'
+
+
+def make_zip(path, rng):
+    """Zip of one folder per label of random RGB PNGs"""
+    with ZipFile(path, 'w') as zip_ref:
+        for i in range(NUM_IMAGES):
+            f = io.BytesIO()
+            Image.fromarray(rng.randint(0, 256, size=X_DIM + (3,), dtype=np.uint8)).save(f, format='PNG')
+            zip_ref.writestr('%s/label_%d/img_%d.png' % (FOLDER, i % NUM_LABELS, i), f.getvalue())
+
+
+def time_epochs(gen):
+    start_time = time.perf_counter()
+    for _ in range(NUM_EPOCHS):
+        for x, y in gen:
+            x, y = x.to(device), y.to(device)
+    return (time.perf_counter() - start_time) / NUM_EPOCHS
+
+
+device = torch.device("cuda:0" if (torch.cuda.is_available()) else "cpu")
+rng = np.random.RandomState(MANUAL_SEED)
+root = tempfile.mkdtemp()
+try:
+    zip_path = os.path.join(root, FOLDER + '.zip')
+    make_zip(zip_path, rng)
+    out_folder = os.path.join(root, 'packed')
+    cuidl.ingest_image_zip(zip_path=zip_path, folder=FOLDER, out_folder=out_folder,
+                           logger=logging.getLogger('resident_images'))  # No handlers, so progress is not shown
+    packed_gen = PackedImageLoader(PackedImageDataset(folder=out_folder, split='train'), batch_size=BATCH_SIZE, shuffle=True)
+
+    planner = ImageMemoryPlanner()
+    mode, statement = planner.plan(gens={'train': packed_gen}, device=device)
+    print(statement)
+    mode = 'memory' if mode == 'disk' else mode  # Time the resident loader regardless
+
+    start_time = time.perf_counter()
+    resident_gen = planner.apply(gens={'train': packed_gen}, device=device, mode=mode)['train']
+    load_time = time.perf_counter() - start_time
+    print("Loading the split once: %.3fs" % load_time)
+    print()
+
+    packed_time = time_epochs(packed_gen)
+    resident_time = time_epochs(resident_gen)
+    print("%-24s %16s %10s" % ('Loader', 'Epoch time (s)', 'Speedup'))
+    print("%-24s %16.3f %9.2fx" % ('Packed (disk)', packed_time, 1.0))
+    print("%-24s %16.3f %9.2fx" % ('Resident (%s)' % mode, resident_time, packed_time / resident_time))
+finally:
+    shutil.rmtree(root)
@@ -0,0 +1,88 @@
+"""
+Benchmarks TabularFidelity.score against a straightforward implementation (per column and per class loops over np.searchsorted for the KS statistics,
+pandas value frequencies and DataFrame.corr) on synthetic encoded data with 1e4, 1e5 and 1e6 generated rows.
+Reports the time of each and the largest difference between their results.
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/tabular_fidelity.py
+"""
+from CSDGAN.classes.tabular.TabularFidelity import TabularFidelity
+
+from sklearn.preprocessing import LabelEncoder
+import time
+import numpy as np
+import pandas as pd
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_REAL = 10000
+NUM_FAKE = [10000, 100000, 1000000]
+NUM_CLASSES = 4
+CAT_SIZES = [2, 3, 5, 8]
+NUM_CONT = 8
+
+
+def make_data(num, rng, shift=0.0):
+    """Encoded data laid out as by TabularDataset: one hot encoded categorical features first, then continuous columns"""
+    y = rng.randint(0, NUM_CLASSES, num)
+    cats = [np.eye(size)[(rng.randint(0, size, num) + (rng.rand(num) < 0.3) * y) % size] for size in CAT_SIZES]
+    cont = rng.randn(num, NUM_CONT) + shift + 0.5 * y[:, None]
+    cont[:, -1] = np.round(cont[:, -1])  # A column with ties
+    return np.concatenate(cats + [cont], axis=1).astype(np.float32), y
+
+
+def ks_loop(a, b):
+    """Two sample KS statistic of 1-D arrays a and b"""
+    a, b = np.sort(a), np.sort(b)
+    points = np.concatenate((a, b))
+    return np.max(np.abs(np.searchsorted(a, points, side='right') / len(a) - np.searchsorted(b, points, side='right') / len(b)))
+
+
+def tv_loop(real, fake):
+    """Total variation distance of each categorical feature"""
+    tvs, start = [], 0
+    for size in CAT_SIZES:
+        p = pd.Series(real[:, start:start + size].argmax(1)).value_counts(normalize=True).reindex(range(size), fill_value=0)
+        q = pd.Series(fake[:, start:start + size].argmax(1)).value_counts(normalize=True).reindex(range(size), fill_value=0)
+        tvs.append(0.5 * np.abs(p - q).sum())
+        start += size
+    return np.array(tvs)
+
+
+def corr_loop(real, fake):
+    diff = np.abs(pd.DataFrame(real).corr().fillna(0).values - pd.DataFrame(fake).corr().fillna(0).values)
+    return 0.5 * diff[~np.eye(diff.shape[0], dtype=bool)].mean()
+
+
+def score_loop(x_real, y_real, x_fake, y_fake):
+    num_cat = sum(CAT_SIZES)
+    result = {'ks': np.array([ks_loop(x_real[:, j], x_fake[:, j]) for j in range(num_cat, x_real.shape[1])]),
+              'tv': tv_loop(x_real, x_fake),
+              'corr': corr_loop(x_real, x_fake)}
+    result['class_ks'] = np.array([[ks_loop(x_real[y_real == c, j], x_fake[y_fake == c, j]) for j in range(num_cat, x_real.shape[1])]
+                                   for c in range(NUM_CLASSES)])
+    result['class_tv'] = np.array([tv_loop(x_real[y_real == c], x_fake[y_fake == c]) for c in range(NUM_CLASSES)])
+    result['class_corr'] = np.array([corr_loop(x_real[y_real == c], x_fake[y_fake == c]) for c in range(NUM_CLASSES)])
+    return result
+
+
+rng = np.random.RandomState(MANUAL_SEED)
+le_dict = {'feature_' + str(i): LabelEncoder().fit(np.arange(size)) for i, size in enumerate(CAT_SIZES)}
+x_real, y_real = make_data(num=NUM_REAL, rng=rng)
+
+start_time = time.perf_counter()
+fidelity = TabularFidelity(x_real=x_real, y_real=y_real, le_dict=le_dict, nc=NUM_CLASSES)
+print("Real data statistics: %.3fs" % (time.perf_counter() - start_time))
+print()
+print("%-10s %12s %16s %10s %14s" % ('Rows', 'Loop (s)', 'Vectorized (s)', 'Speedup', 'Max abs diff'))
+for num_fake in NUM_FAKE:
+    x_fake, y_fake = make_data(num=num_fake, rng=rng, shift=0.1)
+
+    start_time = time.perf_counter()
+    expected = score_loop(x_real=x_real, y_real=y_real, x_fake=x_fake, y_fake=y_fake)
+    loop_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    result = fidelity.score(x_fake=x_fake, y_fake=y_fake)
+    vectorized_time = time.perf_counter() - start_time
+
+    max_diff = max(np.max(np.abs(np.asarray(result[name]) - np.asarray(expected[name]))) for name in expected)
+    print("%-10d %12.3f %16.3f %9.2fx %14.2e" % (num_fake, loop_time, vectorized_time, loop_time / vectorized_time, max_diff))
@@ -0,0 +1,68 @@
+"""
+Benchmarks ingesting an uploaded image zip by streaming it straight into packed splits (ingest_image_zip), in a single process and across
+every CPU. Writes a synthetic upload of random PNGs to a temporary zip, then reports the time of each and the bytes written to disk.
+The extract-then-preprocess pipeline it replaced can be benchmarked from the baseline commit (git show 32e949f).
+Run from the root of the repository: PYTHONPATH=. python notebooks/benchmarks/zip_ingestion.py
+"""
+import CSDGAN.utils.img_data_loading as cuidl
+
+from zipfile import ZipFile
+from PIL import Image
+import numpy as np
+import logging
+import tempfile
+import shutil
+import time
+import io
+import os
+
+# Benchmark parameters
+MANUAL_SEED = 999
+NUM_IMAGES = 4000
+NUM_LABELS = 4
+X_DIM = (70, 70)
+FOLDER = 'upload'
+logger = logging.getLogger('zip_ingestion')  # No handlers, so progress is not shown
+
+
+def make_zip(path, rng):
+    """Zip of one folder per label of random RGB PNGs"""
+    with ZipFile(path, 'w') as zip_ref:
+        for i in range(NUM_IMAGES):
+            f = io.BytesIO()
+            Image.fromarray(rng.randint(0, 256, size=X_DIM + (3,), dtype=np.uint8)).save(f, format='PNG')
+            zip_ref.writestr('%s/label_%d/img_%d.png' % (FOLDER, i % NUM_LABELS, i), f.getvalue())
+
+
+def folder_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def streaming_ingest(zip_path, run_dir, num_workers):
+    """
+    :return: Bytes written to disk
+    """
+    cuidl.scan_image_zip(zip_path=zip_path, folder=FOLDER)  # Validation
+    cuidl.ingest_image_zip(zip_path=zip_path, folder=FOLDER, out_folder=os.path.join(run_dir, 'packed'), num_workers=num_workers, logger=logger)
+    return folder_size(os.path.join(run_dir, 'packed'))
+
+
+rng = np.random.RandomState(MANUAL_SEED)
+root = tempfile.mkdtemp()
+try:
+    zip_path = os.path.join(root, FOLDER + '.zip')
+    make_zip(zip_path, rng)
+    print("Images: %d, zip size: %.1f MiB" % (NUM_IMAGES, os.path.getsize(zip_path) / 1024 ** 2))
+    print()
+    print("%-12s %10s %10s %20s" % ('Processes', 'Time (s)', 'Speedup', 'Written (MiB)'))
+
+    results = {}
+    for name, num_workers in [('1', 1), ('All CPUs', None)]:
+        run_dir = os.path.join(root, 'workers_' + str(num_workers))
+        os.makedirs(run_dir)
+        start_time = time.perf_counter()
+        written = streaming_ingest(zip_path, run_dir, num_workers=num_workers)
+        results[name] = time.perf_counter() - start_time
+        print("%-12s %10.3f %9.2fx %20.1f" % (name, results[name], results['1'] / results[name], written / 1024 ** 2))
+finally:
+    shutil.rmtree(root)
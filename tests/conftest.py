@@ -1,7 +1,9 @@
 import os
 import tempfile
 # TODO: A LOT MORE TESTING
+import numpy as np
 import pytest
+from sklearn.preprocessing import LabelEncoder
 from CSDGAN import create_app
 from CSDGAN.utils.db import get_db, init_db
 import CSDGAN.utils.constants as cs
@@ -59,3 +61,44 @@ class AuthActions(object):
 @pytest.fixture
 def auth(client):
     return AuthActions(client)
+
+
+@pytest.fixture
+def make_le_dict():
+    """Factory of dictionaries of LabelEncoders, one per categorical feature, fit to the given number of levels of each feature"""
+    def make(cat_sizes):
+        le_dict = {}
+        for i, size in enumerate(cat_sizes):
+            le = LabelEncoder()
+            le.fit(['level_%d' % j for j in range(size)])
+            le_dict['feature_%d' % i] = le
+        return le_dict
+    return make
+
+
+@pytest.fixture
+def make_encoded_data():
+    """
+    Factory of data encoded as by TabularDataset (one hot categorical columns first, then continuous columns) and its class indices.
+    Continuous columns are shifted by class, so that classes differ.
+    """
+    def make(rng, num_rows, nc, cat_sizes, num_cont, ties=False):
+        y = rng.randint(0, nc, size=num_rows)
+        one_hots = [np.eye(size)[rng.randint(0, size, size=num_rows)] for size in cat_sizes]
+        cont = rng.normal(size=(num_rows, num_cont)) + y[:, None] * 0.5
+        if ties:
+            cont = np.round(cont, 1)
+        return np.concatenate(one_hots + [cont], axis=1), y
+    return make
+
+
+@pytest.fixture
+def make_generated_data():
+    """Factory of data laid out like the output of a tabular netG: scores of each categorical level first, then continuous columns"""
+    def make(rng, num_rows, cat_sizes, num_cont, ties=False):
+        num_cat = sum(cat_sizes)
+        data = rng.random_sample((num_rows, num_cat + num_cont)).astype(np.float32)
+        if ties:
+            data[:, :num_cat] = np.round(data[:, :num_cat], 1)
+        return data
+    return make
@@ -0,0 +1,90 @@
+import numpy as np
+import pickle
+import pytest
+import torch
+from CSDGAN.classes.NetUtils import CustomCatGANLayer
+
+CAT_MASK = np.array([True, False, True, True, False, True, True, True])
+CAT_SIZES = [2, 1, 3]
+
+
+def reference(x, cat_mask, cat_sizes):
+    """One torch.softmax per categorical feature, categorical columns first, then continuous columns"""
+    cat_idx, cont_idx = torch.tensor(np.flatnonzero(cat_mask)), torch.tensor(np.flatnonzero(~cat_mask))
+    cat = x.index_select(1, cat_idx)
+    return torch.cat([torch.softmax(chunk, dim=1) for chunk in torch.split(cat, cat_sizes, dim=1)] + [x.index_select(1, cont_idx)], 1)
+
+
+@pytest.fixture
+def layer(make_le_dict):
+    return CustomCatGANLayer(cat_mask=CAT_MASK, le_dict=make_le_dict(CAT_SIZES))
+
+
+def test_matches_per_feature_softmax(layer):
+    torch.manual_seed(0)
+    x = torch.randn(64, len(CAT_MASK)) * 10
+
+    out = layer(x)
+
+    assert out.shape == x.shape
+    assert torch.allclose(out, reference(x, CAT_MASK, CAT_SIZES), atol=1e-6)
+    assert torch.allclose(out[:, :2].sum(dim=1), torch.ones(64))
+    assert torch.allclose(out[:, 3:6].sum(dim=1), torch.ones(64))
+
+
+def test_fallback_matches_per_feature_softmax(layer, monkeypatch):
+    """Versions of torch without scatter_reduce take one softmax per feature"""
+    def missing(self):
+        raise AttributeError('scatter_reduce')
+    monkeypatch.setattr(torch.Tensor, 'scatter_reduce', property(missing))
+    assert not hasattr(torch.zeros(1), 'scatter_reduce')
+    x = torch.randn(32, len(CAT_MASK))
+
+    assert torch.allclose(layer(x), reference(x, CAT_MASK, CAT_SIZES), atol=1e-6)
+
+
+def test_gradients_match_per_feature_softmax(layer):
+    torch.manual_seed(1)
+    x = torch.randn(16, len(CAT_MASK), requires_grad=True)
+    weights = torch.randn(16, len(CAT_MASK))
+
+    (layer(x) * weights).sum().backward()
+    grad = x.grad.clone()
+    x.grad.zero_()
+    (reference(x, CAT_MASK, CAT_SIZES) * weights).sum().backward()
+
+    assert torch.allclose(grad, x.grad, atol=1e-6)
+
+
+def test_large_inputs_are_stable(layer):
+    x = torch.full((2, len(CAT_MASK)), 1e4)
+    x[1, 0] = -1e4
+
+    out = layer(x)
+
+    assert torch.isfinite(out).all()
+    assert torch.allclose(out, reference(x, CAT_MASK, CAT_SIZES))
+
+
+def test_no_categorical_columns(make_le_dict):
+    layer = CustomCatGANLayer(cat_mask=np.array([False, False, False]), le_dict=make_le_dict([]))
+    x = torch.randn(4, 3)
+
+    assert torch.equal(layer(x), x)
+
+
+def test_layout_follows_conversions_and_stays_out_of_state_dict(layer):
+    layer = layer.double()
+    x = torch.randn(8, len(CAT_MASK), dtype=torch.float64)
+
+    assert layer.perm.dtype == torch.int64
+    assert layer.segment_ids.dtype == torch.int64
+    assert layer(x).dtype == torch.float64
+    assert torch.allclose(layer(x), reference(x, CAT_MASK, CAT_SIZES))
+    assert 'perm' not in layer.state_dict() and 'segment_ids' not in layer.state_dict()
+
+
+def test_pickle_round_trip(layer):
+    x = torch.randn(8, len(CAT_MASK))
+
+    assert torch.allclose(pickle.loads(pickle.dumps(layer))(x), layer(x))
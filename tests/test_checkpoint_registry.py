@@ -0,0 +1,128 @@
+import os
+import shutil
+import pytest
+import torch
+from CSDGAN.classes.CheckpointRegistry import CheckpointRegistry
+
+
+def state_dict(value):
+    return {'weight': torch.full((2, 2), float(value))}
+
+
+def save_and_record(registry, scores):
+    for epoch, score in scores:
+        registry.save(state_dict(epoch), epoch=epoch)
+        registry.record(epoch=epoch, score=score)
+
+
+def saved_epochs(folder):
+    return sorted(int(name.split('_')[1]) for name in os.listdir(folder) if name.endswith('_Generator.pt'))
+
+
+def test_keeps_every_checkpoint_without_top_k(tmp_path):
+    registry = CheckpointRegistry(folder=str(tmp_path))
+    save_and_record(registry, [(1, 0.5), (2, 0.7), (3, 0.6)])
+
+    assert sorted(registry.entries) == [1, 2, 3]
+    assert saved_epochs(str(tmp_path)) == [1, 2, 3]
+    assert registry.best()['epoch'] == 2
+    assert registry.total_size() == sum(os.path.getsize(registry.path(epoch)) for epoch in [1, 2, 3])
+
+
+def test_prunes_to_top_k(tmp_path):
+    registry = CheckpointRegistry(folder=str(tmp_path), keep_top_k=2)
+    save_and_record(registry, [(1, 0.5), (2, 0.7), (3, 0.6), (4, 0.4), (5, 0.9)])
+
+    assert sorted(registry.entries) == [2, 5]
+    assert saved_epochs(str(tmp_path)) == [2, 5]
+    assert registry.best()['epoch'] == 5
+    assert torch.equal(torch.load(registry.path(5))['weight'], state_dict(5)['weight'])
+    with pytest.raises(AssertionError):
+        registry.path(3)
+
+
+def test_unscored_checkpoints_are_kept(tmp_path):
+    registry = CheckpointRegistry(folder=str(tmp_path), keep_top_k=1)
+    for epoch in [1, 2, 3]:
+        registry.save(state_dict(epoch), epoch=epoch)
+    registry.record(epoch=1, score=0.5)
+    registry.record(epoch=2, score=0.8)
+
+    assert sorted(registry.entries) == [2, 3]
+    assert registry.entries[3]['score'] is None
+    assert saved_epochs(str(tmp_path)) == [2, 3]
+
+
+def test_ties_go_to_the_earlier_checkpoint(tmp_path):
+    registry = CheckpointRegistry(folder=str(tmp_path), keep_top_k=1)
+    save_and_record(registry, [(1, 0.5), (2, 0.8), (3, 0.8)])
+
+    assert registry.best()['epoch'] == 2
+    assert sorted(registry.entries) == [2]
+
+
+@pytest.mark.parametrize(('higher_is_better', 'kept', 'best'), (
+    (True, [2, 3], 2),
+    (False, [1, 4], 4),
+))
+def test_score_direction(tmp_path, higher_is_better, kept, best):
+    registry = CheckpointRegistry(folder=str(tmp_path), keep_top_k=2, higher_is_better=higher_is_better)
+    save_and_record(registry, [(1, 0.2), (2, 0.9), (3, 0.5), (4, 0.1)])
+
+    assert sorted(registry.entries) == kept
+    assert registry.best()['epoch'] == best
+
+
+def test_best_requires_a_score(tmp_path):
+    registry = CheckpointRegistry(folder=str(tmp_path))
+    registry.save(state_dict(1), epoch=1)
+    with pytest.raises(AssertionError):
+        registry.best()
+
+
+def test_load_round_trip(tmp_path):
+    registry = CheckpointRegistry(folder=str(tmp_path), keep_top_k=2, higher_is_better=False)
+    save_and_record(registry, [(1, 0.3), (2, 0.1), (3, 0.2)])
+
+    loaded = CheckpointRegistry.load(str(tmp_path))
+    assert loaded.keep_top_k == 2
+    assert loaded.higher_is_better is False
+    assert loaded.best_epoch == 2
+    assert loaded.entries == registry.entries
+
+
+def test_load_rebases_paths(tmp_path):
+    old_folder, new_folder = tmp_path / 'old', tmp_path / 'new'
+    old_folder.mkdir()
+    registry = CheckpointRegistry(folder=str(old_folder))
+    save_and_record(registry, [(1, 0.5), (2, 0.6)])
+    shutil.move(str(old_folder), str(new_folder))
+
+    loaded = CheckpointRegistry.load(str(new_folder))
+    assert loaded.path(2) == os.path.join(str(new_folder), 'Epoch_2_Generator.pt')
+    assert os.path.exists(loaded.best()['path'])
+
+
+def test_load_without_registry(tmp_path):
+    assert CheckpointRegistry.load(str(tmp_path)) is None
+
+
+def test_from_folder(tmp_path):
+    for epoch in [10, 2, 5]:
+        torch.save(state_dict(epoch), os.path.join(str(tmp_path), 'Epoch_%d_Generator.pt' % epoch))
+    (tmp_path / 'Epoch_3_Generator.pt.tmp').write_text('')
+
+    registry = CheckpointRegistry.from_folder(str(tmp_path), scores=[0.4, 0.9])
+
+    assert sorted(registry.entries) == [2, 5, 10]
+    assert registry.entries[2]['score'] == pytest.approx(0.4)
+    assert registry.entries[5]['score'] == pytest.approx(0.9)
+    assert registry.entries[10]['score'] is None
+    assert registry.best()['epoch'] == 5
+    assert CheckpointRegistry.load(str(tmp_path)).entries == registry.entries
+
+
+def test_from_empty_folder(tmp_path):
+    registry = CheckpointRegistry.from_folder(str(tmp_path), scores=[0.5])
+    assert registry.entries == {}
+    assert CheckpointRegistry.load(str(tmp_path)) is None
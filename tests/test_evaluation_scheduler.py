@@ -0,0 +1,71 @@
+import pytest
+from CSDGAN.classes.EvaluationScheduler import EvaluationScheduler
+
+
+def run(scheduler, proxies_at):
+    """Step the scheduler through every epoch, returning the epochs it evaluated at"""
+    return [epoch for epoch in range(1, scheduler.num_epochs + 1) if scheduler.step(proxies_at(epoch))]
+
+
+def test_defaults():
+    scheduler = EvaluationScheduler(eval_freq=10, num_epochs=95)
+    assert scheduler.budget == 20
+    assert scheduler.min_freq == 2
+    assert EvaluationScheduler(eval_freq=3, num_epochs=10).min_freq == 1
+    assert EvaluationScheduler(eval_freq=10, num_epochs=10, min_freq=50).min_freq == 10
+
+
+@pytest.mark.parametrize('kwargs', (
+    {'eval_freq': 0, 'num_epochs': 10},
+    {'eval_freq': 5, 'num_epochs': 10, 'budget': 0},
+    {'eval_freq': 5, 'num_epochs': 10, 'settled_ratio': 1},
+))
+def test_invalid_arguments(kwargs):
+    with pytest.raises(AssertionError):
+        EvaluationScheduler(**kwargs)
+
+
+def test_convergence_is_relative_to_peak():
+    scheduler = EvaluationScheduler(eval_freq=10, num_epochs=100, settled_ratio=0.25)
+    assert scheduler.convergence({}) == 0.0
+    assert scheduler.convergence({'a': 4.0, 'b': 0.0}) == pytest.approx(0.5)  # a: at its peak, b: never above 0 counts as settled
+    assert scheduler.convergence({'a': 2.5, 'b': 0.0}) == pytest.approx(0.75)
+    assert scheduler.convergence({'a': 1.0}) == pytest.approx(1.0)
+    assert scheduler.convergence({'a': 0.5}) == pytest.approx(1.0)
+    assert scheduler.convergence({'a': 8.0}) == 0.0
+    assert scheduler.peaks == {'a': 8.0, 'b': 0.0}
+
+
+def test_unsettled_proxies_evaluate_every_eval_freq():
+    scheduler = EvaluationScheduler(eval_freq=10, num_epochs=45)
+    assert run(scheduler, lambda epoch: {'loss_change': 1.0}) == [10, 20, 30, 40, 45]
+
+
+def test_settled_proxies_densify_evaluations():
+    scheduler = EvaluationScheduler(eval_freq=10, num_epochs=100, budget=30, min_freq=2)
+    evals = run(scheduler, lambda epoch: {'loss_change': 1.0 if epoch <= 50 else 0.01})
+
+    assert evals[:5] == [10, 20, 30, 40, 50]
+    gaps = [b - a for a, b in zip(evals[4:], evals[5:])]
+    assert gaps and max(gaps[:-1]) <= 2
+    assert evals[-1] == 100
+    assert len(evals) <= 30
+
+
+@pytest.mark.parametrize(('num_epochs', 'budget'), ((100, 5), (37, 3), (10, 1), (50, 50)))
+def test_budget_is_respected_and_final_epoch_evaluated(num_epochs, budget):
+    scheduler = EvaluationScheduler(eval_freq=4, num_epochs=num_epochs, budget=budget, min_freq=1)
+    evals = run(scheduler, lambda epoch: {'loss_change': 1.0 / epoch})
+
+    assert len(evals) <= budget
+    assert evals[-1] == num_epochs
+    assert scheduler.num_evals == len(evals)
+    assert [epoch for epoch, _, _ in scheduler.history] == evals
+
+
+def test_budget_spread_over_remaining_epochs():
+    """A small budget spreads evaluations evenly rather than spending them all early"""
+    scheduler = EvaluationScheduler(eval_freq=2, num_epochs=100, budget=5, min_freq=1)
+    evals = run(scheduler, lambda epoch: {'loss_change': 0.0 if epoch > 1 else 1.0})
+
+    assert evals == [20, 40, 60, 80, 100]
@@ -0,0 +1,40 @@
+import pickle
+import torch
+from CSDGAN.classes.NetUtils import GaussianNoise
+
+
+def test_set_sigma_updates_buffer_in_place():
+    noise = GaussianNoise(device=torch.device('cpu'), sigma=0.5)
+    sigma = noise.sigma
+
+    noise.set_sigma(0.25)
+
+    assert noise.sigma is sigma
+    assert noise.sigma.dim() == 0 and noise.sigma.item() == 0.25
+    assert 'sigma' in noise.state_dict()
+
+
+def test_noise_scale_and_modes():
+    torch.manual_seed(0)
+    noise = GaussianNoise(device=torch.device('cpu'), sigma=0.5)
+    x = torch.zeros(10000, 4)
+
+    assert abs(noise(x).std().item() - 0.5) < 0.02
+    noise.set_sigma(0.0)
+    assert torch.equal(noise(x), x)
+    noise.set_sigma(0.5)
+    noise.eval()
+    assert torch.equal(noise(x), x)
+
+
+def test_unpickles_float_sigma():
+    """Layers pickled before sigma was a buffer kept it as a float"""
+    noise = GaussianNoise(device=torch.device('cpu'), sigma=0.3)
+    del noise._buffers['sigma']
+    noise.__dict__['sigma'] = 0.3
+
+    noise = pickle.loads(pickle.dumps(noise))
+
+    assert 'sigma' in noise._buffers and torch.isclose(noise.sigma, torch.tensor(0.3))
+    noise.set_sigma(0.1)
+    assert torch.isclose(noise.sigma, torch.tensor(0.1))
@@ -0,0 +1,185 @@
+import numpy as np
+import pytest
+from zipfile import ZipFile
+from PIL import Image
+import io
+import os
+import CSDGAN.utils.img_data_loading as cuidl
+from CSDGAN.classes.image.ImageDataset import PackedImageDataset
+from CSDGAN.classes.image.ImageManifest import ImageManifest
+
+FOLDER = 'data'
+COLORS = {'cat': 40, 'dog': 200}  # Pixel value of every image of each label
+NUM_PER_LABEL = 20
+WIDTH, HEIGHT = 16, 12
+
+
+def png(value, size=(WIDTH, HEIGHT), mode='RGB'):
+    f = io.BytesIO()
+    Image.new(mode, size, color=value if mode == 'L' else (value,) * 3).save(f, format='PNG')
+    return f.getvalue()
+
+
+def write_zip(path, members):
+    """Zip of members, a list of tuples of member name and bytes (None for a directory entry)"""
+    with ZipFile(path, 'w') as zip_ref:
+        for name, content in members:
+            zip_ref.writestr(name, b'' if content is None else content)
+    return str(path)
+
+
+def labelled_members():
+    return [('%s/%s/img_%02d.png' % (FOLDER, label, i), png(value)) for label, value in COLORS.items() for i in range(NUM_PER_LABEL)]
+
+
+@pytest.fixture
+def image_zip(tmp_path):
+    """Upload of NUM_PER_LABEL images of each label, with a directory entry, hidden files and macOS resource forks to skip"""
+    members = [(FOLDER + '/cat/', None)] + labelled_members()
+    members += [(FOLDER + '/.DS_Store', b'\x00'), (FOLDER + '/cat/.hidden.png', b'\x00'), ('__MACOSX/%s/cat/._img_00.png' % FOLDER, b'\x00')]
+    return write_zip(tmp_path / (FOLDER + '.zip'), members)
+
+
+def test_scan_skips_directories_hidden_files_and_resource_forks(image_zip):
+    dataset_map, labels = cuidl.scan_image_zip(zip_path=image_zip, folder=FOLDER)
+
+    assert labels == ['cat', 'dog']
+    assert len(dataset_map) == 2 * NUM_PER_LABEL
+    assert set(dataset_map['id']) == set(name for name, _ in labelled_members())
+    assert (dataset_map.groupby('label').size() == NUM_PER_LABEL).all()
+
+
+@pytest.mark.parametrize(('name', 'message'), (
+    (FOLDER + '/cat/notes.txt', 'is not an image'),
+    (FOLDER + '/img.png', 'Not all files in primary folder are folders'),
+))
+def test_scan_rejects_invalid_members(tmp_path, name, message):
+    zip_path = write_zip(tmp_path / 'upload.zip', labelled_members() + [(name, png(0))])
+
+    with pytest.raises(AssertionError, match=message):
+        cuidl.scan_image_zip(zip_path=zip_path, folder=FOLDER)
+
+
+def test_scan_rejects_zip_without_folder(image_zip):
+    with pytest.raises(AssertionError, match='contains no images'):
+        cuidl.scan_image_zip(zip_path=image_zip, folder='other')
+
+
+def test_split_sizes_are_stratified(image_zip):
+    dataset_map, _ = cuidl.scan_image_zip(zip_path=image_zip, folder=FOLDER)
+
+    dataset_map = cuidl.split_image_map(dataset_map=dataset_map, splits=[0.8, 0.1, 0.1])
+
+    counts = dataset_map.groupby(['split', 'label']).size()
+    for split, count in [('train', 16), ('val', 2), ('test', 2)]:
+        assert (counts[split] == count).all()
+    assert sorted(dataset_map['id']) == sorted(name for name, _ in labelled_members())
+
+
+@pytest.mark.parametrize('num_workers', (1, 2))
+def test_ingest_packs_every_split(image_zip, tmp_path, num_workers):
+    out_folder = str(tmp_path / 'packed')
+
+    le, ohe, crop = cuidl.ingest_image_zip(zip_path=image_zip, folder=FOLDER, out_folder=out_folder, splits=[0.8, 0.1, 0.1],
+                                           num_workers=num_workers, chunk_size=4)
+
+    assert crop == (12, 14)  # Largest crops of the height and width that suit the generator's architecture
+    assert list(le.classes_) == ['cat', 'dog']
+    for split, num_images in [('train', 32), ('val', 4), ('test', 4)]:
+        dataset = PackedImageDataset(folder=out_folder, split=split)
+        assert dataset.header['classes'] == ['cat', 'dog']
+        assert tuple(dataset.images.shape) == (num_images, 3) + crop
+        labels = dataset.labels.numpy()
+        assert (np.diff(labels) >= 0).all()  # ImageFolder order, by label
+        assert (np.bincount(labels) == num_images // 2).all()
+        for i, label in enumerate(dataset.classes):
+            assert (dataset.images[dataset.labels == i] == COLORS[label]).all()
+        x, y = dataset[0]
+        assert x.shape == (3,) + crop and y == labels[0]
+        assert np.isclose(x.max().item(), COLORS[dataset.classes[y]] / 255)
+
+
+def test_ingest_chunk_writes_given_rows(image_zip, tmp_path):
+    out_folder = str(tmp_path / 'packed')
+    shape = (3, HEIGHT, WIDTH)
+    header, images_path = cuidl.init_packed_split(out_folder=out_folder, split='train', shape=shape, classes=['cat', 'dog'], labels=[1, 0])
+
+    num_done = cuidl.ingest_image_chunk(tasks=[(FOLDER + '/cat/img_00.png', 1), (FOLDER + '/dog/img_00.png', 0)], zip_path=image_zip,
+                                        crop=(HEIGHT, WIDTH), path=images_path, shape=(header['num_images'],) + shape)
+    cuidl.write_packed_header(out_folder=out_folder, header=header)
+
+    assert num_done == 2
+    dataset = PackedImageDataset(folder=out_folder, split='train')
+    assert (dataset.images[0] == COLORS['dog']).all() and (dataset.images[1] == COLORS['cat']).all()
+    assert dataset.labels.tolist() == [1, 0]
+
+
+
+def test_manifest_build_reads_headers(image_zip):
+    manifest = ImageManifest.build(zip_path=image_zip, folder=FOLDER)
+
+    assert manifest.folder == FOLDER and manifest.classes == ['cat', 'dog']
+    assert manifest.num_images == 2 * NUM_PER_LABEL and manifest.num_channels == 3
+    assert [name for name, _, _, _, _ in manifest.images] == sorted(name for name, _ in labelled_members())  # ImageFolder order
+    assert manifest.class_counts().tolist() == [NUM_PER_LABEL, NUM_PER_LABEL]
+    assert manifest.sizes() == {(WIDTH, HEIGHT): 2 * NUM_PER_LABEL}
+    assert manifest.modes() == {'RGB': 2 * NUM_PER_LABEL}
+    assert manifest.consistent_size()
+    assert manifest.x_dim() == (HEIGHT, WIDTH)
+    assert manifest.size_statement() is None
+
+    dataset_map, labels = manifest.dataset_map()
+    scanned_map, scanned_labels = cuidl.scan_image_zip(zip_path=image_zip, folder=FOLDER)
+    assert labels == scanned_labels
+    assert dataset_map.sort_values(by='id').values.tolist() == scanned_map.sort_values(by='id').values.tolist()
+
+
+def test_manifest_rejects_corrupt_images(tmp_path):
+    zip_path = write_zip(tmp_path / 'upload.zip', labelled_members() + [(FOLDER + '/cat/corrupt.png', b'not a png')])
+
+    with pytest.raises(AssertionError, match='could not be read as an image'):
+        ImageManifest.build(zip_path=zip_path, folder=FOLDER)
+
+
+def test_manifest_of_mixed_sizes_defaults_to_smallest_dimensions(tmp_path):
+    members = [(FOLDER + '/cat/a.png', png(0, size=(20, 10))), (FOLDER + '/cat/b.png', png(0, size=(14, 18), mode='L')),
+               (FOLDER + '/dog/c.png', png(0, size=(20, 10)))]
+    manifest = ImageManifest.build(zip_path=write_zip(tmp_path / 'upload.zip', members), folder=FOLDER)
+
+    assert not manifest.consistent_size()
+    assert manifest.x_dim() == (10, 14)  # Smallest height and smallest width, of different images
+    assert manifest.modes() == {'RGB': 2, 'L': 1}
+    assert manifest.num_channels == 3  # Images are converted to RGB when loaded
+    statement = manifest.size_statement()
+    assert '20 by 10 (2 images), 14 by 18 (1 images)' in statement
+    assert 'other sizes' not in statement
+    assert manifest.size_statement(max_sizes=1).count(' by ') == 1
+    assert ' and 1 other sizes' in manifest.size_statement(max_sizes=1)
+
+
+def test_manifest_save_load_round_trip(image_zip, tmp_path):
+    manifest = ImageManifest.build(zip_path=image_zip, folder=FOLDER)
+    run_dir = str(tmp_path / 'run')
+    os.makedirs(run_dir)
+
+    assert ImageManifest.load(run_dir) is None
+    manifest.save(run_dir)
+    loaded = ImageManifest.load(run_dir)
+
+    assert os.listdir(run_dir) == [ImageManifest.filename]
+    assert loaded.folder == manifest.folder and loaded.classes == manifest.classes
+    assert loaded.images == manifest.images
+    assert loaded.x_dim() == manifest.x_dim() and loaded.class_counts().equals(manifest.class_counts())
+
+
+def test_ingest_from_manifest_matches_ingest_from_zip(image_zip, tmp_path):
+    manifest = ImageManifest.build(zip_path=image_zip, folder=FOLDER)
+
+    _, _, crop = cuidl.ingest_image_zip(zip_path=image_zip, folder=FOLDER, out_folder=str(tmp_path / 'zip'), num_workers=1)
+    _, _, manifest_crop = cuidl.ingest_image_zip(zip_path=image_zip, folder=FOLDER, out_folder=str(tmp_path / 'manifest'), num_workers=1,
+                                                 manifest=manifest)
+
+    assert manifest_crop == crop
+    for split in ['train', 'val', 'test']:
+        header = PackedImageDataset(folder=str(tmp_path / 'zip'), split=split).header
+        assert PackedImageDataset(folder=str(tmp_path / 'manifest'), split=split).header == header
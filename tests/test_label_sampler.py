@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import torch
+from CSDGAN.classes.LabelSampler import LabelSampler
+
+
+@pytest.mark.parametrize(('nc', 'num', 'stratify', 'expected'), (
+    (3, 9, None, [3, 3, 3]),
+    (3, 10, None, [4, 3, 3]),
+    (3, 11, None, [4, 4, 3]),
+    (3, 10, [0.5, 0.3, 0.2], [5, 3, 2]),
+    (3, 10, [0.26, 0.37, 0.37], [2, 4, 4]),
+    (2, 7, [3, 1], [5, 2]),
+    (3, 5, [0, 1, 1], [0, 3, 2]),
+    (4, 0, None, [0, 0, 0, 0]),
+))
+def test_counts(nc, num, stratify, expected):
+    counts = LabelSampler(nc=nc).counts(num=num, stratify=stratify)
+    assert counts.tolist() == expected
+    assert counts.sum() == num
+
+
+def test_counts_are_exact_for_many_splits():
+    rng = np.random.RandomState(0)
+    sampler = LabelSampler(nc=7)
+    for _ in range(100):
+        stratify = rng.random_sample(7)
+        num = int(rng.randint(0, 1000))
+        counts = sampler.counts(num=num, stratify=stratify)
+        assert counts.sum() == num
+        assert np.all(np.abs(counts - stratify / stratify.sum() * num) < 1)
+
+
+@pytest.mark.parametrize('stratify', ([0.5, 0.5], [0, 0, 0], [-0.1, 0.6, 0.5]))
+def test_counts_rejects_invalid_stratify(stratify):
+    with pytest.raises(AssertionError):
+        LabelSampler(nc=3).counts(num=10, stratify=stratify)
+
+
+def test_sample_grouped_by_class():
+    one_hot, idx = LabelSampler(nc=3).sample(num=7, stratify=[0.2, 0.5, 0.3])
+
+    assert idx.dtype == torch.int64
+    assert one_hot.dtype == torch.float32
+    assert idx.tolist() == [0, 1, 1, 1, 1, 2, 2]
+    assert torch.equal(one_hot, torch.eye(3)[idx])
+
+
+def test_sample_shuffled():
+    torch.manual_seed(0)
+    one_hot, idx = LabelSampler(nc=4, shuffle=True).sample(num=100)
+
+    assert torch.bincount(idx, minlength=4).tolist() == [25, 25, 25, 25]
+    assert idx.tolist() != sorted(idx.tolist())
+    assert torch.equal(one_hot, torch.eye(4)[idx])
+
+
+def test_sample_with_columns():
+    one_hot, idx = LabelSampler(nc=3, columns=[2, 0, 1]).sample(num=3)
+
+    assert idx.tolist() == [0, 1, 2]
+    assert one_hot.argmax(dim=1).tolist() == [2, 0, 1]
+
+
+def test_invalid_columns():
+    with pytest.raises(AssertionError):
+        LabelSampler(nc=3, columns=[0, 1, 1])
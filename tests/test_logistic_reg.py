@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+import torch
+from scipy.optimize import minimize
+import utils.logistic_reg as lr
+
+
+def make_data(num_rows=200, num_features=5, num_classes=3, seed=0):
+    rng = np.random.RandomState(seed)
+    y = rng.randint(0, num_classes, size=num_rows)
+    centers = rng.normal(size=(num_classes, num_features))
+    x = centers[y] + rng.normal(size=(num_rows, num_features)) + 2
+    return x.astype(np.float32), y
+
+
+def smooth_gradient(x, y, W, b, C, l1_ratio):
+    """Gradient of the mean multinomial loss plus the L2 part of the penalty, in float64"""
+    x, W, b = x.astype(np.float64), W.astype(np.float64), b.astype(np.float64)
+    logits = x.dot(W) + b
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    probs[np.arange(len(y)), y] -= 1
+    alpha = 1 / (C * len(y))
+    return x.T.dot(probs) / len(y) + alpha * (1 - l1_ratio) * W, probs.mean(axis=0), alpha * l1_ratio
+
+
+def fit(x, y, C, l1_ratio, tol=1e-8, masks=None, init=None, max_iter=5000):
+    masks = np.ones((1, len(y)), dtype=np.float32) if masks is None else masks
+    num_models = masks.shape[0]
+    W, b = lr.fit_logistic_reg(x=torch.tensor(x), y=torch.tensor(y), masks=torch.tensor(masks), num_classes=int(y.max()) + 1,
+                               C=np.full(num_models, C), l1_ratio=np.full(num_models, l1_ratio), tol=np.full(num_models, tol),
+                               init=init, max_iter=max_iter)
+    return W.numpy(), b.numpy()
+
+
+def test_l2_matches_lbfgs():
+    x, y = make_data()
+    C = 0.5
+    num_features, num_classes = x.shape[1], 3
+
+    def objective(params):
+        W, b = params[:-num_classes].reshape(num_features, num_classes), params[-num_classes:]
+        logits = x.astype(np.float64).dot(W) + b
+        log_probs = logits - np.logaddexp.reduce(logits, axis=1, keepdims=True)
+        return -log_probs[np.arange(len(y)), y].mean() + 0.5 / (C * len(y)) * (W ** 2).sum()
+
+    expected = minimize(objective, np.zeros(num_features * num_classes + num_classes), method='L-BFGS-B', options={'gtol': 1e-10}).x
+    W, b = fit(x, y, C=C, l1_ratio=0.0)
+
+    assert objective(np.concatenate((W[0].ravel(), b[0]))) == pytest.approx(objective(expected), abs=1e-5)
+    # Multinomial weights are only identified up to a constant per feature, which the L2 penalty pins to 0, but not the intercepts
+    assert np.allclose(W[0], expected[:-num_classes].reshape(num_features, num_classes), atol=1e-2)
+    assert np.allclose(b[0] - b[0].mean(), expected[-num_classes:] - expected[-num_classes:].mean(), atol=1e-2)
+
+
+def test_elastic_net_optimality():
+    """Zero weights have a smooth gradient within the L1 penalty, other weights a smooth gradient balancing it"""
+    x, y = make_data()
+    C, l1_ratio = 0.05, 0.7
+    W, b = fit(x, y, C=C, l1_ratio=l1_ratio)
+
+    grad_W, grad_b, l1_penalty = smooth_gradient(x, y, W[0], b[0], C, l1_ratio)
+    zero = W[0] == 0
+
+    assert zero.any() and not zero.all()
+    assert np.all(np.abs(grad_W[zero]) <= l1_penalty + 1e-4)
+    assert np.allclose(grad_W[~zero], -l1_penalty * np.sign(W[0][~zero]), atol=1e-4)
+    assert np.allclose(grad_b, 0, atol=1e-4)
+
+
+def test_masked_models_match_separate_fits():
+    x, y = make_data()
+    rng = np.random.RandomState(1)
+    masks = (rng.random_sample((3, len(y))) < 0.7).astype(np.float32)
+    W, b = fit(x, y, C=1.0, l1_ratio=0.5, masks=masks)
+
+    for m in range(masks.shape[0]):
+        keep = masks[m] == 1
+        W_alone, b_alone = fit(x[keep], y[keep], C=1.0, l1_ratio=0.5)
+        assert np.allclose(W[m], W_alone[0], atol=1e-3)
+        assert np.allclose(b[m] - b[m].mean(), b_alone[0] - b_alone[0].mean(), atol=1e-3)
+
+
+def test_warm_start_from_solution_stops_early():
+    x, y = make_data()
+    W, b = fit(x, y, C=1.0, l1_ratio=0.5, tol=1e-4)
+    W_warm, b_warm = fit(x, y, C=1.0, l1_ratio=0.5, tol=1e-4, init=(torch.tensor(W), torch.tensor(b)), max_iter=10)
+
+    assert np.allclose(W_warm, W, atol=1e-3)
+    assert np.allclose(b_warm - b_warm.mean(axis=1, keepdims=True), b - b.mean(axis=1, keepdims=True), atol=1e-3)
+
+
+def test_grid_search():
+    x, y = make_data(num_rows=300)
+    labels = np.array(['a', 'b', 'c'])[y]
+    param_grid = {'C': [1e-4, 1.0], 'l1_ratio': [0.0, 1.0]}
+    warm_start = {}
+
+    predictions, best_params, cv_score = lr.grid_search_logistic_reg(x_train=x[:240], y_train=labels[:240], x_test=x[240:], param_grid=param_grid,
+                                                                     cv=3, warm_start=warm_start)
+
+    assert best_params['C'] == 1.0
+    assert set(predictions) <= {'a', 'b', 'c'}
+    assert (predictions == labels[240:]).mean() > 0.6
+    assert 0 < cv_score <= 1
+    assert warm_start['W'].shape == (4 * 4, x.shape[1], 3)
+
+    warm_predictions, warm_params, _ = lr.grid_search_logistic_reg(x_train=x[:240], y_train=labels[:240], x_test=x[240:], param_grid=param_grid,
+                                                                   cv=3, warm_start=warm_start)
+    assert warm_params == best_params
+    assert (warm_predictions == predictions).mean() > 0.95
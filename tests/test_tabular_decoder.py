@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from CSDGAN.classes.tabular.TabularDataset import TabularDataset
+from CSDGAN.classes.tabular.TabularDecoder import TabularDecoder
+from CSDGAN.classes.tabular.TabularReencoder import TabularReencoder
+
+
+def make_df(num_rows=120, seed=0):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({'height': rng.normal(170, 10, size=num_rows),
+                         'color': rng.choice(['red', 'green', 'blue'], size=num_rows),
+                         'label': rng.randint(0, 3, size=num_rows),
+                         'count': rng.randint(0, 50, size=num_rows),
+                         'size': pd.Categorical(rng.choice(['S', 'M', 'L', 'XL'], size=num_rows)),
+                         'flag': rng.randint(0, 2, size=num_rows)})
+
+
+def decode_dataset(dataset):
+    """Decode the whole encoded data set, as TabularCGAN.gen_og_data does"""
+    data = np.concatenate((dataset.x_train.numpy(), dataset.x_test.numpy()), axis=0)
+    labels = np.concatenate((dataset.y_train.numpy(), dataset.y_test.numpy()), axis=0).argmax(axis=1)
+    data = TabularReencoder(dataset.le_dict).reencode(data)
+    return TabularDecoder(dataset=dataset).decode(data=data, labels=labels)
+
+
+def sort_rows(df):
+    return df.sort_values(by=['height']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize(('cont_inputs', 'int_inputs'), (
+    (['height', 'count'], ['count']),
+    ([], []),
+))
+def test_decode_round_trip(cont_inputs, int_inputs):
+    df = make_df()
+    if not cont_inputs:
+        df['height'] = np.arange(len(df)).astype(str)
+    dataset = TabularDataset(df=df, dep_var='label', cont_inputs=cont_inputs, int_inputs=int_inputs, test_size=20, seed=0)
+
+    decoded = decode_dataset(dataset)
+
+    assert set(decoded.columns) == set(df.columns)
+    decoded = sort_rows(decoded[df.columns])
+    expected = sort_rows(df)
+    assert (decoded.dtypes == expected.dtypes).all()
+    for col in df.columns:
+        if col == 'height' and cont_inputs:
+            assert np.allclose(decoded[col], expected[col])
+        else:
+            assert (decoded[col] == expected[col]).all()
+
+
+def test_decode_rounds_int_inputs():
+    df = make_df()
+    dataset = TabularDataset(df=df, dep_var='label', cont_inputs=['height', 'count'], int_inputs=['count'], test_size=20, seed=0)
+    decoder = TabularDecoder(dataset=dataset)
+
+    data = dataset.x_train[:5].numpy().copy()
+    data[:, -1] += 0.3 / decoder.scale[-1]  # Shift count by 0.3 of a unit, which rounds away
+    decoded = decoder.decode(data=TabularReencoder(dataset.le_dict).reencode(data), labels=dataset.y_train[:5].numpy().argmax(axis=1))
+    undisturbed = decoder.decode(data=TabularReencoder(dataset.le_dict).reencode(dataset.x_train[:5].numpy().copy()),
+                                 labels=dataset.y_train[:5].numpy().argmax(axis=1))
+
+    assert decoded['count'].dtype == df['count'].dtype
+    assert (decoded['count'] == undisturbed['count']).all()
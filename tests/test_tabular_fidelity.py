@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from scipy.stats import ks_2samp
+from CSDGAN.classes.tabular.TabularFidelity import TabularFidelity
+
+
+def expected_tv(x_real, x_fake, cat_sizes):
+    starts = np.cumsum(cat_sizes) - cat_sizes
+    return np.array([0.5 * np.abs(x_real[:, s:s + size].mean(axis=0) - x_fake[:, s:s + size].mean(axis=0)).sum()
+                     for s, size in zip(starts, cat_sizes)])
+
+
+@pytest.mark.parametrize('ties', (False, True))
+def test_ks_matches_scipy(ties, make_le_dict, make_encoded_data):
+    rng = np.random.RandomState(0)
+    nc, cat_sizes, num_cont = 3, [2, 3], 4
+    x_real, y_real = make_encoded_data(rng, 300, nc, cat_sizes, num_cont, ties=ties)
+    x_fake, y_fake = make_encoded_data(rng, 250, nc, cat_sizes, num_cont, ties=ties)
+
+    result = TabularFidelity(x_real, y_real, make_le_dict(cat_sizes), nc).score(x_fake, y_fake)
+
+    num_cat = sum(cat_sizes)
+    for col in range(num_cont):
+        expected = ks_2samp(x_real[:, num_cat + col], x_fake[:, num_cat + col]).statistic
+        assert result['ks'][col] == pytest.approx(expected)
+        for c in range(nc):
+            expected = ks_2samp(x_real[y_real == c, num_cat + col], x_fake[y_fake == c, num_cat + col]).statistic
+            assert result['class_ks'][c, col] == pytest.approx(expected)
+
+    assert np.allclose(result['tv'], expected_tv(x_real, x_fake, cat_sizes))
+    for c in range(nc):
+        assert np.allclose(result['class_tv'][c], expected_tv(x_real[y_real == c], x_fake[y_fake == c], cat_sizes))
+    assert 0 <= result['fidelity'] <= 1
+
+
+def test_identical_data_scores_zero(make_le_dict, make_encoded_data):
+    rng = np.random.RandomState(1)
+    nc, cat_sizes = 2, [3]
+    x, y = make_encoded_data(rng, 200, nc, cat_sizes, 3)
+
+    result = TabularFidelity(x, y, make_le_dict(cat_sizes), nc).score(x[::-1], y[::-1])
+
+    assert np.allclose(result['ks'], 0)
+    assert np.allclose(result['class_ks'], 0)
+    assert np.allclose(result['tv'], 0)
+    assert result['corr'] == pytest.approx(0)
+    assert result['fidelity'] == pytest.approx(0)
+
+
+def test_class_missing_from_fake_data(make_le_dict, make_encoded_data):
+    rng = np.random.RandomState(2)
+    nc, cat_sizes, num_cont = 3, [2], 2
+    x_real, y_real = make_encoded_data(rng, 300, nc, cat_sizes, num_cont)
+    x_fake, y_fake = make_encoded_data(rng, 300, nc, cat_sizes, num_cont)
+    keep = y_fake != 1
+    x_fake, y_fake = x_fake[keep], y_fake[keep]
+
+    result = TabularFidelity(x_real, y_real, make_le_dict(cat_sizes), nc).score(x_fake, y_fake)
+
+    for name in ['class_ks', 'class_tv']:
+        assert np.isnan(result[name][1]).all()
+        assert not np.isnan(result[name][[0, 2]]).any()
+    assert np.isnan(result['class_corr'][1])
+    for c in [0, 2]:
+        expected = ks_2samp(x_real[y_real == c, 2], x_fake[y_fake == c, 2]).statistic
+        assert result['class_ks'][c, 0] == pytest.approx(expected)
+    assert np.isfinite(result['fidelity'])
+
+
+def test_no_continuous_columns(make_le_dict, make_encoded_data):
+    rng = np.random.RandomState(3)
+    nc, cat_sizes = 2, [2, 4]
+    x_real, y_real = make_encoded_data(rng, 200, nc, cat_sizes, 0)
+    x_fake, y_fake = make_encoded_data(rng, 150, nc, cat_sizes, 0)
+
+    result = TabularFidelity(x_real, y_real, make_le_dict(cat_sizes), nc).score(x_fake, y_fake)
+
+    assert result['ks'].shape == (0,)
+    assert result['class_ks'].shape == (nc, 0)
+    assert np.allclose(result['tv'], expected_tv(x_real, x_fake, cat_sizes))
+    assert np.isfinite(result['fidelity'])
+
+
+def test_no_categorical_columns(make_le_dict, make_encoded_data):
+    rng = np.random.RandomState(4)
+    nc, num_cont = 2, 3
+    x_real, y_real = make_encoded_data(rng, 200, nc, [], num_cont)
+    x_fake, y_fake = make_encoded_data(rng, 150, nc, [], num_cont)
+
+    result = TabularFidelity(x_real, y_real, {}, nc).score(x_fake, y_fake)
+
+    assert result['tv'].shape == (0,)
+    assert result['class_tv'].shape == (nc, 0)
+    for col in range(num_cont):
+        assert result['ks'][col] == pytest.approx(ks_2samp(x_real[:, col], x_fake[:, col]).statistic)
+    assert np.isfinite(result['fidelity'])
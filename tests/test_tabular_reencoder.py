@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+import torch
+from CSDGAN.classes.tabular.TabularReencoder import TabularReencoder
+
+
+def expected_reencoding(data, cat_sizes):
+    """One hot encoding of the first maximum of each feature, as given by np.argmax"""
+    expected = data.copy()
+    start = 0
+    for size in cat_sizes:
+        block = np.zeros((len(data), size), dtype=data.dtype)
+        block[np.arange(len(data)), np.argmax(data[:, start:start + size], axis=1)] = 1
+        expected[:, start:start + size] = block
+        start += size
+    return expected
+
+
+@pytest.mark.parametrize('ties', (False, True))
+def test_reencode_numpy(ties, make_le_dict, make_generated_data):
+    rng = np.random.RandomState(0)
+    cat_sizes, num_cont = [3, 2, 4, 3], 2
+    data = make_generated_data(rng, TabularReencoder.chunk_size * 2 + 17, cat_sizes, num_cont, ties=ties)
+    expected = expected_reencoding(data, cat_sizes)
+
+    out = TabularReencoder(make_le_dict(cat_sizes)).reencode(data)
+
+    assert out is data
+    assert np.array_equal(data, expected)
+
+
+def test_reencode_cpu_tensor_in_place(make_le_dict, make_generated_data):
+    rng = np.random.RandomState(1)
+    cat_sizes, num_cont = [2, 5], 3
+    data = make_generated_data(rng, 100, cat_sizes, num_cont, ties=True)
+    expected = expected_reencoding(data, cat_sizes)
+    tensor = torch.from_numpy(data.copy())
+
+    out = TabularReencoder(make_le_dict(cat_sizes)).reencode(tensor)
+
+    assert out is tensor
+    assert np.array_equal(tensor.numpy(), expected)
+
+
+@pytest.mark.parametrize('ties', (False, True))
+def test_reencode_torch_path(ties, make_le_dict, make_generated_data):
+    """The path used for tensors on other devices gives the same result"""
+    rng = np.random.RandomState(2)
+    cat_sizes, num_cont = [3, 2, 4, 3], 2
+    data = make_generated_data(rng, 50, cat_sizes, num_cont, ties=ties)
+    expected = expected_reencoding(data, cat_sizes)
+    tensor = torch.from_numpy(data.copy())
+
+    TabularReencoder(make_le_dict(cat_sizes)).reencode_torch(tensor)
+
+    assert np.array_equal(tensor.numpy(), expected)
+
+
+def test_reencode_nan_matches_argmax(make_le_dict):
+    data = np.array([[np.nan, 0.2, 0.7, 0.1, 0.5],
+                     [0.3, 0.3, 0.3, 0.9, 0.5]], dtype=np.float32)
+    expected = expected_reencoding(data, [3, 2])
+
+    TabularReencoder(make_le_dict([3, 2])).reencode(data)
+
+    assert np.array_equal(data[:, :5], expected[:, :5])
+
+
+def test_no_categorical_features():
+    data = np.random.RandomState(3).random_sample((10, 4))
+    original = data.copy()
+
+    TabularReencoder({}).reencode(data)
+
+    assert np.array_equal(data, original)
@@ -0,0 +1,60 @@
+import pytest
+import torch
+from CSDGAN.classes.TensorBatchIterator import TensorBatchIterator
+
+NUM_ROWS = 10
+
+
+def make_iterator(**kwargs):
+    x = torch.arange(NUM_ROWS, dtype=torch.float32).view(-1, 1).repeat(1, 3)
+    y = torch.arange(NUM_ROWS)
+    return TensorBatchIterator(x=x, y=y, **kwargs)
+
+
+def epoch_rows(gen):
+    """Row ids of each batch of an epoch, checking that features and labels stay aligned"""
+    batches = []
+    for x, y in gen:
+        assert torch.equal(x[:, 0].long(), y)
+        batches.append(y.tolist())
+    return batches
+
+
+@pytest.mark.parametrize(('batch_size', 'drop_last', 'sizes'), (
+    (4, False, [4, 4, 2]),
+    (4, True, [4, 4]),
+    (5, False, [5, 5]),
+    (5, True, [5, 5]),
+    (16, False, [10]),
+    (16, True, []),
+))
+def test_len_with_partial_last_batch(batch_size, drop_last, sizes):
+    gen = make_iterator(batch_size=batch_size, shuffle=False, drop_last=drop_last)
+
+    assert len(gen) == len(sizes)
+    assert [len(batch) for batch in epoch_rows(gen)] == sizes
+
+
+def test_shuffle_draws_full_permutation_each_epoch():
+    torch.manual_seed(0)
+    gen = make_iterator(batch_size=4, shuffle=True)
+
+    orders = [sum(epoch_rows(gen), []) for _ in range(5)]
+
+    for order in orders:
+        assert sorted(order) == list(range(NUM_ROWS))
+    assert len(set(tuple(order) for order in orders)) > 1
+
+
+def test_no_shuffle_keeps_order():
+    gen = make_iterator(batch_size=4, shuffle=False)
+
+    assert epoch_rows(gen) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert epoch_rows(gen) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_fixed_shape_pads_last_batch_from_start_of_epoch():
+    gen = make_iterator(batch_size=4, shuffle=False, fixed_shape=True)
+
+    assert len(gen) == 3
+    assert epoch_rows(gen) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9, 0, 1]]
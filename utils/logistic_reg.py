@@ -0,0 +1,158 @@
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+import numpy as np
+import torch
+
+
+def grid_search_logistic_reg(x_train, y_train, x_test, param_grid, cv=5, warm_start=None, device='cpu', max_iter=1000):
+    """
+    Torch counterpart to fitting GridSearchCV over an elastic-net multinomial LogisticRegression: every combination of grid point and CV fold,
+    plus a refit on the full training data for every grid point, is fit at once as a single stacked batch by fit_logistic_reg.
+    Folds (StratifiedKFold) and model selection (mean accuracy over all held out examples) follow GridSearchCV with iid=True.
+    :param x_train: Training data, NumPy array
+    :param y_train: Training labels, single column NumPy array
+    :param x_test: Testing data, NumPy array
+    :param param_grid: Parameter grid with lists of values for any of C, l1_ratio and tol
+    :param cv: Number of folds
+    :param warm_start: Dictionary to warm start from. Filled in place with the fitted weights, to warm start the next call with the same shapes.
+    :param device: Device to fit on
+    :param max_iter: Maximum number of iterations
+    :return: Tuple of predicted labels for x_test, best parameters, and mean cross-validated accuracy of the best parameters
+    """
+    classes, y_idx = np.unique(y_train, return_inverse=True)
+    grid = list(ParameterGrid(param_grid))
+    folds = list(StratifiedKFold(n_splits=cv).split(x_train, y_idx))
+    models_per_point = len(folds) + 1  # Models are laid out grid point by grid point, each with one model per fold followed by the refit
+
+    masks = np.zeros((len(grid) * models_per_point, len(y_idx)), dtype=np.float32)
+    for g in range(len(grid)):
+        for f, (train_idx, _) in enumerate(folds):
+            masks[g * models_per_point + f, train_idx] = 1
+        masks[g * models_per_point + len(folds), :] = 1
+
+    C = np.repeat([params.get('C', 1.0) for params in grid], models_per_point)
+    l1_ratio = np.repeat([params.get('l1_ratio', 0.0) for params in grid], models_per_point)
+    tol = np.repeat([params.get('tol', 1e-4) for params in grid], models_per_point)
+
+    x = torch.as_tensor(np.asarray(x_train, dtype=np.float32), device=device)
+    y = torch.as_tensor(y_idx, dtype=torch.int64, device=device)
+
+    init = None
+    if warm_start is not None and warm_start.get('W') is not None and warm_start['W'].shape == (masks.shape[0], x.shape[1], len(classes)):
+        init = warm_start['W'].to(device), warm_start['b'].to(device)
+
+    W, b = fit_logistic_reg(x=x, y=y, masks=torch.as_tensor(masks, device=device), num_classes=len(classes), C=C, l1_ratio=l1_ratio, tol=tol,
+                            init=init, max_iter=max_iter)
+
+    if warm_start is not None:
+        warm_start['W'], warm_start['b'] = W, b
+
+    # Cross-validated accuracy of each grid point, pooled over every held out example
+    with torch.no_grad():
+        correct = (torch.matmul(x, W) + b.unsqueeze(1)).argmax(dim=2) == y
+    correct = correct.cpu().numpy()
+    cv_scores = np.array([sum(correct[g * models_per_point + f, test_idx].sum() for f, (_, test_idx) in enumerate(folds)) for g in range(len(grid))])
+    cv_scores = cv_scores / len(y_idx)
+    best = int(np.argmax(cv_scores))
+
+    refit = best * models_per_point + len(folds)
+    with torch.no_grad():
+        x_test = torch.as_tensor(np.asarray(x_test, dtype=np.float32), device=device)
+        predictions = (torch.matmul(x_test, W[refit]) + b[refit]).argmax(dim=1).cpu().numpy()
+
+    return classes[predictions], grid[best], cv_scores[best]
+
+
+def fit_logistic_reg(x, y, masks, num_classes, C, l1_ratio, tol, init=None, max_iter=1000):
+    """
+    Fits a batch of elastic-net multinomial logistic regressions on (weighted subsets of) the same data with FISTA (accelerated proximal gradient).
+    Each model minimizes the same objective as sklearn's LogisticRegression(penalty='elasticnet', multi_class='multinomial'), scaled by the number of
+    training examples, with an unpenalized intercept. Step sizes come from a bound on the Lipschitz constant of the gradient, so no line search is needed.
+    Models stop updating once the largest change in their weights is below tol times their largest weight, the stopping criterion of saga.
+    :param x: Tensor of data (examples x features)
+    :param y: Tensor of class indices
+    :param masks: Tensor of 0/1 weights of each example for each model (models x examples)
+    :param num_classes: Number of classes
+    :param C: Inverse of regularization strength of each model
+    :param l1_ratio: Elastic-net mixing parameter of each model (0 = L2 penalty, 1 = L1 penalty)
+    :param tol: Tolerance of each model
+    :param init: Optional tuple of initial weights (models x features x classes) and intercepts (models x classes)
+    :param max_iter: Maximum number of iterations
+    :return: Tuple of weights (models x features x classes) and intercepts (models x classes)
+    """
+    num_models = masks.shape[0]
+    device, dtype = x.device, x.dtype
+    C, l1_ratio, tol = [torch.as_tensor(np.asarray(v, dtype=np.float64), dtype=dtype, device=device) for v in (C, l1_ratio, tol)]
+
+    x_mean = x.mean(dim=0)
+    x = x - x_mean
+
+    y_one_hot = torch.zeros(x.shape[0], num_classes, dtype=dtype, device=device)
+    y_one_hot.scatter_(1, y.view(-1, 1), 1.0)
+
+    num_train = masks.sum(dim=1)
+    weights = (masks / num_train.unsqueeze(1)).unsqueeze(2)  # Per model weight of each example in the mean loss
+    alpha = 1 / (C * num_train)
+    l1_penalty = (alpha * l1_ratio).view(-1, 1, 1)
+    l2_penalty = (alpha * (1 - l1_ratio)).view(-1, 1, 1)
+
+    # The Hessian of the mean multinomial loss is bounded by half the largest eigenvalue of X^T X / n (with a column of ones for the intercept)
+    step = 1 / (0.5 * 1.05 * largest_eigenvalue(x) / num_train.view(-1, 1, 1) + l2_penalty)
+
+    if init is None:
+        W = torch.zeros(num_models, x.shape[1], num_classes, dtype=dtype, device=device)
+        b = torch.zeros(num_models, num_classes, dtype=dtype, device=device)
+    else:
+        W, b = init[0].clone(), init[1] + torch.matmul(x_mean, init[0])
+
+    W_momentum, b_momentum = W, b
+    t = torch.ones(num_models, 1, 1, dtype=dtype, device=device)
+    active = torch.ones(num_models, 1, 1, dtype=torch.bool, device=device)
+
+    with torch.no_grad():
+        for i in range(max_iter):
+            # Proximal gradient step from the momentum point
+            grad_logits = (torch.softmax(torch.matmul(x, W_momentum) + b_momentum.unsqueeze(1), dim=2) - y_one_hot) * weights
+            grad_W = torch.matmul(x.t(), grad_logits) + l2_penalty * W_momentum
+            grad_b = grad_logits.sum(dim=1)
+
+            W_new = W_momentum - step * grad_W
+            W_new = torch.sign(W_new) * torch.clamp(W_new.abs() - step * l1_penalty, min=0)
+            b_new = b_momentum - step.view(-1, 1) * grad_b
+
+            # Converged models keep their weights
+            W_new = torch.where(active, W_new, W)
+            b_new = torch.where(active.view(-1, 1), b_new, b)
+
+            # Momentum, restarted for models whose last step went uphill
+            restart = ((W_momentum - W_new) * (W_new - W)).sum(dim=(1, 2), keepdim=True) + \
+                      ((b_momentum - b_new) * (b_new - b)).sum(dim=1).view(-1, 1, 1) > 0
+            t = torch.where(restart, torch.ones_like(t), t)
+            t_new = (1 + torch.sqrt(1 + 4 * t ** 2)) / 2
+            beta = (t - 1) / t_new
+            W_momentum = W_new + beta * (W_new - W)
+            b_momentum = b_new + beta.view(-1, 1) * (b_new - b)
+
+            if i % 10 == 9:
+                max_change = torch.max((W_new - W).abs().flatten(1).max(dim=1)[0], (b_new - b).abs().max(dim=1)[0])
+                max_weight = torch.max(W_new.abs().flatten(1).max(dim=1)[0], b_new.abs().max(dim=1)[0])
+                active = active & (max_change > tol * max_weight).view(-1, 1, 1)
+                if not active.any():
+                    W, b = W_new, b_new
+                    break
+
+            W, b, t = W_new, b_new, t_new
+
+    return W, b - torch.matmul(x_mean, W)
+
+
+def largest_eigenvalue(x, num_iter=50):
+    """Estimates the largest eigenvalue of X^T X, with a column of ones appended to X, through power iteration"""
+    v = torch.ones(x.shape[1] + 1, dtype=x.dtype, device=x.device)
+    eigenvalue = torch.zeros((), dtype=x.dtype, device=x.device)
+    with torch.no_grad():
+        for _ in range(num_iter):
+            xv = torch.matmul(x, v[:-1]) + v[-1]
+            v_new = torch.cat([torch.matmul(x.t(), xv), xv.sum().view(1)])
+            eigenvalue = v_new.norm()
+            v = v_new / eigenvalue
+    return eigenvalue.item()
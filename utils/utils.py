@@ -4,12 +4,15 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report
 from sklearn.metrics import confusion_matrix
 from sklearn.preprocessing import StandardScaler
+import utils.logistic_reg as lr
 import wget
 import numpy as np
 import pandas as pd
 import torch
 import matplotlib.pyplot as plt
 import seaborn as sns
+import contextlib
+import logging
 import os
 
 
@@ -35,7 +38,8 @@ def safe_dl(url, path):
         wget.download(url, path)
 
 
-def train_test_logistic_reg(x_train, y_train, x_test, y_test, param_grid, cv=5, random_state=None, labels_list=None, verbose=True):
+def train_test_logistic_reg(x_train, y_train, x_test, y_test, param_grid, cv=5, random_state=None, labels_list=None, verbose=True, n_jobs=-1,
+                            backend='sklearn', warm_start=None, device='cpu'):
     """
     Helper function to repeatedly test and print outputs for a logistic regression
     :param x_train: training data, NumPy array
@@ -47,8 +51,14 @@ def train_test_logistic_reg(x_train, y_train, x_test, y_test, param_grid, cv=5,
     :param random_state: Seed for reproducibility
     :param labels_list: List of names of labels
     :param verbose: Verbosity for whether to print all information (True = print, False = don't print)
+    :param n_jobs: Number of jobs for GridSearchCV to run in parallel (-1 = all CPUs)
+    :param backend: Either 'sklearn' (saga through GridSearchCV) or 'torch' (every fold and grid point fit at once, see utils.logistic_reg)
+    :param warm_start: Torch backend only. Dictionary of weights to warm start from, updated in place with the fitted weights.
+    :param device: Torch backend only. Device to fit on.
     :return: Best fitted score
     """
+    assert backend in {'sklearn', 'torch'}, "Backend must be one of 'sklearn' or 'torch'"
+
     if len(y_train.shape) > 1:  # Convert to single column
         y_train = np.argmax(y_train, 1)
         y_train = np.array([labels_list[x] for x in y_train])
@@ -61,15 +71,22 @@ def train_test_logistic_reg(x_train, y_train, x_test, y_test, param_grid, cv=5,
     if len(np.unique(y_train)) * cv > x_train.shape[0]:
         cv = x_train.shape[0] // len(np.unique(y_train))
 
-    lr = LogisticRegression(penalty='elasticnet', multi_class='multinomial', solver='saga', random_state=random_state, max_iter=10000)
-    lr_cv = GridSearchCV(lr, param_grid=param_grid, n_jobs=-1, cv=cv, iid=True)
-    lr_cv.fit(x_train, y_train)
+    if backend == 'torch':
+        predictions, best_params, _ = lr.grid_search_logistic_reg(x_train=x_train, y_train=y_train, x_test=x_test, param_grid=param_grid, cv=cv,
+                                                                  warm_start=warm_start, device=device)
+        best_score = float(np.mean(predictions == y_test))
+    else:
+        lr_model = LogisticRegression(penalty='elasticnet', multi_class='multinomial', solver='saga', random_state=random_state, max_iter=10000)
+        lr_cv = GridSearchCV(lr_model, param_grid=param_grid, n_jobs=n_jobs, cv=cv, iid=True)
+        lr_cv.fit(x_train, y_train)
+
+        best_score = lr_cv.score(x_test, y_test)
+        predictions = lr_cv.predict(x_test)
+        best_params = lr_cv.best_params_
 
-    best_score = lr_cv.score(x_test, y_test)
-    predictions = lr_cv.predict(x_test)
     if verbose:
         print("Best Accuracy: {0:.2%}".format(best_score))
-        print("Best Parameters:", lr_cv.best_params_)
+        print("Best Parameters:", best_params)
         labels_list = [str(x) for x in labels_list]  # Convert labels_list to list of strings
         print(classification_report(y_test, predictions, target_names=labels_list))
         print(confusion_matrix(np.array(y_test), predictions))
@@ -421,3 +438,55 @@ def train_log_print(run_id, logger, statement):
         logger.info(statement)
     else:
         print(statement)
+
+
+def mixed_precision_supported():
+    """Whether this version of torch supports autocast, which mixed precision training requires"""
+    return hasattr(torch, 'autocast')
+
+
+def autocast(device, enabled):
+    """
+    Context manager for running forward passes under bfloat16 autocast
+    :param device: Device the forward passes are run on
+    :param enabled: Whether to autocast. If False, a no-op context is returned. If True, torch must support autocast (see mixed_precision_supported).
+    """
+    if not enabled:
+        return no_autocast()
+    return torch.autocast(device_type=torch.device(device).type, dtype=torch.bfloat16)
+
+
+@contextlib.contextmanager
+def no_autocast():
+    """No-op context returned by autocast when disabled (contextlib.nullcontext needs Python 3.7)"""
+    yield
+
+
+def compile_module(module):
+    """
+    Compile a module's forward pass with torch.compile. Parameters are shared with the original module.
+    Falls back to eager execution if torch.compile is unavailable, or, for good, if compilation fails once the compiled module is called. Fallbacks are logged.
+    :param module: Module to compile
+    :return: Function calling the compiled module, or the original module if compilation is not supported
+    """
+    if not hasattr(torch, 'compile'):
+        return module
+    from torch import _dynamo
+    compiled = torch.compile(module)
+
+    def forward(*args, **kwargs):
+        nonlocal compiled
+        if compiled is not module:
+            try:
+                return compiled(*args, **kwargs)
+            except _dynamo.exc.TorchDynamoException as e:
+                logging.getLogger(__name__).warning("Compiling %s failed, running it in eager mode instead: %s", type(module).__name__, e)
+                compiled = module
+        return module(*args, **kwargs)
+
+    return forward
+
+
+def is_compiling():
+    """Whether the calling code is being traced by torch.compile (always False for torch versions without compile support)"""
+    return hasattr(torch, 'compiler') and hasattr(torch.compiler, 'is_compiling') and torch.compiler.is_compiling()